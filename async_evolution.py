@@ -0,0 +1,158 @@
+"""
+© 2024 Emily Maxwell <maxwelea@rose-hulman.edu>
+SPDX License: BSD-3-Clause
+
+async_evolution.py
+
+Asynchronous steady-state evolution. The Microbial genetic algorithm only replaces one individual per tournament, so
+there is no need to wait for one new individual to be simulated before playing the next tournament: a fixed number of
+simulations are kept running on a worker pool, and each fitness is given back to the genetic algorithm as soon as it
+arrives. Individuals whose fitness is still being evaluated are left out of the tournaments until it is known.
+"""
+
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+
+import numpy as np
+
+
+class AsyncEvolution:
+    """ Runs a Microbial genetic algorithm with a fixed number of fitness evaluations in flight on a worker pool.
+
+        Attributes
+        ----------
+        ga : Microbial
+            The genetic algorithm (Microbial or ArrayMicrobial), with the fitness of its initial population set
+        evaluate : callable
+            The fitness function, called with one individual in a worker process. It must be picklable, e.g.
+            simulate_body_nogui.evaluate_body(), which uses the persistent session of the worker.
+        pool : concurrent.futures.Executor
+            The worker pool, e.g. from simulate_body_nogui.make_pool()
+        in_flight : int
+            The number of evaluations kept running at the same time
+        cache : FitnessCache
+            A fitness cache consulted before an individual is submitted (None for no cache)
+        key : callable
+            Returns the cache key of an individual (required with a cache)
+        evaluations : int
+            The number of fitness values given back to the genetic algorithm so far
+        submitted : int
+            The number of evaluations submitted to the pool so far
+        skipped : int
+            The number of times no tournament could be played because too many individuals were being evaluated
+
+        Methods
+        -------
+        run(evaluations, callback=None)
+            Evolves until the given number of new individuals have been evaluated
+        mean_fitness()
+            Returns the mean fitness of the individuals that are not being evaluated
+    """
+
+    def __init__(self, ga, evaluate, pool, in_flight: int, cache=None, key=None):
+        self.ga = ga
+        self.evaluate = evaluate
+        self.pool = pool
+        self.in_flight = in_flight
+        self.cache = cache
+        self.key = key
+
+        self.evaluations = 0
+        self.submitted = 0
+        self.skipped = 0
+
+        # Index in the population (and cache key) of the individual each running evaluation belongs to
+        self.running = {}
+
+    def __str__(self):
+        """ Custom method for string representation, with the evaluation counts. """
+
+        return (f"Asynchronous evolution with {self.in_flight} evaluations in flight: {self.evaluations} evaluated, "
+                f"{self.submitted} simulated, {self.skipped} tournaments deferred")
+
+    def run(self, evaluations: int, callback=None):
+        """ Plays tournaments and evaluates their infected individuals until the given number of new individuals have
+            been evaluated, keeping up to self.in_flight evaluations running.
+
+            Parameters
+            ----------
+            evaluations : int
+                The number of new individuals to evaluate
+            callback : callable, optional
+                Called as callback(evaluation, index, fitness, simulated) after each fitness is given back to the
+                genetic algorithm, where evaluation counts from 1, index is the individual\'s index in the population,
+                and simulated is whether the fitness was simulated (False if it came from the cache)
+
+            Returns
+            -------
+            float
+                The number of evaluations per second
+        """
+
+        start_time = time.perf_counter()
+        target = self.evaluations + evaluations
+        started = self.evaluations
+
+        while self.evaluations < target:
+            # Fill the pool with tournaments between individuals that are not being evaluated
+            while len(self.running) < self.in_flight and started < target:
+                busy = [index for index, _ in self.running.values()]
+                population, losers = self.ga.cycle_batch(1, exclude=busy)
+
+                if not losers:
+                    self.skipped += 1
+                    break
+
+                index = losers[0]
+                individual = list(population[index])
+                started += 1
+
+                key = self.key(individual) if self.cache is not None else None
+                fitness = self.cache.get(key) if key is not None else None
+
+                if fitness is not None:
+                    self._tell(index, fitness, callback, simulated=False)
+                    continue
+
+                future = self.pool.submit(self.evaluate, individual)
+                self.running[future] = (index, key)
+
+                # Until its fitness is known, the infected individual is the least fit (so it is never the most fit)
+                self.ga.fitness[index] = self.ga.minimise * float("inf")
+                self.submitted += 1
+
+            if not self.running:
+                continue
+
+            # Give each fitness back as soon as it arrives
+            done, _ = wait(self.running, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                index, key = self.running.pop(future)
+                fitness = future.result()
+
+                if key is not None:
+                    self.cache.put(key, fitness)
+
+                self._tell(index, fitness, callback, simulated=True)
+
+        elapsed = time.perf_counter() - start_time
+        return evaluations / elapsed if elapsed else 0.0
+
+    def mean_fitness(self) -> float:
+        """ Returns the mean fitness of the population, leaving out the individuals that are being evaluated (whose
+            fitness is a placeholder until it arrives).
+        """
+
+        busy = {index for index, _ in self.running.values()}
+        return float(np.mean([self.ga.fitness[i] for i in range(len(self.ga.fitness)) if i not in busy]))
+
+# ------------------ Private methods ------------------
+
+    def _tell(self, index, fitness, callback, simulated):
+        self.ga.fitness[index] = fitness
+        self.ga.setFitness(self.ga.fitness)
+        self.evaluations += 1
+
+        if callback is not None:
+            callback(self.evaluations, index, fitness, simulated)
@@ -0,0 +1,356 @@
+"""
+© 2024 Emily Maxwell <maxwelea@rose-hulman.edu>
+SPDX License: BSD-3-Clause
+
+batched_simulation.py
+
+Batched headless simulation of several robots in one pybullet world. Every evaluation of a SimulationSession steps a
+world holding one robot, so the Python overhead of each p.stepSimulation call (and of resetting the world) is paid once
+per robot per step. A BatchedSimulation loads a whole batch of robots side by side into one world and steps them
+together, paying it once per batch per step instead.
+
+The robots are laid out on a grid and their links are put in a collision group that only collides with the ground
+plane, so they can never touch each other (even if one walks into another's space). The world orders its contact pairs
+deterministically, so each robot moves as it would alone in a world with the same setting (up to rounding from its
+place on the grid, around 1e-6 in fitness). That is not the contact order of a SimulationSession, whose fitness values
+can differ by more for gaits that are sensitive to it, so batched fitness values are cached under their own physics
+settings (see physics_settings()).
+"""
+
+import copy
+import math
+
+import numpy as np
+import pybullet as p
+import pybullet_data
+
+import evolve_bodies.gen_sim_viz.generate_body as gb
+import pyrosim.pyrosim as ps
+import simulate_body_nogui as sb
+from fitness_reducers import FinalDistance
+from stop_criteria import EarlyStop, discarded_fitness
+
+# Collision groups: the ground plane collides with everything, robots only with the ground plane
+PLANE_GROUP = 1
+ROBOT_GROUP = 2
+
+# Distance between neighbouring robots on the grid, which is centred on the origin. The ground plane's collision box
+# only spans 200 x 200, so the grid must leave room for the robots to walk without falling off its edge.
+SPACING = 5
+
+
+def physics_settings(timestep=sb.TIMESTEP, solver_iterations=sb.SOLVER_ITERATIONS, control_period=sb.CONTROL_PERIOD):
+    """ Returns the physics settings of a batched simulation (those of a SimulationSession with the same fidelity, with
+        deterministic contact pairs), to use in fitness cache keys instead of simulate_body_nogui.physics_settings().
+    """
+
+    return dict(sb.physics_settings(timestep, solver_iterations, control_period), deterministic_overlapping_pairs=1)
+
+
+class BatchedSimulation:
+    """ A reusable headless simulator that evaluates a batch of robots at a time in one pybullet world.
+
+        Attributes
+        ----------
+        client : int
+            The id of the pybullet DIRECT client
+        batch_size : int
+            The largest number of robots simulated in the world at the same time
+        spacing : float
+            The distance between neighbouring robots on the grid
+        timestep : float
+            The length of one simulation step in seconds
+        solver_iterations : int
+            The number of iterations of pybullet's constraint solver per step
+        control_period : int
+            The number of steps between motor updates
+        built_bodies : int
+            The number of bodies built from body parameters since the world was last reset
+        last_stops : list[EarlyStop]
+            For each robot of the last fitness() call, why and at which step it was stopped early, and its fitness
+            (None if it ran its full duration)
+        early_stops : dict[str, int]
+            The number of robots stopped early by each kind of stop criterion
+
+        Methods
+        -------
+        simulate(bodies, targets, stop_criteria=None, reducers=None, minimise=False)
+            Simulates one batch of robots together and returns the results of each robot's reducers
+        fitness(bodies, amplitudes=None, phase_offsets=None, duration=10000, stop_criteria=None, minimise=False)
+            Finds the fitness (final distance from the starting position) of every robot, one batch at a time
+        physics_settings()
+            Returns the physics settings of the batched simulation, for fitness cache keys
+        close()
+            Disconnects the pybullet client
+    """
+
+    def __init__(self, batch_size: int = 32, spacing: float = SPACING, timestep=sb.TIMESTEP,
+                 solver_iterations=sb.SOLVER_ITERATIONS, control_period=sb.CONTROL_PERIOD):
+        """ Parameters
+            ----------
+            batch_size : int, optional
+                The largest number of robots simulated in the world at the same time (default is 32)
+            spacing : float, optional
+                The distance between neighbouring robots on the grid (default is SPACING)
+            timestep, solver_iterations, control_period : optional
+                The fidelity of the simulation, as for a SimulationSession (default is the default fidelity)
+        """
+
+        self.client = p.connect(p.DIRECT)
+        self.batch_size = batch_size
+        self.spacing = spacing
+        self.timestep = timestep
+        self.solver_iterations = solver_iterations
+        self.control_period = control_period
+
+        self._build_world()
+
+        self.last_stops = []
+        self.early_stops = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def simulate(self, bodies, targets, stop_criteria=None, reducers=None, minimise=False):
+        """ Simulates a batch of robots side by side in one world.
+
+            Parameters
+            ----------
+            bodies : list[str] or list[list[float]]
+                The urdf (or the 15 body parameters) of each robot
+            targets : list[numpy.ndarray]
+                For each robot, a (steps, n_joints) array of motor targets (see simulate_body_nogui.driver_targets()).
+                Every robot is simulated for the same number of steps.
+            stop_criteria : list, optional
+                Criteria for stopping a robot early (see stop_criteria.py). Each robot gets its own copy. A stopped
+                robot is removed from the world while the others keep going.
+            reducers : list, optional
+                Reducers of each robot's trajectory (see fitness_reducers.py). Each robot gets its own copy (default
+                is [FinalDistance()]).
+            minimise : bool, optional
+                Whether fitness is minimised, which decides the worst fitness given to unstable robots (default is
+                False)
+
+            Returns
+            -------
+            list[list]
+                For each robot, the results of its reducers (in the same order). Why robots were stopped early is
+                recorded in self.last_stops, as in SimulationSession.simulate().
+        """
+
+        if len(bodies) > self.batch_size:
+            raise ValueError(f"a batch holds at most {self.batch_size} robots, not {len(bodies)}")
+
+        if reducers is None:
+            reducers = [FinalDistance()]
+
+        robot_ids, joint_indices = self._load(bodies)
+        count = len(robot_ids)
+        duration = len(targets[0])
+
+        robot_reducers = [copy.deepcopy(reducers) for i in range(count)]
+        robot_criteria = [copy.deepcopy(stop_criteria) if stop_criteria else None for i in range(count)]
+
+        for i in range(count):
+            for reducer in robot_reducers[i]:
+                # Reducers that depend on the length of a step use the batch's timestep
+                if hasattr(reducer, "simulation_timestep"):
+                    reducer.simulation_timestep = self.timestep
+                reducer.reset()
+            for criterion in robot_criteria[i] or ():
+                criterion.reset()
+
+        # Plain lists are much faster for pybullet to parse
+        rows = [np.asarray(robot_targets).tolist() for robot_targets in targets]
+        forces = [[sb.MAX_FORCE] * len(joints) for joints in joint_indices]
+        stops = [None] * count
+        running = list(range(count))
+
+        for step in range(duration):
+            # The motors hold their last target between updates, every control_period steps
+            if step % self.control_period == 0:
+                for i in running:
+                    ps.Set_Motors_For_Joints(bodyIndex=robot_ids[i],
+                                             jointIndices=joint_indices[i],
+                                             controlMode=p.POSITION_CONTROL,
+                                             targetPositions=rows[i][step],
+                                             maxForces=forces[i],
+                                             physicsClientId=self.client)
+
+            # One step for the whole batch
+            p.stepSimulation(physicsClientId=self.client)
+
+            stopped = []
+
+            for i in running:
+                position, orientation = p.getBasePositionAndOrientation(robot_ids[i], physicsClientId=self.client)
+
+                for reducer in robot_reducers[i]:
+                    reducer.update(position)
+
+                for criterion in robot_criteria[i] or ():
+                    reason = criterion.check(robot_ids[i], step, position, orientation, self.client)
+
+                    if reason is not None:
+                        stops[i] = (criterion, reason, step)
+                        stopped.append(i)
+                        break
+
+            if stopped:
+                for i in stopped:
+                    p.removeBody(robot_ids[i], physicsClientId=self.client)
+                    robot_ids[i] = None
+                running = [i for i in running if stops[i] is None]
+
+                if not running:
+                    break
+
+        for robot_id in robot_ids:
+            if robot_id is not None:
+                p.removeBody(robot_id, physicsClientId=self.client)
+
+        results = [[reducer.result() for reducer in robot_reducers[i]] for i in range(count)]
+        self.last_stops = []
+
+        for i in range(count):
+            if stops[i] is None:
+                self.last_stops.append(None)
+                continue
+
+            criterion, reason, step = stops[i]
+            fitness = results[i][0] if criterion.keep_fitness else discarded_fitness(minimise)
+            self.last_stops.append(EarlyStop(reason, step, fitness))
+
+            if criterion.counted:
+                name = type(criterion).__name__
+                self.early_stops[name] = self.early_stops.get(name, 0) + 1
+
+        return results
+
+    def fitness(self, bodies, amplitudes=None, phase_offsets=None, duration=10000, stop_criteria=None,
+                minimise=False):
+        """ Finds the fitness (final distance from the starting position, or the fitness given by the stop criterion
+            that ended a robot early) of every robot, simulating batch_size robots at a time.
+
+            Parameters
+            ----------
+            bodies : list[str] or list[list[float]] or str
+                The urdf (or body parameters) of each robot, or a single urdf shared by every robot (simulated once
+                with the default driver if no amplitudes or phase offsets are given)
+            amplitudes : list[list[float]], optional
+                The motor amplitudes of each robot (default is the simulate_body() default)
+            phase_offsets : list[list[float]], optional
+                The motor phase offsets of each robot (default is the simulate_body() default)
+            duration : int, optional
+                The number of simulation steps (default is 10000)
+            stop_criteria : list, optional
+                Criteria for stopping hopeless or unstable robots early (see stop_criteria.py)
+            minimise : bool, optional
+                Whether fitness is minimised, which decides the worst fitness given to unstable robots (default is
+                False)
+
+            Returns
+            -------
+            list[float]
+                The fitness of each robot, in the same order as the input
+        """
+
+        if isinstance(bodies, str):
+            # One urdf simulated with each driver (or once with the default driver if no drivers are given)
+            if amplitudes is not None:
+                size = len(amplitudes)
+            elif phase_offsets is not None:
+                size = len(phase_offsets)
+            else:
+                size = 1
+            bodies = [bodies] * size
+
+        if amplitudes is None:
+            amplitudes = [(1, -1, -1, 1)] * len(bodies)
+        if phase_offsets is None:
+            phase_offsets = [(0, 0, 0, 0)] * len(bodies)
+
+        fitness = []
+        last_stops = []
+
+        for start in range(0, len(bodies), self.batch_size):
+            end = start + self.batch_size
+            targets = [sb.driver_targets(duration, amplitude, phase_offset, self.timestep)
+                       for amplitude, phase_offset in zip(amplitudes[start:end], phase_offsets[start:end])]
+
+            results = self.simulate(bodies[start:end], targets, stop_criteria, minimise=minimise)
+
+            for result, stop in zip(results, self.last_stops):
+                fitness.append(stop.fitness if stop is not None else result[0])
+            last_stops += self.last_stops
+
+        self.last_stops = last_stops
+
+        return fitness
+
+    def physics_settings(self):
+        """ Returns the physics settings of the batched simulation (see physics_settings()), for fitness cache keys. """
+
+        return physics_settings(self.timestep, self.solver_iterations, self.control_period)
+
+    def close(self):
+        """ Disconnects the pybullet client. """
+
+        if self.client is not None:
+            p.disconnect(self.client)
+            self.client = None
+
+# ------------------ Private methods ------------------
+
+    def _build_world(self):
+        # Contact pairs are ordered by body instead of by hash, so the order the robots are solved in (and so each
+        # robot's fitness) does not depend on the rest of the batch
+        p.setPhysicsEngineParameter(enableFileCaching=0, deterministicOverlappingPairs=1, physicsClientId=self.client)
+        p.setAdditionalSearchPath(pybullet_data.getDataPath(), physicsClientId=self.client)
+        p.setGravity(0, 0, sb.GRAVITY, physicsClientId=self.client)
+        p.setPhysicsEngineParameter(fixedTimeStep=self.timestep, numSolverIterations=self.solver_iterations,
+                                    physicsClientId=self.client)
+
+        plane_id = p.loadURDF("plane.urdf", physicsClientId=self.client)
+        p.setCollisionFilterGroupMask(plane_id, -1, PLANE_GROUP, -1, physicsClientId=self.client)
+
+        self.world_state = p.saveState(physicsClientId=self.client)
+        self.built_bodies = 0
+
+    def _load(self, bodies):
+        # Restores the empty world and loads each robot at its place on the grid
+        if self.built_bodies + len(bodies) > sb.BUILT_BODIES_PER_WORLD:
+            p.resetSimulation(physicsClientId=self.client)
+            self._build_world()
+        else:
+            p.restoreState(self.world_state, physicsClientId=self.client)
+
+        columns = math.ceil(math.sqrt(len(bodies)))
+        centre = 0.5 * self.spacing * (columns - 1)
+        robot_ids = []
+        joint_indices = []
+
+        for i, body in enumerate(bodies):
+            if isinstance(body, str):
+                robot_id = p.loadURDF(body, physicsClientId=self.client)
+                ps.Prepare_To_Simulate(robot_id, self.client)
+            else:
+                robot_id = gb.create_body(body, self.client)
+                self.built_bodies += 1
+
+            # Move the robot to its place on the grid, keeping its height and orientation
+            offset = [self.spacing * (i % columns) - centre, self.spacing * (i // columns) - centre]
+            position, orientation = p.getBasePositionAndOrientation(robot_id, physicsClientId=self.client)
+            p.resetBasePositionAndOrientation(robot_id, [position[0] + offset[0], position[1] + offset[1],
+                                                         position[2]], orientation, physicsClientId=self.client)
+
+            for link in range(-1, p.getNumJoints(robot_id, physicsClientId=self.client)):
+                p.setCollisionFilterGroupMask(robot_id, link, ROBOT_GROUP, PLANE_GROUP, physicsClientId=self.client)
+
+            robot_ids.append(robot_id)
+            joint_indices.append(ps.Prepare_Joint_Indices(robot_id, physicsClientId=self.client))
+
+        return robot_ids, joint_indices
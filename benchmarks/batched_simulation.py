@@ -0,0 +1,53 @@
+"""
+© 2024 Emily Maxwell <maxwelea@rose-hulman.edu>
+SPDX License: BSD-3-Clause
+
+batched_simulation.py
+
+Benchmark of the throughput of simulating a population in batches of robots sharing one pybullet world
+(batched_simulation.BatchedSimulation) against one robot per world (a SimulationSession), in a single process. Also
+reports the largest difference in fitness between the two. Run from the repository root:
+
+    python benchmarks/batched_simulation.py
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import simulate_body_nogui as sb
+from batched_simulation import BatchedSimulation
+
+body = "evolve_drivers/gen_sim_viz/body_1.urdf"
+population = 64
+duration = 1000
+
+random.seed(0)
+amplitudes = [[random.uniform(-2, 2) for i in range(4)] for j in range(population)]
+phase_offsets = [[random.uniform(-np.pi, np.pi) for i in range(4)] for j in range(population)]
+
+with sb.SimulationSession() as session:
+    start = time.perf_counter()
+    single = [session.fitness(body, duration, amplitude, phase_offset)
+              for amplitude, phase_offset in zip(amplitudes, phase_offsets)]
+    elapsed = time.perf_counter() - start
+
+print(f"one robot per world: {population / elapsed:8.2f} evals/s")
+
+for batch_size in (1, 4, 16, 64):
+    with BatchedSimulation(batch_size) as batched:
+        start = time.perf_counter()
+        fitness = batched.fitness(body, amplitudes, phase_offsets, duration)
+        elapsed = time.perf_counter() - start
+
+    if batch_size == 1:
+        reference = fitness
+
+    print(f"batch of {batch_size:>3}:        {population / elapsed:8.2f} evals/s, "
+          f"max |difference| {np.max(np.abs(np.subtract(fitness, reference))):.2e} from a batch of 1, "
+          f"{np.max(np.abs(np.subtract(fitness, single))):.2e} from one robot per world")
@@ -0,0 +1,69 @@
+"""
+© 2024 Emily Maxwell <maxwelea@rose-hulman.edu>
+SPDX License: BSD-3-Clause
+
+fidelity.py
+
+Benchmark of the speedup and fitness error of lower-fidelity simulations (longer timestep, fewer solver iterations,
+motors updated less often) against the default settings, to choose a fidelity for screening runs. Every setting
+simulates the same simulated time (10000 steps at 240 Hz) for a population of random drivers. Besides the error in
+fitness, the rank correlation with the default fitness values shows how well a setting preserves which drivers are
+better, which is what matters for screening. Run from the repository root:
+
+    python benchmarks/fidelity.py
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import simulate_body_nogui as sb
+
+body = "evolve_drivers/gen_sim_viz/body_1.urdf"
+population = 16
+duration = 10000
+
+# (timestep, solver iterations, control period), starting with the defaults
+settings = [(sb.TIMESTEP, sb.SOLVER_ITERATIONS, sb.CONTROL_PERIOD),
+            (sb.TIMESTEP, sb.SOLVER_ITERATIONS, 4),
+            (sb.TIMESTEP, sb.SOLVER_ITERATIONS, 8),
+            (sb.TIMESTEP, 20, 1),
+            (sb.TIMESTEP, 10, 1),
+            (sb.TIMESTEP, 10, 4),
+            (1 / 120, sb.SOLVER_ITERATIONS, 1),
+            (1 / 120, 20, 2),
+            (1 / 60, sb.SOLVER_ITERATIONS, 1),
+            (1 / 60, 10, 1)]
+
+random.seed(0)
+amplitudes = [[random.uniform(-2, 2) for i in range(4)] for j in range(population)]
+phase_offsets = [[random.uniform(-np.pi, np.pi) for i in range(4)] for j in range(population)]
+
+
+def ranks(values):
+    return np.argsort(np.argsort(values))
+
+
+for timestep, solver_iterations, control_period in settings:
+    steps = round(duration * sb.TIMESTEP / timestep)
+
+    with sb.SimulationSession(timestep, solver_iterations, control_period) as session:
+        start = time.perf_counter()
+        fitness = np.array([session.fitness(body, steps, amplitude, phase_offset)
+                            for amplitude, phase_offset in zip(amplitudes, phase_offsets)])
+        elapsed = time.perf_counter() - start
+
+    if not settings.index((timestep, solver_iterations, control_period)):
+        reference, reference_time = fitness, elapsed
+
+    error = np.abs(fitness - reference)
+    rank_correlation = np.corrcoef(ranks(fitness), ranks(reference))[0, 1]
+
+    print(f"{1 / timestep:5.0f} Hz, {solver_iterations:>2} iterations, control every {control_period} steps: "
+          f"{reference_time / elapsed:5.2f}x speedup, mean |error| {error.mean():7.3f}, "
+          f"max |error| {error.max():7.3f}, rank correlation {rank_correlation:5.3f}")
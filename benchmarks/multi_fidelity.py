@@ -0,0 +1,59 @@
+"""
+© 2024 Emily Maxwell <maxwelea@rose-hulman.edu>
+SPDX License: BSD-3-Clause
+
+multi_fidelity.py
+
+Benchmark of screening simulations (multi_fidelity.MultiFidelityEvaluator) on random drivers and random bodies. Every
+candidate is screened and audited, i.e. also simulated to full length, so for each screening length this shows the
+rank correlation between the screening and full-length fitness, and, for each promote_fraction, the fraction of steps
+screening would save and how many of the 5 best candidates (at full length) it would have promoted. Run from the
+repository root:
+
+    python benchmarks/multi_fidelity.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import simulate_body_nogui as sb
+from evolve_bodies.gen_sim_viz.body_trial import randomize_bodies
+from evolve_drivers.gen_sim_viz.driver_trial import randomize_drivers
+from multi_fidelity import MultiFidelityEvaluator
+
+population = 24
+duration = 10000
+screen_steps = (1000, 2500)
+fractions = (0.25, 0.5)
+
+np.random.seed(0)
+candidates = {
+    "drivers": [("evolve_drivers/gen_sim_viz/body_1.urdf", driver[0:4], driver[4:8])
+                for driver in randomize_drivers(population)],
+    "bodies": [(body, (1, -1, -1, 1), (0, 0, 0, 0)) for body in randomize_bodies(population)],
+}
+
+with sb.SimulationSession() as session:
+    for name, population_candidates in candidates.items():
+        for steps in screen_steps:
+            evaluator = MultiFidelityEvaluator(steps, duration, audit=1.0)
+            for body, amplitude, phase_offset in population_candidates:
+                evaluator.fitness(session, body, amplitude, phase_offset, best=np.inf)
+
+            screen = np.array([level[0] for level in evaluator.levels])
+            full = np.array([level[1] for level in evaluator.levels])
+            top = set(np.argsort(-full)[:5])
+
+            print(f"{name}, screening {steps} steps: rank correlation {evaluator.stats()['rank_correlation']:6.3f}")
+
+            for fraction in fractions:
+                # Promotion against the best full-length fitness, as in a trial whose population contains it
+                promoted = screen >= fraction * full.max() * steps / duration
+                saved = (~promoted).sum() * (duration - steps) / (population * duration)
+
+                print(f"    promote_fraction {fraction}: {promoted.sum():2} of {population} promoted, {saved:.0%} of "
+                      f"steps saved, {len(top & set(np.flatnonzero(promoted)))} of the 5 best promoted")
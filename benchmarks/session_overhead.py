@@ -0,0 +1,38 @@
+"""
+© 2024 Emily Maxwell <maxwelea@rose-hulman.edu>
+SPDX License: BSD-3-Clause
+
+session_overhead.py
+
+Benchmark of the per-evaluation overhead saved by reusing a SimulationSession instead of connecting, setting up the
+world, and disconnecting a new pybullet client for every evaluation. Run from the repository root:
+
+    python benchmarks/session_overhead.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import simulate_body_nogui as sb
+
+body = "evolve_drivers/gen_sim_viz/body_1.urdf"
+evaluations = 50
+
+# Short runs so that the fixed per-evaluation cost is a visible part of the total
+for duration in (1, 100, 1000):
+    start = time.perf_counter()
+    for i in range(evaluations):
+        sb.simulate_body(body, duration)
+    per_connect = (time.perf_counter() - start) / evaluations
+
+    with sb.SimulationSession() as session:
+        start = time.perf_counter()
+        for i in range(evaluations):
+            session.simulate(body, duration)
+        per_session = (time.perf_counter() - start) / evaluations
+
+    print(f"duration = {duration:>5}: connect per eval {1000 * per_connect:8.3f} ms, "
+          f"session {1000 * per_session:8.3f} ms, saved {1000 * (per_connect - per_session):8.3f} ms per eval")
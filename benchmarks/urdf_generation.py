@@ -0,0 +1,68 @@
+"""
+© 2024 Emily Maxwell <maxwelea@rose-hulman.edu>
+SPDX License: BSD-3-Clause
+
+urdf_generation.py
+
+Microbenchmark of writing body urdfs with the pyrosim writer (generate_body.generate_body(), many small writes per
+file) against the precompiled template (generate_body.generate_bodies(), one write per file), and of rendering a urdf
+in memory with each. Also checks that both produce identical files. Run from the repository root:
+
+    python benchmarks/urdf_generation.py
+"""
+
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import evolve_bodies.gen_sim_viz.generate_body as gb
+
+bodies = np.random.default_rng(0).uniform(0, 5, (1000, 15)).tolist()
+
+with tempfile.TemporaryDirectory() as directory:
+    cwd = os.getcwd()
+    os.chdir(directory)
+
+    try:
+        start = time.perf_counter()
+        for i, body in enumerate(bodies):
+            gb.generate_body(i, body)
+        per_writer = (time.perf_counter() - start) / len(bodies)
+
+        written = []
+        for i in range(len(bodies)):
+            with open(f"body_{i}.urdf") as f:
+                written.append(f.read())
+
+        start = time.perf_counter()
+        gb.generate_bodies(bodies)
+        per_template = (time.perf_counter() - start) / len(bodies)
+
+        identical = 0
+        for i in range(len(bodies)):
+            with open(f"body_{i}.urdf") as f:
+                identical += f.read() == written[i]
+    finally:
+        os.chdir(cwd)
+
+start = time.perf_counter()
+for body in bodies:
+    gb.generate_body(0, body, io.StringIO())
+per_writer_memory = (time.perf_counter() - start) / len(bodies)
+
+start = time.perf_counter()
+for body in bodies:
+    gb.render_urdf(body)
+per_template_memory = (time.perf_counter() - start) / len(bodies)
+
+print(f"to files:  pyrosim writer {1e6 * per_writer:8.1f} us/body, template {1e6 * per_template:8.1f} us/body "
+      f"({per_writer / per_template:.1f}x)")
+print(f"in memory: pyrosim writer {1e6 * per_writer_memory:8.1f} us/body, template {1e6 * per_template_memory:8.1f} "
+      f"us/body ({per_writer_memory / per_template_memory:.1f}x)")
+print(f"{identical} of {len(bodies)} files identical")
@@ -0,0 +1,87 @@
+"""
+© 2024 Emily Maxwell <maxwelea@rose-hulman.edu>
+SPDX License: BSD-3-Clause
+
+checkpoint.py
+
+Checkpoints of long GA trials, so that a trial that crashes (or is stopped) can be resumed exactly where it left off
+instead of starting over.
+
+A checkpoint is a single pickle file holding whatever state the trial passes in (e.g. the genetic algorithm itself,
+the fitness of the population, and the generation counter) together with the states of the random and numpy.random
+generators, which the genetic algorithms and the trials draw from. It is written to a temporary file first and then
+moved over the previous checkpoint, so a crash while saving never leaves a broken checkpoint behind.
+
+The logged history is not part of a checkpoint. It is streamed to the trial's CSV files by ExperimentLogger (see
+experiment_logger.py), which is flushed before each checkpoint is saved. On resume, the files are truncated back to
+the checkpoint's generation, and the generations after it are logged again.
+
+The helpers a trial is given are not part of a checkpoint either, so after a resume their state starts over and only
+covers the part of the trial after it: the in-memory entries and hit/miss counts of the FitnessCache (whose on-disk
+store, if it has a path, is kept), the counts of the FeasibilityFilter and the SimulationSession's early stops, and the
+per-level statistics (and the audit random number generator) of the MultiFidelityEvaluator.
+"""
+
+import os
+import pickle
+import random
+
+import numpy as np
+
+# Version of the checkpoint layout, checked when loading
+CHECKPOINT_VERSION = 1
+
+
+def save_checkpoint(path: str, **state):
+    """ Saves the state of a trial, and the states of the global random number generators, to a checkpoint file.
+
+        Parameters
+        ----------
+        path : str
+            The checkpoint file, replaced atomically if it already exists
+        **state
+            The (picklable) state of the trial
+    """
+
+    checkpoint = {
+        "version": CHECKPOINT_VERSION,
+        "state": state,
+        "random_state": random.getstate(),
+        "numpy_random_state": np.random.get_state(),
+    }
+
+    temp_path = f"{path}.tmp"
+
+    with open(temp_path, "wb") as f:
+        pickle.dump(checkpoint, f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(temp_path, path)
+
+
+def load_checkpoint(path: str) -> dict:
+    """ Loads the state of a trial from a checkpoint file, and restores the states of the global random number
+        generators to what they were when it was saved.
+
+        Parameters
+        ----------
+        path : str
+            The checkpoint file
+
+        Returns
+        -------
+        dict
+            The state of the trial, as passed to save_checkpoint()
+    """
+
+    with open(path, "rb") as f:
+        checkpoint = pickle.load(f)
+
+    if checkpoint.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(f"{path} is not a version {CHECKPOINT_VERSION} checkpoint")
+
+    random.setstate(checkpoint["random_state"])
+    np.random.set_state(checkpoint["numpy_random_state"])
+
+    return checkpoint["state"]
@@ -9,7 +9,18 @@ Last Modified: 11/18/2024
 
 import evolve_bodies.gen_sim_viz.generate_body as gb
 import simulate_body_nogui as sb
-from genalgs import Microbial
+from evolve_bodies.gen_sim_viz.feasibility import FeasibilityFilter
+from evolve_bodies.gen_sim_viz.urdf_cache import UrdfCache
+from async_evolution import AsyncEvolution
+from checkpoint import load_checkpoint, save_checkpoint
+from experiment_logger import ExperimentLogger
+from fitness_cache import FitnessCache
+from multi_fidelity import MultiFidelityEvaluator
+from genalgs import ArrayMicrobial, IslandModel, Microbial
+
+import functools
+import os
+import random
 
 import numpy as np
 import pandas as pd
@@ -40,84 +51,324 @@ def randomize_bodies(num_bodies: int):
 
 
 def generate_urdfs(bodies: list[list]):
-    all_urdfs = [None] * len(bodies)
-
-    for i in range(len(bodies)):
-        body_urdf = gb.generate_body(i, bodies[i])
-
-        all_urdfs[i] = body_urdf
-
-    return all_urdfs
+    return gb.generate_bodies(bodies)
 
 
 def generate_urdf(body: list, index: int = 0):
-    body_urdf = gb.generate_body(index, body)
-    return body_urdf
+    return gb.generate_bodies([body], index)[0]
 
 
 def simulate_body(body_urdf: str):
     return sb.simulate_body(body_urdf)
 
 
-def body_trial(num_bodies: int, generations: int, title: str, prob_reproduction = 0.8, prob_mutation = 0.1, mutation_deviation = 0.05, encoding_type = 1, minimise = False):
+def body_trial(num_bodies: int, generations: int, title: str, prob_reproduction = 0.8, prob_mutation = 0.1, mutation_deviation = 0.05, encoding_type = 1, minimise = False, workers = None, cache: FitnessCache = None, in_memory = True,
+               stop_criteria = None, array_population = False, batch_size = 1, checkpoint = None,
+               checkpoint_interval = 50, resume = None, urdf_cache: UrdfCache = None,
+               feasibility: FeasibilityFilter = None, multi_fidelity: MultiFidelityEvaluator = None, seed = None):
+
+    # Screening runs in the trial's own session, in the trial's direction of optimisation
+    if multi_fidelity is not None:
+        multi_fidelity.validate(minimise, batch_size)
+
+    # A seed makes the trial reproducible: it seeds the random bodies and the genetic algorithm
+    if seed is not None:
+        random.seed(seed)
+        np.random.seed(seed)
+
+    # Without in_memory, urdfs are written to a directory shared by every trial, named by a hash of the body, so
+    # concurrent trials never overwrite each other's files and unchanged bodies are never written again
+    if not in_memory and urdf_cache is None:
+        urdf_cache = UrdfCache()
+
+    # Bodies that were already simulated with the same settings are looked up instead of simulated again
+    if cache is None:
+        cache = FitnessCache()
+    physics = sb.physics_settings()
+
+    # Stopping simulations early changes their fitness, so the criteria are part of the cache key (and so is the
+    # direction of the optimisation, which decides the fitness of unstable simulations)
+    if stop_criteria:
+        physics["stop_criteria"] = [repr(criterion) for criterion in stop_criteria]
+        if minimise:
+            physics["minimise"] = True
+
+    # Bodies rejected by the feasibility filter are given the worst fitness instead of being simulated
+    rejected_fitness = float("inf") if minimise else 0.0
+
+    # Columns of the logged history of the most fit body
+    columns = ('Generation', 'Fitness', 'body_w', 'body_l', 'body_h', 'leg_w1', 'leg_w2', 'leg_w3', 'leg_w4',
+               'leg_l1', 'leg_l2', 'leg_l3', 'legl_4', 'legh_1', 'legh_2', 'legh_3', 'legh_4')
+
+    if resume is not None:
+        # Continue a trial from its last checkpoint (which also restores the random number generators)
+        state = load_checkpoint(resume)
+        ga = state["ga"]
+        fitness = state["fitness"]
+        body_urdfs = state["body_urdfs"]
+        start = state["generation"]
+        bodies = ga.population
+    else:
+        # Generate bodies (list of parameters)
+        bodies = randomize_bodies(num_bodies)
+
+        # Repair (or mark as rejected) the bodies that fail the feasibility filter
+        rejected = set()
+        if feasibility is not None:
+            for i in range(num_bodies):
+                feasible = feasibility.filter(bodies[i])
+                if feasible is None:
+                    rejected.add(i)
+                else:
+                    bodies[i] = feasible
+
+        # Generate urdfs of bodies, unless they are built directly in the simulator from their parameters
+        if in_memory:
+            body_urdfs = bodies
+        else:
+            body_urdfs = [None if i in rejected else urdf_cache.path(bodies[i]) for i in range(num_bodies)]
+
+        # Find the fitness for each body (final distance from starting point)
+        keys = [FitnessCache.key(body, physics=physics) for body in bodies]
+        fitness = [rejected_fitness if i in rejected else cache.get(keys[i]) for i in range(num_bodies)]
+        misses = [i for i in range(num_bodies) if fitness[i] is None]
+
+        if misses:
+            distances = sb.evaluate_population([body_urdfs[i] for i in misses], workers=workers,
+                                               stop_criteria=stop_criteria, minimise=minimise)
+            for i, distance in zip(misses, distances):
+                fitness[i] = distance
+                cache.put(keys[i], distance)
+
+        # The array-backed Microbial keeps the population in one NumPy matrix and vectorizes its operators
+        if array_population:
+            ga = ArrayMicrobial(bodies, fitness, prob_reproduction, prob_mutation, mutation_deviation, encoding_type,
+                                minimise, rng=np.random.default_rng(seed))
+        else:
+            ga = Microbial(bodies, fitness, prob_reproduction, prob_mutation, mutation_deviation, encoding_type,
+                           minimise)
 
-    # Generate bodies (list of parameters)
-    bodies = randomize_bodies(num_bodies)
+        most_fit = ga.getMostFit()
 
-    # Generate urdfs of bodies
-    body_urdfs = generate_urdfs(bodies)
+        start = 0
 
-    # Find the fitness for each body (final distance from starting point)
-    fitness = [None] * num_bodies
-    for i in range(len(body_urdfs)):
-        distance = simulate_body(body_urdfs[i])
-        fitness[i] = distance[-1]
+    # Every generation is appended to the history as soon as it is done (a resumed trial continues its history)
+    logger = ExperimentLogger(f'body_trial_{title}.csv', columns,
+                              resume_generation=start if resume is not None else None)
+
+    if resume is None:
+        logger.log(0, most_fit[1], most_fit[0], mean_fitness=np.mean(fitness), cache=cache)
 
-    ga = Microbial(bodies, fitness, prob_reproduction, prob_mutation, mutation_deviation, encoding_type, minimise)
+    # Reuse one simulator for every evaluation in the generational loop
+    session = sb.SimulationSession()
 
-    error = (None, None)
-    most_fit = ga.getMostFit()
+    # With batched tournaments, the new bodies of each generation are simulated in parallel by a reused pool
+    pool = sb.make_pool(workers) if batch_size > 1 else None
+
+    # Generational loop for genetic algorithm
+    for i in range(start, generations):
+        if batch_size > 1:
+            bodies, individuals = ga.cycle_batch(batch_size)
+        else:
+            output = ga.cycle()
+            bodies = output[0]
+            individuals = [output[1]]
+
+        print(f"Generation {i+1} of {generations}")
+
+        keys = {}
+        to_simulate = []
+
+        for individual in individuals:
+            if feasibility is not None:
+                feasible = feasibility.filter(bodies[individual])
+
+                if feasible is None:
+                    fitness[individual] = rejected_fitness
+                    continue
+
+                # A repaired body replaces the infeasible one in the population
+                bodies[individual] = feasible
+
+            keys[individual] = FitnessCache.key(bodies[individual], physics=physics)
+            distance = cache.get(keys[individual])
+
+            if distance is None:
+                if in_memory:
+                    body_urdfs[individual] = bodies[individual]
+                else:
+                    body_urdfs[individual] = urdf_cache.path(bodies[individual])
+                to_simulate.append(individual)
+            else:
+                fitness[individual] = distance
+
+        # Only full-length fitness values are cached, not the estimates of screened-out bodies
+        cacheable = set(to_simulate)
+
+        if pool is not None and len(to_simulate) > 1:
+            distances = sb.evaluate_population([body_urdfs[individual] for individual in to_simulate], pool=pool,
+                                               stop_criteria=stop_criteria, minimise=minimise)
+        elif multi_fidelity is not None:
+            # Screen each new body and simulate it to full length only if it could come close to the best body
+            best = ga.getMostFit()[1]
+            distances = []
+            for individual in to_simulate:
+                distances.append(multi_fidelity.fitness(session, body_urdfs[individual], best=best,
+                                                        stop_criteria=stop_criteria))
+                if not multi_fidelity.last_promoted:
+                    cacheable.discard(individual)
+        else:
+            distances = [session.fitness(body_urdfs[individual], stop_criteria=stop_criteria, minimise=minimise)
+                         for individual in to_simulate]
+
+        for individual, distance in zip(to_simulate, distances):
+            fitness[individual] = distance
+            if individual in cacheable:
+                cache.put(keys[individual], distance)
+
+        ga.setFitness(fitness)
 
-    while most_fit == error:
+        # Log the most fit member of the population and the statistics of this generation
         most_fit = ga.getMostFit()
+        logger.log(i+1, most_fit[1], most_fit[0], replaced=individuals,
+                   new_fitness=[fitness[individual] for individual in individuals], mean_fitness=np.mean(fitness),
+                   simulations=len(to_simulate), cache=cache)
+
+        # Save the whole state of the trial every checkpoint_interval generations (with its history on disk)
+        if checkpoint is not None and (i+1) % checkpoint_interval == 0:
+            logger.flush()
+            save_checkpoint(checkpoint, ga=ga, fitness=fitness, body_urdfs=body_urdfs, generation=i+1)
+
+    if pool is not None:
+        pool.shutdown()
+    session.close()
+
+    logger.close()
+    print(pd.read_csv(logger.path, index_col='Generation'))
+
+    # Print best fitness and most fit body
+    best_body = ga.getMostFit()
+    print(f"Best Fitness: {best_body[1]}, Body: {best_body[0]}")
+    print(cache)
+    if urdf_cache is not None:
+        print(urdf_cache)
+    if feasibility is not None:
+        print(feasibility)
+    if multi_fidelity is not None:
+        print(multi_fidelity)
+        multi_fidelity.save(f'body_trial_{title}_fidelity.csv')
+    if stop_criteria:
+        print(f"Simulations stopped early: {session.early_stops}")
+
+    return bodies, fitness
+
+
+def island_body_trial(num_bodies: int, islands: int, generations: int, title: str, prob_reproduction = 0.8,
+                      prob_mutation = 0.1, mutation_deviation = 0.05, encoding_type = 1, minimise = False,
+                      migration_interval = 50, migrants = 1, stop_criteria = None, seed = None):
+
+    # The seed also seeds the islands (see IslandModel)
+    if seed is not None:
+        random.seed(seed)
+        np.random.seed(seed)
+
+    # Each island evolves its own population of num_bodies bodies in its own process, with its own simulator
+    populations = [randomize_bodies(num_bodies) for _ in range(islands)]
+    evaluate = functools.partial(sb.evaluate_body, stop_criteria=stop_criteria, minimise=minimise)
 
-    # Create pandas dataframe to info related to fitness
+    model = IslandModel(populations, evaluate, prob_reproduction, prob_mutation, mutation_deviation, encoding_type,
+                        minimise, migration_interval=migration_interval, migrants=migrants, seed=seed)
+    print(model)
+
+    results = model.run(generations, verbosity=1)
+
+    # Log the most fit body of any island at each generation
     columns = ('Generation', 'Fitness', 'body_w', 'body_l', 'body_h', 'leg_w1', 'leg_w2', 'leg_w3', 'leg_w4', 'leg_l1',
                'leg_l2', 'leg_l3', 'legl_4', 'legh_1', 'legh_2', 'legh_3', 'legh_4')
 
-    data = [0, most_fit[1]]
-    data.extend(most_fit[0])
+    sign = 1 if minimise else -1
 
-    df = pd.DataFrame(columns=columns)
-    df.loc[0] = data
+    with ExperimentLogger(f'body_trial_{title}.csv', columns) as logger:
+        for i in range(generations + 1):
+            best = min((result["history"][i] for result in results), key=lambda entry: entry[0] * sign)
+            logger.log(i, best[0], best[1])
 
-    # Generational loop for genetic algorithm
-    for i in range(generations):
-        output = ga.cycle()
-        print(f"Generation {i+1} of {generations}")
+    print(pd.read_csv(logger.path, index_col='Generation'))
 
-        bodies = output[0]
-        individual = output[1]
+    # Print best fitness and most fit body
+    best_body = model.getMostFit()
+    print(f"Best Fitness: {best_body[1]}, Body: {best_body[0]}")
 
-        body_urdfs[individual] = generate_urdf(bodies[individual], individual)
-        fitness[individual] = simulate_body(body_urdfs[individual])[-1]
+    return model
 
-        ga.setFitness(fitness)
 
-        # Add most fit member of the population to dataframe
+def async_body_trial(num_bodies: int, evaluations: int, title: str, prob_reproduction = 0.8, prob_mutation = 0.1,
+                     mutation_deviation = 0.05, encoding_type = 1, minimise = False, workers = None, in_flight = None,
+                     cache: FitnessCache = None, stop_criteria = None, seed = None):
+
+    # A seed makes the trial reproducible: it seeds the random bodies and the genetic algorithm
+    if seed is not None:
+        random.seed(seed)
+        np.random.seed(seed)
+
+    # Generate bodies (list of parameters), which are built directly in the simulator
+    bodies = randomize_bodies(num_bodies)
+
+    if cache is None:
+        cache = FitnessCache()
+    physics = sb.physics_settings()
+
+    if stop_criteria:
+        physics["stop_criteria"] = [repr(criterion) for criterion in stop_criteria]
+        if minimise:
+            physics["minimise"] = True
+
+    pool = sb.make_pool(workers)
+
+    # Find the fitness for each body (final distance from starting point)
+    keys = [FitnessCache.key(body, physics=physics) for body in bodies]
+    fitness = [cache.get(key) for key in keys]
+    misses = [i for i in range(num_bodies) if fitness[i] is None]
+
+    if misses:
+        distances = sb.evaluate_population([bodies[i] for i in misses], pool=pool, stop_criteria=stop_criteria,
+                                           minimise=minimise)
+        for i, distance in zip(misses, distances):
+            fitness[i] = distance
+            cache.put(keys[i], distance)
+
+    ga = ArrayMicrobial(bodies, fitness, prob_reproduction, prob_mutation, mutation_deviation, encoding_type, minimise,
+                        rng=np.random.default_rng(seed))
+
+    # Log the most fit body after each evaluation
+    columns = ('Generation', 'Fitness', 'body_w', 'body_l', 'body_h', 'leg_w1', 'leg_w2', 'leg_w3', 'leg_w4', 'leg_l1',
+               'leg_l2', 'leg_l3', 'legl_4', 'legh_1', 'legh_2', 'legh_3', 'legh_4')
+
+    logger = ExperimentLogger(f'body_trial_{title}.csv', columns)
+    logger.log(0, ga.best_fitness, ga.most_fit, mean_fitness=np.mean(ga.fitness), cache=cache)
+
+    def log(evaluation, index, distance, simulated):
+        print(f"Evaluation {evaluation} of {evaluations}")
         most_fit = ga.getMostFit()
-        new_data = [i+1, most_fit[1]]
-        new_data.extend(most_fit[0])
-        df.loc[len(df.index)] = new_data
+        # Each row counts the simulation of its own evaluation (none if its fitness came from the cache)
+        logger.log(evaluation, most_fit[1], most_fit[0], replaced=index, new_fitness=distance,
+                   mean_fitness=evolution.mean_fitness(), simulations=int(simulated), cache=cache)
+
+    # Keep every worker busy, giving each fitness back to the GA as soon as it arrives
+    evaluate = functools.partial(sb.evaluate_body, stop_criteria=stop_criteria, minimise=minimise)
+    evolution = AsyncEvolution(ga, evaluate, pool, in_flight or workers or os.cpu_count(), cache,
+                               lambda body: FitnessCache.key(body, physics=physics))
+    rate = evolution.run(evaluations, log)
+
+    pool.shutdown()
 
-    # Set the generation as the index in the datafram
-    df.set_index('Generation', inplace=True)
-    print(df)
+    logger.close()
+    print(pd.read_csv(logger.path, index_col='Generation'))
 
     # Print best fitness and most fit body
     best_body = ga.getMostFit()
-    print(f"Best Fitness: {best_body[1]}, Body: {best_body[0]}")
-
-    df.to_csv(f'body_trial_{title}.csv')
+    print(f"Best Fitness: {best_body[1]}, Body: {best_body[0].tolist()}")
+    print(f"{evolution} ({rate:.2f} evaluations per second)")
+    print(cache)
 
-    return bodies, fitness
+    return ga.population, ga.fitness
@@ -0,0 +1,215 @@
+"""
+© 2024 Emily Maxwell <maxwelea@rose-hulman.edu>
+SPDX License: BSD-3-Clause
+
+feasibility.py
+
+A cheap geometric check of body genomes before they are simulated. Random and mutated genomes can describe degenerate
+bodies: links that are nearly flat, or legs of such different heights that the body stands on one or two of them and
+falls over as soon as the simulation starts. Each of them would still cost a full simulation. The check reads only the
+15 body parameters, laid out as generate_body() builds them:
+
+    * every link must be at least min_size in each dimension (mutation can also push a dimension to zero or below)
+    * the legs the body stands on are those within height_tolerance of the tallest leg (the others hang in the air),
+      or all four legs if there is no tolerance
+    * the center of mass (every link has mass 1) must lie inside the support polygon of those legs' feet, at least
+      stability_margin from its edges
+
+An infeasible body is either rejected (given the worst fitness without being simulated) or repaired (thin links are
+thickened, short legs lengthened) and checked again.
+
+The defaults only reject degenerate bodies. Stricter settings reject far more, but they are a poor proxy for fitness:
+of 600 random bodies from body_trial.randomize_bodies(), 92% stand on a single leg (height_tolerance=0.1) and tip
+over, yet their fitness is no lower than that of the others, and bodies with a link thinner than 0.1 reach some of the
+highest fitness values. Check a stricter filter against simulated fitness before relying on it.
+"""
+
+import math
+
+# Direction of each leg from the center of the body, as generate_body() places them
+LEG_SIGNS = ((-1, -1), (1, -1), (1, 1), (-1, 1))
+
+
+def _feet(body):
+    # Returns the center of each leg and the corners of its footprint on the ground
+    body_w, body_l = body[0], body[1]
+    centers = []
+    footprints = []
+
+    for i, (sx, sy) in enumerate(LEG_SIGNS):
+        leg_w, leg_l = body[3 + i], body[7 + i]
+
+        # Each leg hangs outward from its corner of the body
+        jx, jy = sx * 0.5 * body_w, sy * 0.5 * body_l
+        centers.append((jx + sx * 0.5 * leg_w, jy + sy * 0.5 * leg_l))
+        footprints.append([(jx, jy), (jx + sx * leg_w, jy), (jx + sx * leg_w, jy + sy * leg_l),
+                           (jx, jy + sy * leg_l)])
+
+    return centers, footprints
+
+
+def _cross(o, a, b):
+    return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+
+def _convex_hull(points):
+    # Andrew's monotone chain, returning the hull counter-clockwise
+    points = sorted(set(points))
+    if len(points) < 3:
+        return points
+
+    lower = []
+    for point in points:
+        while len(lower) >= 2 and _cross(lower[-2], lower[-1], point) <= 0:
+            lower.pop()
+        lower.append(point)
+
+    upper = []
+    for point in reversed(points):
+        while len(upper) >= 2 and _cross(upper[-2], upper[-1], point) <= 0:
+            upper.pop()
+        upper.append(point)
+
+    return lower[:-1] + upper[:-1]
+
+
+def _inside_margin(point, hull):
+    # Returns the distance from a point to the nearest edge of a counter-clockwise hull (negative if outside)
+    if len(hull) < 3:
+        return -math.inf
+
+    margin = math.inf
+    for i in range(len(hull)):
+        a, b = hull[i], hull[(i + 1) % len(hull)]
+        margin = min(margin, _cross(a, b, point) / math.dist(a, b))
+
+    return margin
+
+
+class FeasibilityFilter:
+    """ Rejects or repairs body genomes that cannot stand, before they are simulated.
+
+        Attributes
+        ----------
+        min_size : float
+            The smallest allowed dimension of any link
+        height_tolerance : float
+            How much shorter than the tallest leg a leg can be and still stand on the ground (None for every leg)
+        stability_margin : float
+            How far inside the support polygon the center of mass must be
+        repair : bool
+            Whether infeasible bodies are repaired (True) or rejected (False)
+        checked : int
+            The number of bodies checked
+        rejected : int
+            The number of bodies rejected, each of them a simulation saved
+        repaired : int
+            The number of bodies repaired into feasible ones
+        reasons : dict[str, int]
+            The number of infeasible bodies found for each reason
+
+        Methods
+        -------
+        check(body)
+            Returns why a body is infeasible, or None if it is feasible
+        repair_body(body)
+            Returns a repaired copy of a body
+        filter(body)
+            Checks a body, counting the result, and returns the body to simulate (None if it is rejected)
+    """
+
+    def __init__(self, min_size: float = 0.01, height_tolerance: float = None, stability_margin: float = 0.0,
+                 repair: bool = False):
+        self.min_size = min_size
+        self.height_tolerance = height_tolerance
+        self.stability_margin = stability_margin
+        self.repair = repair
+
+        self.checked = 0
+        self.rejected = 0
+        self.repaired = 0
+        self.reasons = {}
+
+    def __repr__(self):
+        return (f"FeasibilityFilter(min_size={self.min_size}, height_tolerance={self.height_tolerance}, "
+                f"stability_margin={self.stability_margin}, repair={self.repair})")
+
+    def __str__(self):
+        """ Custom method for string representation of the FeasibilityFilter, giving its counts. """
+
+        return (f"Feasibility filter: {self.checked} checked, {self.rejected} rejected (simulations saved), "
+                f"{self.repaired} repaired, reasons {self.reasons}")
+
+    @property
+    def sims_saved(self) -> int:
+        """ The number of simulations saved by rejecting bodies. """
+
+        return self.rejected
+
+    def check(self, body):
+        """ Returns why a body is infeasible ("thin link", "unsupported"), or None if it is feasible. """
+
+        if min(body) < self.min_size:
+            return "thin link"
+
+        leg_h = body[11:15]
+        tallest = max(leg_h)
+
+        centers, footprints = _feet(body)
+
+        # The body (at the origin) and the four legs all have mass 1
+        com = (sum(center[0] for center in centers) / 5, sum(center[1] for center in centers) / 5)
+
+        if self.height_tolerance is None:
+            grounded = range(4)
+        else:
+            grounded = [i for i in range(4) if leg_h[i] >= tallest - self.height_tolerance]
+
+        support = [corner for i in grounded for corner in footprints[i]]
+
+        if _inside_margin(com, _convex_hull(support)) < self.stability_margin:
+            return "unsupported"
+
+        return None
+
+    def repair_body(self, body) -> list:
+        """ Returns a copy of a body with every dimension at least min_size and (with a height_tolerance) every leg
+            within height_tolerance of the tallest one, so that it stands on all four legs.
+        """
+
+        repaired = [max(float(value), self.min_size) for value in body]
+
+        if self.height_tolerance is not None:
+            tallest = max(repaired[11:15])
+            for i in range(11, 15):
+                repaired[i] = max(repaired[i], tallest - self.height_tolerance)
+
+        return repaired
+
+    def filter(self, body):
+        """ Checks a body and counts the result.
+
+            Returns
+            -------
+            list[float]
+                The body to simulate: the body itself if it is feasible, its repaired copy if it was repaired, or
+                None if it was rejected
+        """
+
+        self.checked += 1
+        reason = self.check(body)
+
+        if reason is None:
+            return body
+
+        self.reasons[reason] = self.reasons.get(reason, 0) + 1
+
+        if self.repair:
+            repaired = self.repair_body(body)
+
+            if self.check(repaired) is None:
+                self.repaired += 1
+                return repaired
+
+        self.rejected += 1
+        return None
@@ -7,10 +7,34 @@ generate_bodies.py
 Last Modified: 11/18/2024
 """
 
-import pyrosim.pyrosim as ps
+import io
+import os
 
+import pybullet as p
+from pyrosim.builder import BUILDER
+
+
+def generate_body(body_num, body_dims, target=None):
+    """ Writes the urdf of the robot described by the 15 body parameters.
+
+        Each call writes through its own pyrosim BUILDER, so bodies can be generated from several threads at once.
+
+        Parameters
+        ----------
+        body_num : int
+            The number of the body, which names its urdf (body_{body_num}.urdf)
+        body_dims : list[float]
+            The body width, length, and height, then the widths, lengths, and heights of legs 1-4
+        target : str or text sink, optional
+            Where to write the urdf instead, a filename or any object with a write() method (default is None, which
+            writes body_{body_num}.urdf)
+
+        Returns
+        -------
+        str or text sink
+            The urdf file (or the target it was written to)
+    """
 
-def generate_body(body_num, body_dims):
     x = 0
     y = 0
     z = 0
@@ -23,39 +47,235 @@ def generate_body(body_num, body_dims):
     leg_l = [body_dims[7], body_dims[8], body_dims[9], body_dims[10]]
     leg_h = [body_dims[11], body_dims[12], body_dims[13], body_dims[14]]
 
-    body_urdf = f"body_{body_num}.urdf"
+    body_urdf = f"body_{body_num}.urdf" if target is None else target
 
-    ps.Start_URDF(body_urdf)
-    ps.Send_Cube(name="Body", pos=[x, y, z + (max(leg_h) + 0.5*body_h)], size=[body_w, body_l, body_h])  # Body
+    builder = BUILDER(body_urdf).Start_URDF()
+    builder.Send_Cube(name="Body", pos=[x, y, z + (max(leg_h) + 0.5*body_h)], size=[body_w, body_l, body_h])  # Body
 
     # Joint 1, Leg 1
-    ps.Send_Joint(name="Body_Leg1", parent="Body", child="Leg1", type="revolute", position=[x - (0.5*body_w),
-                                                                                            y - (0.5*body_l),
-                                                                                            z + max(leg_h)])
-    ps.Send_Cube(name="Leg1", pos=[-(0.5*leg_w[0]), -0.5*leg_l[0], -0.5*leg_h[0]],
-                 size=[leg_w[0], leg_l[0], leg_h[0]])  # Leg1
+    builder.Send_Joint(name="Body_Leg1", parent="Body", child="Leg1", type="revolute", position=[x - (0.5*body_w),
+                                                                                                 y - (0.5*body_l),
+                                                                                                 z + max(leg_h)])
+    builder.Send_Cube(name="Leg1", pos=[-(0.5*leg_w[0]), -0.5*leg_l[0], -0.5*leg_h[0]],
+                      size=[leg_w[0], leg_l[0], leg_h[0]])  # Leg1
 
     # Joint 2, Leg 2
-    ps.Send_Joint(name="Body_Leg2", parent="Body", child="Leg2", type="revolute", position=[x + (0.5 * body_w),
-                                                                                            y - (0.5 * body_l),
-                                                                                            z + max(leg_h)])
-    ps.Send_Cube(name="Leg2", pos=[(0.5 * leg_w[1]), -0.5 * leg_l[1], -0.5 * leg_h[1]],
-                 size=[leg_w[1], leg_l[1], leg_h[1]])  # Leg2
+    builder.Send_Joint(name="Body_Leg2", parent="Body", child="Leg2", type="revolute", position=[x + (0.5 * body_w),
+                                                                                                 y - (0.5 * body_l),
+                                                                                                 z + max(leg_h)])
+    builder.Send_Cube(name="Leg2", pos=[(0.5 * leg_w[1]), -0.5 * leg_l[1], -0.5 * leg_h[1]],
+                      size=[leg_w[1], leg_l[1], leg_h[1]])  # Leg2
 
     # Joint 3, Leg 3
-    ps.Send_Joint(name="Body_Leg3", parent="Body", child="Leg3", type="revolute", position=[x + (0.5 * body_w),
-                                                                                            y + (0.5 * body_l),
-                                                                                            z + max(leg_h)])
-    ps.Send_Cube(name="Leg3", pos=[(0.5 * leg_w[2]), 0.5 * leg_l[2], -0.5 * leg_h[2]],
-                 size=[leg_w[2], leg_l[2], leg_h[2]])  # Leg3
+    builder.Send_Joint(name="Body_Leg3", parent="Body", child="Leg3", type="revolute", position=[x + (0.5 * body_w),
+                                                                                                 y + (0.5 * body_l),
+                                                                                                 z + max(leg_h)])
+    builder.Send_Cube(name="Leg3", pos=[(0.5 * leg_w[2]), 0.5 * leg_l[2], -0.5 * leg_h[2]],
+                      size=[leg_w[2], leg_l[2], leg_h[2]])  # Leg3
 
     # Joint 4, Leg 4
-    ps.Send_Joint(name="Body_Leg4", parent="Body", child="Leg4", type="revolute", position=[x - (0.5 * body_w),
-                                                                                            y + (0.5 * body_l),
-                                                                                            z + max(leg_h)])
-    ps.Send_Cube(name="Leg4", pos=[-(0.5 * leg_w[3]), 0.5 * leg_l[3], -0.5 * leg_h[3]],
-                 size=[leg_w[3], leg_l[3], leg_h[3]])  # Leg4
+    builder.Send_Joint(name="Body_Leg4", parent="Body", child="Leg4", type="revolute", position=[x - (0.5 * body_w),
+                                                                                                 y + (0.5 * body_l),
+                                                                                                 z + max(leg_h)])
+    builder.Send_Cube(name="Leg4", pos=[-(0.5 * leg_w[3]), 0.5 * leg_l[3], -0.5 * leg_h[3]],
+                      size=[leg_w[3], leg_l[3], leg_h[3]])  # Leg4
 
-    ps.End()
+    builder.End()
 
     return body_urdf
+
+
+def _slots(first):
+    # Three numbered placeholders of the urdf template, e.g. ['{6}', '{7}', '{8}']
+    return ["{" + str(first + i) + "}" for i in range(3)]
+
+
+def _build_template():
+    # Writes the urdf of a body with numbered placeholders in place of its numbers, with the same pyrosim writer as
+    # generate_body(), so the template has exactly the layout of the files it writes
+    template = io.StringIO()
+
+    builder = BUILDER(template).Start_URDF()
+    builder.Send_Cube(name="Body", pos=_slots(0), size=_slots(3))
+
+    for leg in range(4):
+        first = 6 + 9 * leg
+        builder.Send_Joint(name=f"Body_Leg{leg + 1}", parent="Body", child=f"Leg{leg + 1}", type="revolute",
+                           position=_slots(first))
+        builder.Send_Cube(name=f"Leg{leg + 1}", pos=_slots(first + 3), size=_slots(first + 6))
+
+    builder.End()
+
+    return template.getvalue()
+
+
+# The urdf of every body, with the 42 numbers that depend on its body parameters left as placeholders
+URDF_TEMPLATE = _build_template()
+
+
+def render_urdf(body_dims):
+    """ Renders the urdf of the robot described by the 15 body parameters into a string, by filling in the numbers of
+        URDF_TEMPLATE. The result is identical to the file generate_body() writes, without its many small writes.
+
+        Parameters
+        ----------
+        body_dims : list[float]
+            The body width, length, and height, then the widths, lengths, and heights of legs 1-4
+
+        Returns
+        -------
+        str
+            The urdf
+    """
+
+    # The same arithmetic as generate_body(), so every number is formatted identically
+    x = 0
+    y = 0
+    z = 0
+
+    body_w = body_dims[0]
+    body_l = body_dims[1]
+    body_h = body_dims[2]
+
+    leg_w = [body_dims[3], body_dims[4], body_dims[5], body_dims[6]]
+    leg_l = [body_dims[7], body_dims[8], body_dims[9], body_dims[10]]
+    leg_h = [body_dims[11], body_dims[12], body_dims[13], body_dims[14]]
+
+    values = [x, y, z + (max(leg_h) + 0.5*body_h), body_w, body_l, body_h,
+              # Joint 1, Leg 1
+              x - (0.5*body_w), y - (0.5*body_l), z + max(leg_h),
+              -(0.5*leg_w[0]), -0.5*leg_l[0], -0.5*leg_h[0], leg_w[0], leg_l[0], leg_h[0],
+              # Joint 2, Leg 2
+              x + (0.5 * body_w), y - (0.5 * body_l), z + max(leg_h),
+              (0.5 * leg_w[1]), -0.5 * leg_l[1], -0.5 * leg_h[1], leg_w[1], leg_l[1], leg_h[1],
+              # Joint 3, Leg 3
+              x + (0.5 * body_w), y + (0.5 * body_l), z + max(leg_h),
+              (0.5 * leg_w[2]), 0.5 * leg_l[2], -0.5 * leg_h[2], leg_w[2], leg_l[2], leg_h[2],
+              # Joint 4, Leg 4
+              x - (0.5 * body_w), y + (0.5 * body_l), z + max(leg_h),
+              -(0.5 * leg_w[3]), 0.5 * leg_l[3], -0.5 * leg_h[3], leg_w[3], leg_l[3], leg_h[3]]
+
+    return URDF_TEMPLATE.format(*[str(value) for value in values])
+
+
+def generate_bodies(bodies, first_num=0, directory=None):
+    """ Writes the urdfs of many bodies in one pass, rendering each from URDF_TEMPLATE and writing it with one write.
+
+        Parameters
+        ----------
+        bodies : list[list[float]]
+            The 15 body parameters of each body
+        first_num : int, optional
+            The number of the first body; the others are numbered consecutively (default is 0)
+        directory : str, optional
+            The directory the urdfs are written to (default is None, the working directory, as generate_body())
+
+        Returns
+        -------
+        list[str]
+            The urdf file of each body, named as generate_body() names it
+    """
+
+    body_urdfs = []
+
+    for i, body_dims in enumerate(bodies):
+        body_urdf = f"body_{first_num + i}.urdf"
+        if directory is not None:
+            body_urdf = os.path.join(directory, body_urdf)
+
+        with open(body_urdf, "w") as f:
+            f.write(render_urdf(body_dims))
+
+        body_urdfs.append(body_urdf)
+
+    return body_urdfs
+
+
+def _create_box(size, pos, client):
+    half_extents = [0.5 * size[0], 0.5 * size[1], 0.5 * size[2]]
+
+    collision = p.createCollisionShape(p.GEOM_BOX, halfExtents=half_extents, collisionFramePosition=pos,
+                                       physicsClientId=client)
+    visual = p.createVisualShape(p.GEOM_BOX, halfExtents=half_extents, visualFramePosition=pos,
+                                 rgbaColor=[0, 1.0, 1.0, 1.0], physicsClientId=client)
+
+    return collision, visual
+
+
+def create_body(body_dims, physicsClientId=0):
+    """ Builds the robot described by the 15 body parameters directly in a pybullet world, without writing or parsing
+        a urdf. The robot matches the one loaded from the urdf that generate_body() writes for the same parameters:
+        the same links, masses, collision boxes, inertial frames, and revolute joints with the same limits.
+
+        Simulations are identical to the urdf as long as no joint reaches its limit, which is always the case for the
+        default drivers used when evolving bodies. pybullet solves a reached limit slightly differently for bodies
+        made with createMultiBody than for bodies loaded from a urdf.
+
+        Parameters
+        ----------
+        body_dims : list[float]
+            The body width, length, and height, then the widths, lengths, and heights of legs 1-4
+        physicsClientId : int, optional
+            The pybullet client to build the robot in (default is 0)
+
+        Returns
+        -------
+        int
+            The id of the robot body
+    """
+
+    x = 0
+    y = 0
+    z = 0
+
+    body_w = body_dims[0]
+    body_l = body_dims[1]
+    body_h = body_dims[2]
+
+    leg_w = [body_dims[3], body_dims[4], body_dims[5], body_dims[6]]
+    leg_l = [body_dims[7], body_dims[8], body_dims[9], body_dims[10]]
+    leg_h = [body_dims[11], body_dims[12], body_dims[13], body_dims[14]]
+
+    # Body (the root link's frame is the world origin, as when loading the urdf)
+    body_pos = [x, y, z + (max(leg_h) + 0.5*body_h)]
+    body_collision, body_visual = _create_box([body_w, body_l, body_h], body_pos, physicsClientId)
+
+    # Joints 1-4, in the same positions as the urdf
+    joint_pos = [[x - (0.5 * body_w), y - (0.5 * body_l), z + max(leg_h)],
+                 [x + (0.5 * body_w), y - (0.5 * body_l), z + max(leg_h)],
+                 [x + (0.5 * body_w), y + (0.5 * body_l), z + max(leg_h)],
+                 [x - (0.5 * body_w), y + (0.5 * body_l), z + max(leg_h)]]
+
+    # Legs 1-4, relative to their joints
+    leg_pos = [[-(0.5 * leg_w[0]), -0.5 * leg_l[0], -0.5 * leg_h[0]],
+               [(0.5 * leg_w[1]), -0.5 * leg_l[1], -0.5 * leg_h[1]],
+               [(0.5 * leg_w[2]), 0.5 * leg_l[2], -0.5 * leg_h[2]],
+               [-(0.5 * leg_w[3]), 0.5 * leg_l[3], -0.5 * leg_h[3]]]
+
+    leg_shapes = [_create_box([leg_w[i], leg_l[i], leg_h[i]], leg_pos[i], physicsClientId) for i in range(4)]
+
+    # Joint frames are given relative to the parent link frame, which is the world origin for the body
+    robot_id = p.createMultiBody(baseMass=1,
+                                 baseCollisionShapeIndex=body_collision,
+                                 baseVisualShapeIndex=body_visual,
+                                 basePosition=[0, 0, 0],
+                                 baseInertialFramePosition=body_pos,
+                                 linkMasses=[1] * 4,
+                                 linkCollisionShapeIndices=[shape[0] for shape in leg_shapes],
+                                 linkVisualShapeIndices=[shape[1] for shape in leg_shapes],
+                                 linkPositions=joint_pos,
+                                 linkOrientations=[[0, 0, 0, 1]] * 4,
+                                 linkInertialFramePositions=leg_pos,
+                                 linkInertialFrameOrientations=[[0, 0, 0, 1]] * 4,
+                                 linkParentIndices=[0] * 4,
+                                 linkJointTypes=[p.JOINT_REVOLUTE] * 4,
+                                 linkJointAxis=[[0, 1, 0]] * 4,
+                                 physicsClientId=physicsClientId)
+
+    # Joint limits of the urdf (<limit lower="-3.14159" upper="3.14159"/>), which take part in the solver even when
+    # they are not reached
+    for joint in range(4):
+        p.changeDynamics(robot_id, joint, jointLowerLimit=-3.14159, jointUpperLimit=3.14159,
+                         physicsClientId=physicsClientId)
+
+    return robot_id
@@ -0,0 +1,180 @@
+"""
+© 2024 Emily Maxwell <maxwelea@rose-hulman.edu>
+SPDX License: BSD-3-Clause
+
+urdf_cache.py
+
+A content-addressed directory of body urdfs. generate_body() names each urdf by the body's index in the population and
+writes it to the working directory, so parallel workers or concurrent trials overwrite each other's files, and a body
+that has not changed is written again every time it is needed. Here, each urdf is named by a hash of the body's
+parameters instead: a body that is already in the directory reuses its file, and any number of processes can share
+the directory, since a file never changes once it is written.
+
+Files are written to a temporary file in the same directory and then renamed into place, so no process ever sees a
+partly written urdf. When the directory grows past its size limit, the least recently used files are removed.
+"""
+
+import hashlib
+import os
+import tempfile
+import time
+
+import numpy as np
+
+import evolve_bodies.gen_sim_viz.generate_body as gb
+
+# Default directory of the cache (relative to the working directory) and its size limit
+DEFAULT_DIRECTORY = "urdf_cache"
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Files used this recently are never evicted, since another process may be about to load them
+MIN_AGE = 60
+
+
+class UrdfCache:
+    """ A size-bounded directory of body urdfs named by a hash of their body parameters.
+
+        Attributes
+        ----------
+        directory : str
+            The directory of the cache
+        max_bytes : int
+            The size the directory is kept under (files used in the last MIN_AGE seconds are never removed)
+        size : int
+            The size of the directory in bytes, as last measured (including files written by other processes)
+        hits : int
+            The number of requested urdfs that were already in the directory
+        misses : int
+            The number of requested urdfs that had to be written
+        evictions : int
+            The number of files removed to keep the directory under max_bytes
+
+        Methods
+        -------
+        key(body_dims)
+            Returns the hash that names the urdf of a body
+        path(body_dims)
+            Returns the urdf of a body, writing it if it is not in the directory yet
+        evict()
+            Removes the least recently used files until the directory is under max_bytes
+    """
+
+    def __init__(self, directory: str = DEFAULT_DIRECTORY, max_bytes: int = DEFAULT_MAX_BYTES):
+        """ Parameters
+            ----------
+            directory : str, optional
+                The directory of the cache, created if it does not exist (default is urdf_cache in the working
+                directory)
+            max_bytes : int, optional
+                The size the directory is kept under (default is 64 MiB)
+        """
+
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self.size = sum(entry.stat().st_size for entry in self._entries())
+
+    def __str__(self):
+        """ Custom method for string representation of the UrdfCache, giving its hit and miss counts. """
+
+        return (f"URDF cache {self.directory}: {self.hits} hits, {self.misses} written, {self.evictions} evicted, "
+                f"{self.size / 1024:.0f} KiB")
+
+    @staticmethod
+    def key(body_dims) -> str:
+        """ Returns the hash that names the urdf of a body (the same hash of its parameters as FitnessCache.body_digest()). """
+
+        return hashlib.sha256(b"genome:" + np.asarray(body_dims, dtype=np.float64).tobytes()).hexdigest()
+
+    def path(self, body_dims) -> str:
+        """ Returns the urdf of a body, writing it (atomically) if it is not in the directory yet.
+
+            Parameters
+            ----------
+            body_dims : list[float]
+                The 15 body parameters
+
+            Returns
+            -------
+            str
+                The path of the urdf
+        """
+
+        body_urdf = os.path.join(self.directory, f"body_{self.key(body_dims)[:32]}.urdf")
+
+        try:
+            # Mark the file as recently used, so it is evicted last
+            os.utime(body_urdf)
+            self.hits += 1
+            return body_urdf
+        except FileNotFoundError:
+            pass
+
+        urdf = gb.render_urdf(body_dims)
+
+        fd, temporary = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(urdf)
+            os.replace(temporary, body_urdf)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+        self.misses += 1
+        self.size += len(urdf)
+
+        if self.size > self.max_bytes:
+            self.evict()
+
+        return body_urdf
+
+    def evict(self) -> int:
+        """ Removes the least recently used files until the directory is under 90% of max_bytes (so that it is not
+            scanned again on the next write), skipping files used in the last MIN_AGE seconds.
+
+            Returns
+            -------
+            int
+                The number of files removed
+        """
+
+        entries = []
+        for entry in self._entries():
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        self.size = sum(size for _, size, _ in entries)
+        target = 0.9 * self.max_bytes
+        cutoff = time.time() - MIN_AGE
+        removed = 0
+
+        for mtime, size, path in sorted(entries):
+            if self.size <= target or mtime > cutoff:
+                break
+
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                # Another process sharing the directory removed it first
+                pass
+
+            self.size -= size
+            removed += 1
+
+        self.evictions += removed
+        return removed
+
+# ------------------ Private methods ------------------
+
+    def _entries(self):
+        with os.scandir(self.directory) as entries:
+            return [entry for entry in entries if entry.name.endswith(".urdf") and entry.is_file()]
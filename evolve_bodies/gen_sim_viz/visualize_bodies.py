@@ -7,19 +7,23 @@ visualize_bodies.py
 Last Modified: 11/20/2024
 """
 
-import pandas as pd
+import os
+
 import numpy as np
 import matplotlib.pyplot as plt
 import evolve_bodies.gen_sim_viz.body_trial as bt
+import results_store as rs
 import simulate_body_gui as sbg
+import simulate_body_nogui as sb
 
+# Body parameter columns of a body trial
+BODY_COLUMNS = rs.COLUMNS["body"][2:]
 
-def visualize_trial(trial_number: int):
 
-    filename = f"trial_bodies/body_trial_{trial_number}.csv"
-    df = pd.read_csv(filename)
+def visualize_trial(trial_number: int):
 
-    fitness = np.array(df.Fitness)
+    with rs.load_store() as store:
+        fitness = store.column("body", trial_number, "Fitness")
 
     plt.plot(fitness)
     plt.xlabel("Generation")
@@ -29,9 +33,9 @@ def visualize_trial(trial_number: int):
 
 
 def load_simulate_body(trial_number: int):
-    filename = f"trial_bodies/body_trial_{trial_number}.csv"
-    df = pd.read_csv(filename)
-    last = np.array(df.loc[1000]['body_w':'legh_4'])
+    with rs.load_store() as store:
+        final = store.generation("body", trial_number)
+    last = np.array([final[column] for column in BODY_COLUMNS])
 
     urdf = bt.generate_urdf(last, trial_number)
     distance = sbg.simulate_body_gui(urdf)
@@ -39,6 +43,22 @@ def load_simulate_body(trial_number: int):
     return distance
 
 
+def replay_body(trial_number: int, speed=1.0, stride=1):
+    # Simulate the most fit body headless only once, recording its trajectory, and replay the recording afterwards
+    filename = f"trial_bodies/body_trial_{trial_number}.csv"
+    recording = f"trial_bodies/body_trial_{trial_number}_replay.npz"
+
+    if not os.path.exists(recording) or os.path.getmtime(recording) < os.path.getmtime(filename):
+        with rs.load_store() as store:
+            final = store.generation("body", trial_number)
+        last = np.array([final[column] for column in BODY_COLUMNS])
+
+        # Built from its body parameters, which are stored in the recording, so no urdf file can change under it
+        sb.simulate_body(last.tolist(), record=recording)
+
+    sbg.replay_body_gui(recording, speed, stride)
+
+
 def body_results(trial_number: int):
     visualize_trial(trial_number)
     load_simulate_body(trial_number)
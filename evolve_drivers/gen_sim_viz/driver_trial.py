@@ -8,7 +8,16 @@ Last Modified: 11/18/2024
 """
 
 import simulate_body_nogui as sb
-from genalgs import Microbial
+from async_evolution import AsyncEvolution
+from checkpoint import load_checkpoint, save_checkpoint
+from experiment_logger import ExperimentLogger
+from fitness_cache import FitnessCache
+from multi_fidelity import MultiFidelityEvaluator
+from genalgs import ArrayMicrobial, CMAES, Microbial
+
+import functools
+import os
+import random
 
 import numpy as np
 import pandas as pd
@@ -33,63 +42,296 @@ def randomize_drivers(num_drivers: int):
     return all_drivers
 
 
+def evaluate_driver(driver, body: str):
+    # Fitness of a driver on a body, with the persistent session of the calling (worker) process
+    return sb.evaluate_body(body, amplitude=tuple(driver[0:4]), phase_offset=tuple(driver[4:8]), warm_start=True)
+
+
 def driver_trial(num_drivers: int, body_num: int, generations: int, title: str, prob_reproduction = 0.8,
-                 prob_mutation = 0.1, mutation_deviation = 0.05, encoding_type = 1, minimise = False):
+                 prob_mutation = 0.1, mutation_deviation = 0.05, encoding_type = 1, minimise = False,
+                 workers = None, cache: FitnessCache = None, array_population = False,
+                 batch_size = 1, checkpoint = None, checkpoint_interval = 50, resume = None,
+                 multi_fidelity: MultiFidelityEvaluator = None, seed = None):
+
+    # Screening runs in the trial's own session, in the trial's direction of optimisation
+    if multi_fidelity is not None:
+        multi_fidelity.validate(minimise, batch_size)
+
+    # A seed makes the trial reproducible: it seeds the random drivers and the genetic algorithm
+    if seed is not None:
+        random.seed(seed)
+        np.random.seed(seed)
 
-    # Generate amplitudes and phase offsets
-    drivers = randomize_drivers(num_drivers)
     body = f"body_{body_num}.urdf"
 
-    # Find the fitness for each driver for the chosen body (final distance from starting point)
-    fitness = []
-    for i in range(len(drivers)):
-        distance = sb.simulate_body(body, amplitude=drivers[i][0:4], phase_offset=drivers[i][4:8])
-        fitness.append(distance[-1])
+    # Drivers that were already simulated on this body with the same settings are looked up instead of simulated
+    if cache is None:
+        cache = FitnessCache()
+    physics = sb.physics_settings()
 
-    ga = Microbial(drivers, fitness, prob_reproduction, prob_mutation, mutation_deviation, encoding_type, minimise)
+    # The body is the same for every driver, so its urdf is hashed once for all of their cache keys
+    body_digest = FitnessCache.body_digest(body)
 
-    # Create pandas dataframe to info related to fitness
-    columns = ('Generation', 'Fitness', 'amp_1', 'amp_2', 'amp_3', 'amp_4', 'phase_1', 'phase_2', 'phase_3', 'phase_4')
+    # Columns of the logged history of the most fit driver
+    columns = ('Generation', 'Fitness', 'amp_1', 'amp_2', 'amp_3', 'amp_4', 'phase_1', 'phase_2', 'phase_3',
+               'phase_4')
 
-    error = (None, None)
-    most_fit = ga.getMostFit()
+    if resume is not None:
+        # Continue a trial from its last checkpoint (which also restores the random number generators)
+        state = load_checkpoint(resume)
+        ga = state["ga"]
+        fitness = state["fitness"]
+        start = state["generation"]
+        drivers = ga.population
+    else:
+        # Generate amplitudes and phase offsets
+        drivers = randomize_drivers(num_drivers)
+
+        # Find the fitness for each driver for the chosen body (final distance from starting point)
+        keys = [FitnessCache.key(body_digest, driver[0:4], driver[4:8], physics=physics) for driver in drivers]
+        fitness = [cache.get(key) for key in keys]
+        misses = [i for i in range(len(drivers)) if fitness[i] is None]
+
+        if misses:
+            distances = sb.evaluate_population(body, amplitudes=[drivers[i][0:4] for i in misses],
+                                               phase_offsets=[drivers[i][4:8] for i in misses], workers=workers,
+                                               warm_start=True)
+            for i, distance in zip(misses, distances):
+                fitness[i] = distance
+                cache.put(keys[i], distance)
+
+        # The array-backed Microbial keeps the population in one NumPy matrix and vectorizes its operators
+        if array_population:
+            ga = ArrayMicrobial(drivers, fitness, prob_reproduction, prob_mutation, mutation_deviation, encoding_type,
+                                minimise, rng=np.random.default_rng(seed))
+        else:
+            ga = Microbial(drivers, fitness, prob_reproduction, prob_mutation, mutation_deviation, encoding_type,
+                           minimise)
 
-    while most_fit == error:
         most_fit = ga.getMostFit()
 
-    data = [0, most_fit[1]]
-    data.extend(most_fit[0])
+        start = 0
+
+    # Every generation is appended to the history as soon as it is done (a resumed trial continues its history)
+    logger = ExperimentLogger(f'body_2_drivers/driver_trial_{title}.csv', columns,
+                              resume_generation=start if resume is not None else None)
+
+    if resume is None:
+        logger.log(0, most_fit[1], most_fit[0], mean_fitness=np.mean(fitness), cache=cache)
 
-    df = pd.DataFrame(columns=columns)
-    df.loc[0] = data
+    # Reuse one simulator for every evaluation in the generational loop, loading the body only once
+    session = sb.SimulationSession()
+
+    # With batched tournaments, the new drivers of each generation are simulated in parallel by a reused pool
+    pool = sb.make_pool(workers) if batch_size > 1 else None
 
     # Generational loop for genetic algorithm
-    for i in range(generations):
-        output = ga.cycle()
+    for i in range(start, generations):
+        if batch_size > 1:
+            drivers, individuals = ga.cycle_batch(batch_size)
+        else:
+            output = ga.cycle()
+            drivers = output[0]
+            individuals = [output[1]]
+
         print(f"Generation {i+1} of {generations}")
 
-        drivers = output[0]
-        individual = output[1]
+        keys = {}
+        to_simulate = []
+
+        for individual in individuals:
+            keys[individual] = FitnessCache.key(body_digest, drivers[individual][0:4], drivers[individual][4:8],
+                                                physics=physics)
+            distance = cache.get(keys[individual])
 
-        fitness[individual] = sb.simulate_body(body, amplitude=drivers[individual][0:4],
-                                               phase_offset=drivers[individual][4:8])[-1]
+            if distance is None:
+                to_simulate.append(individual)
+            else:
+                fitness[individual] = distance
+
+        # Only full-length fitness values are cached, not the estimates of screened-out drivers
+        cacheable = set(to_simulate)
+
+        if pool is not None and len(to_simulate) > 1:
+            distances = sb.evaluate_population(body, amplitudes=[drivers[j][0:4] for j in to_simulate],
+                                               phase_offsets=[drivers[j][4:8] for j in to_simulate], pool=pool,
+                                               warm_start=True)
+        elif multi_fidelity is not None:
+            # Screen each new driver and simulate it to full length only if it could come close to the best driver
+            best = ga.getMostFit()[1]
+            distances = []
+            for j in to_simulate:
+                distances.append(multi_fidelity.fitness(session, body, drivers[j][0:4], drivers[j][4:8], best=best,
+                                                        warm_start=True))
+                if not multi_fidelity.last_promoted:
+                    cacheable.discard(j)
+        else:
+            distances = [session.fitness(body, amplitude=drivers[j][0:4], phase_offset=drivers[j][4:8],
+                                         warm_start=True)
+                         for j in to_simulate]
+
+        for individual, distance in zip(to_simulate, distances):
+            fitness[individual] = distance
+            if individual in cacheable:
+                cache.put(keys[individual], distance)
 
         ga.setFitness(fitness)
 
-        # Add most fit member of the population to dataframe
+        # Log the most fit member of the population and the statistics of this generation
         most_fit = ga.getMostFit()
-        new_data = [i+1, most_fit[1]]
-        new_data.extend(most_fit[0])
-        df.loc[len(df.index)] = new_data
+        logger.log(i+1, most_fit[1], most_fit[0], replaced=individuals,
+                   new_fitness=[fitness[individual] for individual in individuals], mean_fitness=np.mean(fitness),
+                   simulations=len(to_simulate), cache=cache)
+
+        # Save the whole state of the trial every checkpoint_interval generations (with its history on disk)
+        if checkpoint is not None and (i+1) % checkpoint_interval == 0:
+            logger.flush()
+            save_checkpoint(checkpoint, ga=ga, fitness=fitness, generation=i+1)
+
+    if pool is not None:
+        pool.shutdown()
+    session.close()
 
-    # Set the generation as the index in the datafram
-    df.set_index('Generation', inplace=True)
-    print(df)
+    logger.close()
+    print(pd.read_csv(logger.path, index_col='Generation'))
 
     # Print best fitness and most fit body
     best_body = ga.getMostFit()
     print(f"Best Fitness: {best_body[1]}, Body: {best_body[0]}")
-
-    df.to_csv(f'body_2_drivers/driver_trial_{title}.csv')
+    print(cache)
+    if multi_fidelity is not None:
+        print(multi_fidelity)
+        multi_fidelity.save(f'body_2_drivers/driver_trial_{title}_fidelity.csv')
 
     return drivers, fitness
+
+
+def cma_driver_trial(body_num: int, generations: int, title: str, sigma = 1.0, popsize = None, workers = None,
+                     cache: FitnessCache = None, seed = None):
+
+    # CMA-ES searches the same space as randomize_params(), starting from its center
+    lower = [-amp_lim] * 4 + [-2*np.pi] * 4
+    upper = [amp_lim] * 4 + [2*np.pi] * 4
+    es = CMAES([0] * 8, sigma, popsize, lower, upper, rng=np.random.default_rng(seed))
+
+    body = f"body_{body_num}.urdf"
+
+    if cache is None:
+        cache = FitnessCache()
+    physics = sb.physics_settings()
+
+    # The body is the same for every driver, so its urdf is hashed once for all of their cache keys
+    body_digest = FitnessCache.body_digest(body)
+
+    # Every generation is appended to the history of the most fit driver as soon as it is done
+    columns = ('Generation', 'Fitness', 'amp_1', 'amp_2', 'amp_3', 'amp_4', 'phase_1', 'phase_2', 'phase_3', 'phase_4')
+    logger = ExperimentLogger(f'body_2_drivers/cma_driver_trial_{title}.csv', columns)
+
+    # Each generation's whole batch of drivers is simulated in parallel by one reused pool
+    pool = sb.make_pool(workers)
+
+    for i in range(generations):
+        drivers = es.ask()
+        print(f"Generation {i+1} of {generations}")
+
+        keys = [FitnessCache.key(body_digest, driver[0:4], driver[4:8], physics=physics) for driver in drivers]
+        fitness = [cache.get(key) for key in keys]
+        misses = [j for j in range(len(drivers)) if fitness[j] is None]
+
+        if misses:
+            distances = sb.evaluate_population(body, amplitudes=[drivers[j][0:4] for j in misses],
+                                               phase_offsets=[drivers[j][4:8] for j in misses], pool=pool,
+                                               warm_start=True)
+            for j, distance in zip(misses, distances):
+                fitness[j] = distance
+                cache.put(keys[j], distance)
+
+        es.tell(fitness)
+
+        # Log the most fit driver so far and the statistics of this generation
+        most_fit = es.getMostFit()
+        logger.log(i+1, most_fit[1], most_fit[0], new_fitness=list(fitness), mean_fitness=np.mean(fitness),
+                   simulations=len(misses), cache=cache)
+
+    pool.shutdown()
+
+    logger.close()
+    print(pd.read_csv(logger.path, index_col='Generation'))
+
+    # Print best fitness and most fit driver
+    best_driver = es.getMostFit()
+    print(f"Best Fitness: {best_driver[1]}, Driver: {best_driver[0]} ({es.evaluations} simulations)")
+    print(cache)
+
+    return es
+
+
+def async_driver_trial(num_drivers: int, body_num: int, evaluations: int, title: str, prob_reproduction = 0.8,
+                       prob_mutation = 0.1, mutation_deviation = 0.05, encoding_type = 1, minimise = False,
+                       workers = None, in_flight = None, cache: FitnessCache = None, seed = None):
+
+    # A seed makes the trial reproducible: it seeds the random drivers and the genetic algorithm
+    if seed is not None:
+        random.seed(seed)
+        np.random.seed(seed)
+
+    # Generate amplitudes and phase offsets
+    drivers = randomize_drivers(num_drivers)
+    body = f"body_{body_num}.urdf"
+
+    if cache is None:
+        cache = FitnessCache()
+    physics = sb.physics_settings()
+
+    # The body is the same for every driver, so its urdf is hashed once for all of their cache keys
+    body_digest = FitnessCache.body_digest(body)
+
+    pool = sb.make_pool(workers)
+
+    # Find the fitness for each driver for the chosen body (final distance from starting point)
+    keys = [FitnessCache.key(body_digest, driver[0:4], driver[4:8], physics=physics) for driver in drivers]
+    fitness = [cache.get(key) for key in keys]
+    misses = [i for i in range(len(drivers)) if fitness[i] is None]
+
+    if misses:
+        distances = sb.evaluate_population(body, amplitudes=[drivers[i][0:4] for i in misses],
+                                           phase_offsets=[drivers[i][4:8] for i in misses], pool=pool,
+                                           warm_start=True)
+        for i, distance in zip(misses, distances):
+            fitness[i] = distance
+            cache.put(keys[i], distance)
+
+    ga = ArrayMicrobial(drivers, fitness, prob_reproduction, prob_mutation, mutation_deviation, encoding_type, minimise,
+                        rng=np.random.default_rng(seed))
+
+    # Log the most fit driver after each evaluation
+    columns = ('Generation', 'Fitness', 'amp_1', 'amp_2', 'amp_3', 'amp_4', 'phase_1', 'phase_2', 'phase_3', 'phase_4')
+
+    logger = ExperimentLogger(f'body_2_drivers/driver_trial_{title}.csv', columns)
+    logger.log(0, ga.best_fitness, ga.most_fit, mean_fitness=np.mean(ga.fitness), cache=cache)
+
+    def log(evaluation, index, distance, simulated):
+        print(f"Evaluation {evaluation} of {evaluations}")
+        most_fit = ga.getMostFit()
+        # Each row counts the simulation of its own evaluation (none if its fitness came from the cache)
+        logger.log(evaluation, most_fit[1], most_fit[0], replaced=index, new_fitness=distance,
+                   mean_fitness=evolution.mean_fitness(), simulations=int(simulated), cache=cache)
+
+    # Keep every worker busy, giving each fitness back to the GA as soon as it arrives
+    evolution = AsyncEvolution(ga, functools.partial(evaluate_driver, body=body), pool,
+                               in_flight or workers or os.cpu_count(), cache,
+                               lambda driver: FitnessCache.key(body_digest, driver[0:4], driver[4:8], physics=physics))
+    rate = evolution.run(evaluations, log)
+
+    pool.shutdown()
+
+    logger.close()
+    print(pd.read_csv(logger.path, index_col='Generation'))
+
+    # Print best fitness and most fit driver
+    best_driver = ga.getMostFit()
+    print(f"Best Fitness: {best_driver[1]}, Driver: {best_driver[0].tolist()}")
+    print(f"{evolution} ({rate:.2f} evaluations per second)")
+    print(cache)
+
+    return ga.population, ga.fitness
@@ -7,17 +7,18 @@ visualize_bodies.py
 Last Modified: 11/20/2024
 """
 
-import pandas as pd
+import os
+
 import numpy as np
 import matplotlib.pyplot as plt
+import results_store as rs
 import simulate_body_gui as sbg
+import simulate_body_nogui as sb
 
 
 def visualize_trial(trial_number: int, body_number: int):
-    filename = f"gen_sim_viz/body_{body_number}_drivers/driver_trial_{trial_number}.csv"
-    df = pd.read_csv(filename)
-
-    fitness = np.array(df.Fitness)
+    with rs.load_store() as store:
+        fitness = store.column("driver", trial_number, "Fitness", body_number)
 
     plt.plot(fitness)
     plt.xlabel("Generation")
@@ -27,10 +28,10 @@ def visualize_trial(trial_number: int, body_number: int):
 
 
 def load_simulate_driver(trial_number: int, body_number: int):
-    filename = f"gen_sim_viz/body_{body_number}_drivers/driver_trial_{trial_number}.csv"
-    df = pd.read_csv(filename)
-    amp = list(df.loc[1000]['amp_1':'amp_4'])
-    phase = list(df.loc[1000]['phase_1':'phase_4'])
+    with rs.load_store() as store:
+        final = store.generation("driver", trial_number, body_number=body_number)
+    amp = [final['amp_1'], final['amp_2'], final['amp_3'], final['amp_4']]
+    phase = [final['phase_1'], final['phase_2'], final['phase_3'], final['phase_4']]
 
     urdf = f"gen_sim_viz/body_{body_number}.urdf"
     distance = sbg.simulate_body_gui(urdf, amplitude=amp, phase_offset=phase)
@@ -38,6 +39,23 @@ def load_simulate_driver(trial_number: int, body_number: int):
     return distance
 
 
+def replay_driver(trial_number: int, body_number: int, speed=1.0, stride=1):
+    # Simulate the most fit driver headless only once, recording its trajectory, and replay the recording afterwards
+    filename = f"gen_sim_viz/body_{body_number}_drivers/driver_trial_{trial_number}.csv"
+    recording = f"gen_sim_viz/body_{body_number}_drivers/driver_trial_{trial_number}_replay.npz"
+
+    if not os.path.exists(recording) or os.path.getmtime(recording) < os.path.getmtime(filename):
+        with rs.load_store() as store:
+            final = store.generation("driver", trial_number, body_number=body_number)
+        amp = [final['amp_1'], final['amp_2'], final['amp_3'], final['amp_4']]
+        phase = [final['phase_1'], final['phase_2'], final['phase_3'], final['phase_4']]
+
+        urdf = f"gen_sim_viz/body_{body_number}.urdf"
+        sb.simulate_body(urdf, amplitude=amp, phase_offset=phase, record=recording)
+
+    sbg.replay_body_gui(recording, speed, stride)
+
+
 def driver_results(trial_number: int, body_number: int):
     visualize_trial(trial_number, body_number)
     load_simulate_driver(trial_number, body_number)
@@ -54,17 +72,20 @@ def plot_drivers(num_trials: int, body_number: int):
     phase3 = []
     phase4 = []
 
+    # Final generation of every trial, in one query
+    with rs.load_store() as store:
+        finals = store.finals("driver", body_number=body_number)
+
     for i in range(num_trials):
-        filename = f"gen_sim_viz/body_{body_number}_drivers/driver_trial_{i}.csv"
-        df = pd.read_csv(filename)
-        amp1.append(df.loc[1000]['amp_1'])
-        amp2.append(df.loc[1000]['amp_2'])
-        amp3.append(df.loc[1000]['amp_3'])
-        amp4.append(df.loc[1000]['amp_4'])
-        phase1.append(df.loc[1000]['phase_1'])
-        phase2.append(df.loc[1000]['phase_2'])
-        phase3.append(df.loc[1000]['phase_3'])
-        phase4.append(df.loc[1000]['phase_4'])
+        final = finals[i]
+        amp1.append(final['amp_1'])
+        amp2.append(final['amp_2'])
+        amp3.append(final['amp_3'])
+        amp4.append(final['amp_4'])
+        phase1.append(final['phase_1'])
+        phase2.append(final['phase_2'])
+        phase3.append(final['phase_3'])
+        phase4.append(final['phase_4'])
 
     duration = 10000
     x = np.linspace(0, 0.003 * duration * np.pi, duration)
@@ -0,0 +1,178 @@
+"""
+© 2024 Emily Maxwell <maxwelea@rose-hulman.edu>
+SPDX License: BSD-3-Clause
+
+experiment_logger.py
+
+An append-only log of a GA trial. Instead of growing a pandas DataFrame by one row per generation and writing it only
+at the end of the trial, every generation is appended to the trial's CSV file as soon as it is done, at a constant cost
+per generation, and the file is flushed periodically so that a crashed trial keeps its history.
+
+Two files are written:
+    * the history of the most fit individual, in the same layout as the DataFrames the trials used to write (e.g.
+      body_trial_{title}.csv), so the visualize scripts can read it unchanged
+    * a statistics log next to it (e.g. body_trial_{title}_stats.csv), with the elapsed time, simulations per second,
+      fitness cache hits, and which individuals were replaced in each generation
+"""
+
+import os
+import time
+
+# Columns of the statistics log
+STATS_COLUMNS = ('Generation', 'Elapsed', 'Evals_per_sec', 'Simulations', 'Cache_hits', 'Cache_misses', 'Replaced',
+                 'New_fitness', 'Mean_fitness')
+
+
+def _value(value) -> str:
+    # Floats are written the way pandas wrote them (their repr), so the files are unchanged from before
+    return repr(float(value))
+
+
+def _values(values) -> str:
+    # Several values in one column (e.g. all the individuals replaced by a batched cycle) are separated by ;
+    if values is None:
+        return ''
+    if isinstance(values, (list, tuple)):
+        return ';'.join(str(value) for value in values)
+    return str(values)
+
+
+class ExperimentLogger:
+    """ Appends the history and statistics of a GA trial to CSV files, one row per generation.
+
+        Attributes
+        ----------
+        path : str
+            The CSV file of the history of the most fit individual
+        stats_path : str
+            The CSV file of the statistics of each generation
+        columns : tuple[str]
+            The columns of the history, starting with 'Generation' and 'Fitness' followed by one column per gene
+        flush_interval : int
+            The number of generations between flushes to disk
+
+        Methods
+        -------
+        log(generation, fitness, individual, replaced=None, new_fitness=None, mean_fitness=None, simulations=0,
+            cache=None)
+            Appends one generation to the history and statistics
+        flush()
+            Writes all logged generations to disk
+        close()
+            Flushes and closes the files
+    """
+
+    def __init__(self, path: str, columns, flush_interval: int = 50, resume_generation: int = None):
+        """ Parameters
+            ----------
+            path : str
+                The CSV file of the history (the statistics are written next to it, with _stats added to the name)
+            columns : tuple[str]
+                The columns of the history, starting with 'Generation' and 'Fitness'
+            flush_interval : int, optional
+                The number of generations between flushes to disk (default is 50)
+            resume_generation : int, optional
+                When a trial is resumed from a checkpoint, the generation it resumes from. The existing files are kept
+                up to and including that generation, and anything logged after it is removed, since it will be logged
+                again. (Default is None, which starts new files.)
+        """
+
+        self.path = path
+        root, extension = os.path.splitext(path)
+        self.stats_path = f"{root}_stats{extension}"
+        self.columns = tuple(columns)
+        self.flush_interval = flush_interval
+
+        self.unflushed = 0
+        self.start_time = time.perf_counter()
+        self.simulations = 0
+
+        if resume_generation is None:
+            self.file = open(self.path, 'w')
+            self.stats_file = open(self.stats_path, 'w')
+            self.file.write(','.join(self.columns) + '\n')
+            self.stats_file.write(','.join(STATS_COLUMNS) + '\n')
+        else:
+            self.file = _truncate(self.path, resume_generation)
+            self.stats_file = _truncate(self.stats_path, resume_generation)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def log(self, generation: int, fitness: float, individual, replaced=None, new_fitness=None, mean_fitness=None,
+            simulations: int = 0, cache=None):
+        """ Appends one generation to the history and statistics.
+
+            Parameters
+            ----------
+            generation : int
+                The generation
+            fitness : float
+                The fitness of the most fit individual
+            individual : list[float]
+                The most fit individual
+            replaced : int or list[int], optional
+                The index (or indices) of the individual(s) replaced in this generation
+            new_fitness : float or list[float], optional
+                The fitness of the replaced individual(s)
+            mean_fitness : float, optional
+                The mean fitness of the population
+            simulations : int, optional
+                The number of simulations run in this generation (cache hits are not simulations)
+            cache : FitnessCache, optional
+                The trial's fitness cache, whose hit and miss counts are logged
+        """
+
+        self.file.write(f"{_value(generation)},{_value(fitness)},{','.join(_value(gene) for gene in individual)}\n")
+
+        self.simulations += simulations
+        elapsed = time.perf_counter() - self.start_time
+        rate = self.simulations / elapsed if elapsed else 0.0
+
+        if cache is not None:
+            hits, misses = cache.hits + cache.disk_hits, cache.misses
+        else:
+            hits, misses = '', ''
+
+        if isinstance(new_fitness, (list, tuple)):
+            new_fitness = [float(value) for value in new_fitness]
+
+        self.stats_file.write(f"{generation},{elapsed:.3f},{rate:.3f},{simulations},{hits},{misses},"
+                              f"{_values(replaced)},{_values(new_fitness)},"
+                              f"{'' if mean_fitness is None else float(mean_fitness)}\n")
+
+        self.unflushed += 1
+        if self.unflushed >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """ Writes all logged generations to disk (e.g. before saving a checkpoint). """
+
+        self.file.flush()
+        self.stats_file.flush()
+        self.unflushed = 0
+
+    def close(self):
+        """ Flushes and closes the files. """
+
+        if not self.file.closed:
+            self.file.close()
+            self.stats_file.close()
+
+
+def _truncate(path, generation):
+    # Reopens a log for appending, after cutting off the rows logged after the given generation
+    with open(path, 'r+b') as f:
+        offset = len(f.readline())
+
+        for line in f:
+            if line.strip() and float(line.split(b',', 1)[0]) > generation:
+                break
+            offset += len(line)
+
+        f.truncate(offset)
+
+    return open(path, 'a')
@@ -0,0 +1,195 @@
+"""
+© 2024 Emily Maxwell <maxwelea@rose-hulman.edu>
+SPDX License: BSD-3-Clause
+
+fitness_cache.py
+
+A content-addressed cache of simulated fitness values, so that a genome (or driver) that has already been simulated
+under the same settings never has to be simulated again.
+"""
+
+import hashlib
+import json
+import sqlite3
+from collections import OrderedDict
+
+import numpy as np
+
+
+class FitnessCache:
+    """ A fitness cache with an in-memory LRU front and an optional on-disk SQLite store behind it.
+
+        Fitness values are keyed by a hash of everything that determines the result of a simulation: the body (its
+        genome or the contents of its urdf), the motor amplitudes and phase offsets, the duration, and the physics
+        settings. The body is hashed on its own first (see body_digest()), so that the keys of many simulations of the
+        same body, e.g. of every driver in a driver trial, can share one hash of its urdf.
+
+        Attributes
+        ----------
+        path : str
+            The SQLite file backing the cache (None for a purely in-memory cache)
+        maxsize : int
+            The maximum number of fitness values kept in memory
+        hits : int
+            The number of lookups answered from memory
+        disk_hits : int
+            The number of lookups answered from the on-disk store
+        misses : int
+            The number of lookups that were not in the cache (and so needed a simulation)
+
+        Methods
+        -------
+        body_digest(body)
+            Returns the hash of a body, which can be passed to key() in place of the body
+        key(body, amplitude=(1, -1, -1, 1), phase_offset=(0, 0, 0, 0), duration=10000, physics=None)
+            Returns the cache key of a simulation
+        get(key)
+            Returns the cached fitness for a key, or None if it is not cached
+        put(key, fitness)
+            Stores a fitness in memory and on disk
+        stats()
+            Returns the hit and miss counts
+        close()
+            Closes the on-disk store
+    """
+
+    def __init__(self, path: str = None, maxsize: int = 4096):
+        """ Parameters
+            ----------
+            path : str, optional
+                The SQLite file backing the cache, created if it does not exist (default is None, which keeps the
+                cache in memory only)
+            maxsize : int, optional
+                The maximum number of fitness values kept in memory (default is 4096)
+        """
+
+        self.path = path
+        self.maxsize = maxsize
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self.memory = OrderedDict()
+        self.db = None
+
+        if path is not None:
+            self.db = sqlite3.connect(path)
+            self.db.execute("CREATE TABLE IF NOT EXISTS fitness (key TEXT PRIMARY KEY, fitness REAL NOT NULL)")
+            self.db.commit()
+
+    def __str__(self):
+        """ Custom method for string representation of the FitnessCache, giving its hit and miss counts. """
+
+        lookups = self.hits + self.disk_hits + self.misses
+        skipped = self.hits + self.disk_hits
+        rate = skipped / lookups if lookups else 0
+
+        return (f"Fitness cache: {self.hits} memory hits, {self.disk_hits} disk hits, {self.misses} misses "
+                f"({skipped} of {lookups} simulations skipped, {100 * rate:.1f}%)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @staticmethod
+    def body_digest(body) -> bytes:
+        """ Returns the hash of a body: of the contents of its urdf (since urdfs are rewritten under the same name) or
+            of the list of body parameters it is generated from. A hash (bytes) is returned unchanged.
+        """
+
+        if isinstance(body, bytes):
+            return body
+
+        if isinstance(body, str):
+            with open(body, "rb") as f:
+                return hashlib.sha256(b"urdf:" + f.read()).digest()
+
+        return hashlib.sha256(b"genome:" + np.asarray(body, dtype=np.float64).tobytes()).digest()
+
+    @staticmethod
+    def key(body, amplitude=(1, -1, -1, 1), phase_offset=(0, 0, 0, 0), duration=10000, physics=None) -> str:
+        """ Returns the cache key of a simulation.
+
+            Parameters
+            ----------
+            body : str or list[float] or bytes
+                The urdf of the body, the list of body parameters it is generated from, or its body_digest() (which
+                saves reading and hashing the urdf again for every key of the same body)
+            amplitude : list[float], optional
+                The amplitude of each leg motor (default is the simulate_body() default)
+            phase_offset : list[float], optional
+                The phase offset of each leg motor (default is the simulate_body() default)
+            duration : int, optional
+                The number of simulation steps (default is 10000)
+            physics : dict, optional
+                The physics settings of the simulation, e.g. simulate_body_nogui.physics_settings()
+
+            Returns
+            -------
+            str
+                A hex digest identifying the simulation
+        """
+
+        digest = hashlib.sha256(FitnessCache.body_digest(body))
+
+        digest.update(np.asarray(amplitude, dtype=np.float64).tobytes())
+        digest.update(np.asarray(phase_offset, dtype=np.float64).tobytes())
+        digest.update(str(int(duration)).encode())
+        digest.update(json.dumps(physics, sort_keys=True).encode())
+
+        return digest.hexdigest()
+
+    def get(self, key: str):
+        """ Returns the cached fitness for a key, or None (counted as a miss) if it is not cached. """
+
+        fitness = self.memory.get(key)
+
+        if fitness is not None:
+            self.memory.move_to_end(key)
+            self.hits += 1
+            return fitness
+
+        if self.db is not None:
+            row = self.db.execute("SELECT fitness FROM fitness WHERE key = ?", (key,)).fetchone()
+
+            if row is not None:
+                self._remember(key, row[0])
+                self.disk_hits += 1
+                return row[0]
+
+        self.misses += 1
+        return None
+
+    def put(self, key: str, fitness: float):
+        """ Stores a fitness in memory and, if the cache has a path, on disk. """
+
+        fitness = float(fitness)
+        self._remember(key, fitness)
+
+        if self.db is not None:
+            self.db.execute("INSERT OR REPLACE INTO fitness (key, fitness) VALUES (?, ?)", (key, fitness))
+            self.db.commit()
+
+    def stats(self) -> dict:
+        """ Returns the memory hit, disk hit, and miss counts. """
+
+        return {"hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses}
+
+    def close(self):
+        """ Closes the on-disk store. """
+
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+# ------------------ Private methods ------------------
+
+    def _remember(self, key, fitness):
+        self.memory[key] = fitness
+        self.memory.move_to_end(key)
+
+        if len(self.memory) > self.maxsize:
+            self.memory.popitem(last=False)
@@ -0,0 +1,140 @@
+"""
+© 2024 Emily Maxwell <maxwelea@rose-hulman.edu>
+SPDX License: BSD-3-Clause
+
+fitness_reducers.py
+
+Online reducers of a body's trajectory. Instead of keeping the position of the body at every step and computing a
+fitness from the whole trajectory afterwards, each reducer is fed one position per step and keeps only what it needs.
+
+Every reducer provides:
+    * reset() - called before each simulation, to clear any state from the previous one
+    * update(position) - called with the position of the body's center after every step
+    * result() - returns the reduced value
+
+As with get_distances() in simulate_body_nogui, distances are measured from the position after the first step.
+
+A reducer whose result depends on the length of a step has a simulation_timestep attribute, which the simulation sets
+to its own timestep before it starts (so it follows the fidelity of the session or batch it runs in).
+"""
+
+import math
+
+
+def _distance(start, position):
+    # Same arithmetic as get_distances(), so that reduced fitness values are identical to the full series
+    return math.sqrt((start[0] - position[0]) ** 2 +
+                     (start[1] - position[1]) ** 2 +
+                     (start[2] - position[2]) ** 2)
+
+
+class FinalDistance:
+    """ The distance between the body's first and last positions (the fitness used by the trials). """
+
+    def __init__(self):
+        self.start = None
+        self.position = None
+
+    def __repr__(self):
+        return "FinalDistance()"
+
+    def reset(self):
+        self.start = None
+        self.position = None
+
+    def update(self, position):
+        if self.start is None:
+            self.start = position
+        self.position = position
+
+    def result(self):
+        if self.start is None:
+            return 0.0
+        return _distance(self.start, self.position)
+
+
+class MaxDistance:
+    """ The largest distance between the body's first position and any later position. """
+
+    def __init__(self):
+        self.start = None
+        self.max_distance = 0.0
+
+    def __repr__(self):
+        return "MaxDistance()"
+
+    def reset(self):
+        self.start = None
+        self.max_distance = 0.0
+
+    def update(self, position):
+        if self.start is None:
+            self.start = position
+            return
+
+        distance = _distance(self.start, position)
+        if distance > self.max_distance:
+            self.max_distance = distance
+
+    def result(self):
+        return self.max_distance
+
+
+class PathLength:
+    """ The total length of the path travelled by the body. """
+
+    def __init__(self):
+        self.position = None
+        self.length = 0.0
+
+    def __repr__(self):
+        return "PathLength()"
+
+    def reset(self):
+        self.position = None
+        self.length = 0.0
+
+    def update(self, position):
+        if self.position is not None:
+            self.length += _distance(self.position, position)
+        self.position = position
+
+    def result(self):
+        return self.length
+
+
+class MeanVelocity:
+    """ The body's mean velocity (its final distance divided by the elapsed simulated time), in m/s.
+
+        Attributes
+        ----------
+        timestep : float
+            The length of one simulation step in seconds (None to use the timestep of the simulation)
+        simulation_timestep : float
+            The timestep of the simulation the reducer runs in, set by the simulation (None until then)
+    """
+
+    def __init__(self, timestep: float = None):
+        self.timestep = timestep
+        self.simulation_timestep = None
+        self.final_distance = FinalDistance()
+        self.steps = 0
+
+    def __repr__(self):
+        return f"MeanVelocity(timestep={self.timestep})"
+
+    def reset(self):
+        self.final_distance.reset()
+        self.steps = 0
+
+    def update(self, position):
+        self.final_distance.update(position)
+        self.steps += 1
+
+    def result(self):
+        if self.steps < 2:
+            return 0.0
+        timestep = self.simulation_timestep if self.timestep is None else self.timestep
+        if timestep is None:
+            raise ValueError("MeanVelocity needs a timestep when it is not run in a simulation")
+        return self.final_distance.result() / ((self.steps - 1) * timestep)
@@ -0,0 +1,178 @@
+"""
+© 2024 Emily Maxwell <maxwelea@rose-hulman.edu>
+SPDX License: BSD-3-Clause
+
+ArrayMicrobial.py
+
+Distribution Statement: Distribution A
+"""
+
+import numpy as np
+from genalgs import Microbial
+
+
+class ArrayMicrobial(Microbial):
+    """ A Microbial Genetic Algorithm whose population is a 2-D NumPy array, child class of Microbial.
+
+        The algorithm is the same as Microbial\'s, but every operator works on whole rows of the population matrix:
+        infection copies the winner\'s genes through one random mask instead of drawing a random number per gene in
+        a Python loop, and all random numbers come from a single numpy.random.Generator (instead of a mix of the
+        random and numpy.random modules), so a run can be reproduced from its seed.
+
+        For inherited attributes and methods, refer to the Microbial and GeneticAlgorithm class documentation.
+
+        Attributes
+        ----------
+        population : np.ndarray
+            A (population size, genome length) array of individuals, of dtype uint8 for a binary encoding and float64
+            for a real-valued encoding. Each individual is a row, and is modified in place.
+        fitness : np.ndarray
+            A float64 array of fitness values, where a given index represents the fitness value of the individual at
+            that same index in the population
+        replaced : np.ndarray
+            A uint8 array with a 1 at the index of each individual replaced in the last cycle (reused every cycle)
+        rng : np.random.Generator
+            The random number generator used by every operator
+    """
+
+    def __init__(self, initial_population, fitness, prob_reproduction, prob_mutation, mutation_deviation=0.01,
+                 encoding_type=0, minimise=False, name="ArrayMicrobial", deme_size: int = None, rng=None):
+        """ Converts the population and fitness to arrays, then calls __init__ from the parent class (Microbial).
+            (For the other parameters, refer to the Microbial class documentation.)
+
+            Parameters
+            ----------
+            initial_population : list[list] or np.ndarray
+                The starting population, one individual per row. It is copied into a new array.
+            fitness : list[float] or np.ndarray
+                The fitness of each individual in the starting population
+            rng : np.random.Generator or int, optional
+                The random number generator, or a seed for a new one (default is None, which seeds a new generator
+                from the operating system)
+        """
+
+        dtype = np.float64 if encoding_type else np.uint8
+        initial_population = np.array(initial_population, dtype=dtype, ndmin=2)
+        fitness = np.array(fitness, dtype=np.float64)
+
+        self.rng = np.random.default_rng(rng)
+
+        super().__init__(initial_population, fitness, prob_reproduction, prob_mutation, mutation_deviation,
+                         encoding_type, minimise, name, deme_size)
+
+        self.genome_length = self.population.shape[1]
+        self.replaced = np.zeros(self.population_size, dtype=np.uint8)
+
+    def setFitness(self, fitness):
+        """ Sets self.fitness to the input fitness values (as a float64 array) and recalculates self.best_fitness and
+            self.most_fit.
+
+            Parameters
+            ----------
+            fitness : list[float] or np.ndarray
+                An input of fitness values, where a given index represents the fitness value of the individual at that
+                same index in the population
+        """
+
+        self.fitness = np.asarray(fitness, dtype=np.float64)
+        self.findMostFit()
+
+    def findMostFit(self):
+        """ Determines the most fit individual in the population and its fitness and sets self.most_fit (a copy of the
+            individual, so it is not changed by later cycles) and self.best_fitness accordingly.
+        """
+
+        best = int(np.argmin(self.fitness * self.minimise))
+
+        self.best_fitness = float(self.fitness[best])
+        self.most_fit = self.population[best].copy()
+
+    def select(self, verbosity=0) -> tuple[int, int]:
+        """ Randomly selects two individuals from the same deme (local "neighborhood"), as in Microbial.select(), but
+            using self.rng.
+        """
+
+        index = int(self.rng.integers(self.population_size))
+
+        if self.deme_size:
+            # Any offset in [-deme_size, deme_size] except 0
+            offset = int(self.rng.integers(1, 2 * self.deme_size + 1))
+            if offset > self.deme_size:
+                offset = self.deme_size - offset
+        else:
+            # Any other index in the population
+            offset = int(self.rng.integers(1, self.population_size))
+
+        index2 = (index + offset) % self.population_size
+
+        if verbosity == 2:
+            print(f"Population Members Selected: {self.population[index]} (index = {index}, "
+                  f"score = {self.fitness[index]}), {self.population[index2]}, (index = {index2}, "
+                  f"score = {self.fitness[index2]})")
+
+        return index, index2
+
+    def reproduce(self, index1, index2, verbosity=0) -> int:
+        """ With some probability self.prob_reproduction, each gene of the more fit individual will replace the gene of
+            the less fit individual. The genes to replace are chosen with one random mask over the whole genome.
+
+            (For parameters and return value, refer to Microbial.reproduce().)
+        """
+
+        if self.minimise * self.fitness[index1] < self.minimise * self.fitness[index2]:
+            win, replace = index1, index2
+        else:
+            win, replace = index2, index1
+
+        winner = self.population[win]
+        loser = self.population[replace]
+
+        if verbosity == 2:
+            print(f"Winner: {winner} (score = {self.fitness[win]}), Loser: {loser} "
+                  f"(score = {self.fitness[replace]})")
+
+        infect = self.rng.random(self.genome_length) <= self.prob_reproduction
+        np.copyto(loser, winner, where=infect)
+
+        if verbosity == 2:
+            print(f'''Infected Loser: {loser} (replaces individual at index {replace})''')
+
+        self.replaced[replace] = 1
+        self.loser_index = replace
+
+        return self.loser_index
+
+    def bit_mutate(self, index, verbosity: int = 0):
+        """ With some probability prob_mutation, a random bit will be flipped in the individual at the given index in
+            the population.
+        """
+
+        if self.rng.random() <= self.prob_mutation:
+            to_flip = int(self.rng.integers(self.genome_length))
+            self.population[index, to_flip] ^= 1
+
+            if verbosity == 2:
+                print(f"Mutation to {self.population[index, to_flip]} at gene {to_flip}")
+                print(f"Infected, mutated individual: {self.population[index]} (index = {index})")
+
+    def real_mutate(self, index, verbosity: int = 0):
+        """ With some probability prob_mutation, a random gene of the individual at the given index in the population
+            will be changed by +- mutation_deviation of its value.
+        """
+
+        if self.rng.random() <= self.prob_mutation:
+            to_mutate = int(self.rng.integers(self.genome_length))
+            sign = 1 if self.rng.random() < 0.5 else -1
+            self.population[index, to_mutate] += self.population[index, to_mutate] * self.mutation_deviation * sign
+
+            if verbosity == 2:
+                print(f"Mutation at gene {to_mutate}")
+                print(f"Infected, mutated individual: {self.population[index]} (index = {index})")
+
+    def reset_replaced(self):
+        """ Clears the replaced array in place at the start of each cycle. """
+
+        self.replaced.fill(0)
+
+    def _randrange(self, stop) -> int:
+        return int(self.rng.integers(stop))
@@ -0,0 +1,105 @@
+"""
+© 2024 Emily Maxwell <maxwelea@rose-hulman.edu>
+SPDX License: BSD-3-Clause
+
+AskTellOptimizer.py
+
+Distribution Statement: Distribution A
+"""
+
+
+class AskTellOptimizer:
+    """ A parent class for optimizers with an ask/tell interface.
+
+        Where a GeneticAlgorithm keeps a whole population and replaces individuals one cycle at a time, an ask/tell
+        optimizer proposes a batch of candidate solutions with ask(), and is told their fitness (in the same order)
+        with tell(). As with GeneticAlgorithm, the fitness function is handled outside the optimizer, so each batch can
+        be evaluated however is fastest (e.g. in parallel with simulate_body_nogui.evaluate_population()).
+
+        Each child class will be responsible for implementing the following methods:
+            * ask() - returns a batch of candidate solutions to evaluate
+            * tell(fitness) - updates the optimizer with the fitness of the last batch from ask()
+
+        Attributes
+        ----------
+        minimise : int
+            1 if the optimizer minimises the fitness, -1 if it maximises it (as in GeneticAlgorithm)
+        name : str
+            The name of the optimizer (used for printing/ID purposes)
+        generation : int
+            The number of batches that have been told so far
+        evaluations : int
+            The number of candidate solutions that have been told so far
+        most_fit : list[float]
+            The most fit candidate solution told so far
+        best_fitness : float
+            The fitness of the most fit candidate solution told so far
+
+        Methods
+        -------
+        ask()
+            Returns a batch of candidate solutions to evaluate
+        tell(fitness)
+            Updates the optimizer with the fitness of the last batch from ask()
+        getMostFit()
+            Returns the most fit candidate solution told so far and its fitness
+    """
+
+    def __init__(self, minimise=False, name="AskTell"):
+        """ Parameters
+            ----------
+            minimise : bool, optional
+                Whether the optimizer will minimise or maximise the fitness (default is False)
+            name : str, optional
+                The name of the optimizer (default is 'AskTell')
+        """
+
+        self.minimise = 1 if minimise else -1
+        self.name = name
+
+        self.generation = 0
+        self.evaluations = 0
+
+        self.most_fit = None
+        self.best_fitness = None
+
+    def __str__(self):
+        """ Custom method for string representation of the optimizer. """
+
+        minim = True if self.minimise == 1 else False
+        return f"{self.name} optimizer after {self.generation} generations ({self.evaluations} evaluations), " \
+               f"minimise = {minim}"
+
+    def ask(self):
+        """ Returns a batch of candidate solutions to evaluate. """
+
+        raise NotImplementedError
+
+    def tell(self, fitness):
+        """ Updates the optimizer with the fitness of the last batch from ask(), in the same order. """
+
+        raise NotImplementedError
+
+    def getMostFit(self):
+        """ Returns the most fit candidate solution told so far and its fitness.
+
+            Returns
+            -------
+            tuple(list[float], float)
+                The most fit candidate solution and its fitness
+        """
+
+        return self.most_fit, self.best_fitness
+
+    def updateMostFit(self, solutions, fitness):
+        """ Updates self.most_fit and self.best_fitness with a batch of candidate solutions and their fitness, and
+        counts the batch.
+        """
+
+        for solution, value in zip(solutions, fitness):
+            if self.best_fitness is None or value * self.minimise < self.best_fitness * self.minimise:
+                self.best_fitness = float(value)
+                self.most_fit = [float(gene) for gene in solution]
+
+        self.generation += 1
+        self.evaluations += len(fitness)
@@ -0,0 +1,172 @@
+"""
+© 2024 Emily Maxwell <maxwelea@rose-hulman.edu>
+SPDX License: BSD-3-Clause
+
+CMAES.py
+
+Distribution Statement: Distribution A
+"""
+
+import numpy as np
+from genalgs.AskTellOptimizer import AskTellOptimizer
+
+
+class CMAES(AskTellOptimizer):
+    """ The Covariance Matrix Adaptation Evolution Strategy (CMA-ES), child class of AskTellOptimizer.
+
+        Algorithm Methodology:
+            1. Sample a batch of candidate solutions from a multivariate normal distribution N(mean, sigma^2 C)
+            2. Rank the candidates by fitness
+            3. Move the mean towards the weighted mean of the best half of the candidates
+            4. Adapt the covariance matrix C towards the directions in which the best candidates were found, and the
+               step size sigma according to how far the mean has been moving
+
+        The update follows N. Hansen, "The CMA Evolution Strategy: A Tutorial" (2016), with its default parameters.
+
+        For inherited attributes and methods, refer to the AskTellOptimizer class documentation.
+
+        Attributes
+        ----------
+        mean : np.ndarray
+            The mean of the search distribution
+        sigma : float
+            The step size of the search distribution
+        popsize : int
+            The number of candidate solutions proposed by each ask()
+        lower, upper : np.ndarray
+            Bounds of the search space (candidates are clipped to them), or None
+        rng : np.random.Generator
+            The random number generator used for sampling
+    """
+
+    def __init__(self, initial_mean, sigma, popsize: int = None, lower=None, upper=None, minimise=False,
+                 name="CMA-ES", rng=None):
+        """ Parameters
+            ----------
+            initial_mean : list[float]
+                The starting mean of the search distribution (also sets the number of dimensions)
+            sigma : float
+                The starting step size, roughly a quarter of the width of the region expected to hold the optimum
+            popsize : int, optional
+                The number of candidate solutions proposed by each ask() (default is 4 + 3 ln(dimensions))
+            lower, upper : list[float], optional
+                Bounds of the search space. Candidates outside them are clipped, and the clipped candidates are the
+                ones evaluated and used to update the distribution
+            minimise : bool, optional
+                Whether the optimizer will minimise or maximise the fitness (default is False)
+            name : str, optional
+                The name of the optimizer (default is 'CMA-ES')
+            rng : np.random.Generator or int, optional
+                The random number generator, or a seed for a new one (default is None)
+        """
+
+        super().__init__(minimise, name)
+
+        self.mean = np.array(initial_mean, dtype=np.float64)
+        self.sigma = float(sigma)
+        self.dimensions = n = len(self.mean)
+        self.popsize = popsize if popsize else 4 + int(3 * np.log(n))
+        self.lower = None if lower is None else np.asarray(lower, dtype=np.float64)
+        self.upper = None if upper is None else np.asarray(upper, dtype=np.float64)
+        self.rng = np.random.default_rng(rng)
+
+        # Recombination weights of the best half of each batch
+        self.mu = self.popsize // 2
+        weights = np.log((self.popsize + 1) / 2) - np.log(np.arange(1, self.mu + 1))
+        self.weights = weights / weights.sum()
+        self.mu_eff = 1 / np.sum(self.weights ** 2)
+
+        # Learning rates of the step size and covariance matrix
+        self.c_sigma = (self.mu_eff + 2) / (n + self.mu_eff + 5)
+        self.d_sigma = 1 + 2 * max(0, np.sqrt((self.mu_eff - 1) / (n + 1)) - 1) + self.c_sigma
+        self.c_c = (4 + self.mu_eff / n) / (n + 4 + 2 * self.mu_eff / n)
+        self.c_1 = 2 / ((n + 1.3) ** 2 + self.mu_eff)
+        self.c_mu = min(1 - self.c_1, 2 * (self.mu_eff - 2 + 1 / self.mu_eff) / ((n + 2) ** 2 + self.mu_eff))
+        self.chi_n = np.sqrt(n) * (1 - 1 / (4 * n) + 1 / (21 * n ** 2))
+
+        # Evolution paths and covariance matrix (kept with its eigendecomposition C = B D^2 B^T)
+        self.p_sigma = np.zeros(n)
+        self.p_c = np.zeros(n)
+        self.C = np.eye(n)
+        self.B = np.eye(n)
+        self.D = np.ones(n)
+        self.eigen_generation = 0
+
+        self.solutions = None
+
+    def __str__(self):
+        """ Custom method for string representation of CMA-ES, with its batch size and current step size. """
+
+        return super().__str__() + f", batch size {self.popsize}, and step size {self.sigma:.4g}"
+
+    def ask(self) -> np.ndarray:
+        """ Samples a batch of candidate solutions from the search distribution.
+
+            Returns
+            -------
+            np.ndarray
+                A (popsize, dimensions) array, one candidate solution per row
+        """
+
+        z = self.rng.standard_normal((self.popsize, self.dimensions))
+        solutions = self.mean + self.sigma * (z * self.D) @ self.B.T
+
+        if self.lower is not None or self.upper is not None:
+            solutions = np.clip(solutions, self.lower, self.upper)
+
+        self.solutions = solutions
+        return solutions.copy()
+
+    def tell(self, fitness):
+        """ Updates the search distribution with the fitness of the last batch from ask().
+
+            Parameters
+            ----------
+            fitness : list[float]
+                The fitness of each candidate solution from the last ask(), in the same order
+        """
+
+        if self.solutions is None:
+            raise RuntimeError("tell() must follow ask()")
+
+        fitness = np.asarray(fitness, dtype=np.float64)
+        if len(fitness) != self.popsize:
+            raise ValueError(f"expected {self.popsize} fitness values, got {len(fitness)}")
+
+        n = self.dimensions
+        solutions = self.solutions
+        self.solutions = None
+        self.updateMostFit(solutions, fitness)
+
+        # Best candidates first
+        order = np.argsort(fitness * self.minimise, kind="stable")
+        steps = (solutions[order[:self.mu]] - self.mean) / self.sigma
+
+        old_mean = self.mean
+        step = self.weights @ steps
+        self.mean = old_mean + self.sigma * step
+
+        # C^(-1/2) applied to the mean step
+        inv_sqrt_step = self.B @ ((self.B.T @ step) / self.D)
+
+        self.p_sigma = ((1 - self.c_sigma) * self.p_sigma +
+                        np.sqrt(self.c_sigma * (2 - self.c_sigma) * self.mu_eff) * inv_sqrt_step)
+
+        norm = np.linalg.norm(self.p_sigma)
+        h_sigma = norm / np.sqrt(1 - (1 - self.c_sigma) ** (2 * self.generation)) < (1.4 + 2 / (n + 1)) * self.chi_n
+
+        self.p_c = (1 - self.c_c) * self.p_c + h_sigma * np.sqrt(self.c_c * (2 - self.c_c) * self.mu_eff) * step
+
+        rank_mu = (steps.T * self.weights) @ steps
+        self.C = ((1 - self.c_1 - self.c_mu) * self.C +
+                  self.c_1 * (np.outer(self.p_c, self.p_c) + (not h_sigma) * self.c_c * (2 - self.c_c) * self.C) +
+                  self.c_mu * rank_mu)
+
+        self.sigma *= np.exp((self.c_sigma / self.d_sigma) * (norm / self.chi_n - 1))
+
+        # The eigendecomposition is only refreshed every few generations, as it is the most expensive part
+        if self.generation - self.eigen_generation > 1 / (self.c_1 + self.c_mu) / n / 10:
+            self.eigen_generation = self.generation
+            self.C = np.triu(self.C) + np.triu(self.C, 1).T
+            eigenvalues, self.B = np.linalg.eigh(self.C)
+            self.D = np.sqrt(np.maximum(eigenvalues, 1e-20))
@@ -148,6 +148,8 @@ class GeneticAlgorithm:
         """
 
         current_best = self.fitness[0] * self.minimise
+        self.best_fitness = self.fitness[0]
+        self.most_fit = self.population[0]
 
         for i in range(1, len(self.fitness)):
             current_fitness = self.fitness[i] * self.minimise
@@ -0,0 +1,214 @@
+"""
+© 2024 Emily Maxwell <maxwelea@rose-hulman.edu>
+SPDX License: BSD-3-Clause
+
+IslandModel.py
+
+Distribution Statement: Distribution A
+"""
+
+import multiprocessing as mp
+import random as rd
+
+import numpy as np
+from genalgs.ArrayMicrobial import ArrayMicrobial
+from genalgs.Microbial import Microbial
+
+
+class IslandModel:
+    """ An island model of Microbial Genetic Algorithms, each evolving its own population in its own process.
+
+        Algorithm Methodology:
+            1. Each island evaluates its initial population and then runs Microbial cycles independently, evaluating
+               each infected individual in its own process (so a simulation-based fitness function uses all cores)
+            2. Every migration_interval cycles, each island sends copies of its best individuals to the next island
+               in a ring, over a pipe
+            3. The received migrants replace the least fit individuals of the island, if they are more fit
+
+        Unlike the GeneticAlgorithm classes, the island model needs the fitness function, since every island evaluates
+        its own individuals. It must be picklable (a module-level function, or a functools.partial of one), and any
+        simulator it uses should be created by the process that calls it, e.g. simulate_body_nogui.evaluate_body().
+
+        Attributes
+        ----------
+        populations : list[list[list]]
+            The initial population of each island
+        evaluate : callable
+            The fitness function, called with one individual and returning its fitness
+        migration_interval : int
+            The number of cycles between migrations
+        migrants : int
+            The number of individuals each island sends at each migration
+        array_population : bool
+            Whether the islands use ArrayMicrobial instead of Microbial
+        most_fit : list
+            The most fit individual found by any island (after run())
+        best_fitness : float
+            The fitness of the most fit individual found by any island (after run())
+        results : list[dict]
+            The final population, fitness, and history of each island (after run())
+
+        Methods
+        -------
+        run(cycles, verbosity=0)
+            Evolves every island for the given number of cycles, and returns the results of each island
+        getMostFit()
+            Returns the most fit individual found by any island and its fitness
+    """
+
+    def __init__(self, populations, evaluate, prob_reproduction, prob_mutation, mutation_deviation=0.01,
+                 encoding_type=0, minimise=False, deme_size: int = None, migration_interval: int = 50,
+                 migrants: int = 1, array_population=False, seed=None):
+        """ Parameters
+            ----------
+            populations : list[list[list]]
+                The initial population of each island (at least two islands)
+            evaluate : callable
+                The fitness function, called with one individual and returning its fitness
+            migration_interval : int, optional
+                The number of cycles between migrations (default is 50)
+            migrants : int, optional
+                The number of individuals each island sends at each migration (default is 1)
+            array_population : bool, optional
+                Whether the islands use ArrayMicrobial instead of Microbial (default is False)
+            seed : int, optional
+                Seed for the islands\' random number generators, each of which gets an independent stream (default is
+                None, which seeds them from the operating system). Without it, islands started by forking would all
+                continue the parent\'s random sequence.
+
+            For the other parameters, refer to the Microbial class documentation.
+        """
+
+        if len(populations) < 2:
+            raise ValueError("an island model needs at least two islands")
+
+        self.populations = populations
+        self.evaluate = evaluate
+        self.settings = dict(prob_reproduction=prob_reproduction, prob_mutation=prob_mutation,
+                             mutation_deviation=mutation_deviation, encoding_type=encoding_type, minimise=minimise,
+                             deme_size=deme_size)
+        self.minimise = 1 if minimise else -1
+        self.migration_interval = migration_interval
+        self.migrants = migrants
+        self.array_population = array_population
+        self.seed = seed
+
+        self.most_fit = None
+        self.best_fitness = None
+        self.results = None
+
+    def __str__(self):
+        """ Custom method for string representation of the island model. """
+
+        sizes = ", ".join(str(len(population)) for population in self.populations)
+        return (f"Island model of {len(self.populations)} Microbial Genetic Algorithms (population sizes {sizes}), "
+                f"migrating {self.migrants} individual(s) every {self.migration_interval} cycles")
+
+    def run(self, cycles, verbosity=0) -> list[dict]:
+        """ Evolves every island in its own process for the given number of cycles.
+
+            Parameters
+            ----------
+            cycles : int
+                The number of Microbial cycles each island runs
+            verbosity : int, optional
+                0 for no printout, 1 to print each island\'s progress at every migration
+
+            Returns
+            -------
+            list[dict]
+                For each island, its final "population" and "fitness", and its "history": a list with the
+                (best fitness, most fit individual) of the island after its initial evaluation and after each cycle
+        """
+
+        islands = len(self.populations)
+        seeds = np.random.SeedSequence(self.seed).spawn(islands)
+
+        # Ring of one-way pipes: island i sends to island i + 1
+        ring = [mp.Pipe(duplex=False) for _ in range(islands)]
+        results = [mp.Pipe(duplex=False) for _ in range(islands)]
+
+        processes = []
+        for i in range(islands):
+            inbox = ring[(i - 1) % islands][0]
+            outbox = ring[i][1]
+
+            process = mp.Process(target=_island, args=(i, self.populations[i], self.evaluate, self.settings,
+                                                       self.array_population, seeds[i], cycles,
+                                                       self.migration_interval, self.migrants, inbox, outbox,
+                                                       results[i][1], verbosity))
+            process.start()
+            processes.append(process)
+
+        self.results = [receiver.recv() for receiver, _ in results]
+
+        for process in processes:
+            process.join()
+
+        for result in self.results:
+            fitness, individual = result["history"][-1]
+            if self.best_fitness is None or fitness * self.minimise < self.best_fitness * self.minimise:
+                self.best_fitness = fitness
+                self.most_fit = individual
+
+        return self.results
+
+    def getMostFit(self):
+        """ Returns the most fit individual found by any island and its fitness (None, None before run()). """
+
+        return self.most_fit, self.best_fitness
+
+
+def _island(number, population, evaluate, settings, array_population, seed, cycles, migration_interval, migrants,
+            inbox, outbox, result, verbosity):
+    # Runs in the island's own process
+
+    # Independent random streams for Microbial (random and numpy.random) and ArrayMicrobial (its own Generator)
+    rd.seed(int(seed.generate_state(1)[0]))
+    np.random.seed(seed.generate_state(1))
+
+    fitness = [evaluate(individual) for individual in population]
+
+    if array_population:
+        ga = ArrayMicrobial(population, fitness, rng=np.random.default_rng(seed), name=f"Island {number}", **settings)
+    else:
+        ga = Microbial([list(individual) for individual in population], fitness, name=f"Island {number}", **settings)
+
+    history = [(ga.best_fitness, list(ga.most_fit))]
+
+    for i in range(1, cycles + 1):
+        population, individual = ga.cycle()
+
+        fitness = list(ga.fitness)
+        fitness[individual] = evaluate(population[individual])
+        ga.setFitness(fitness)
+
+        if i % migration_interval == 0:
+            _migrate(ga, migrants, inbox, outbox)
+            if verbosity == 1:
+                print(f"Island {number}: cycle {i} of {cycles}, best fitness {ga.best_fitness}")
+
+        history.append((ga.best_fitness, list(ga.most_fit)))
+
+    result.send({"population": [list(individual) for individual in ga.population], "fitness": list(ga.fitness),
+                 "history": history})
+
+
+def _ranked(ga) -> list[int]:
+    # Indices of the population from most to least fit
+    return sorted(range(ga.population_size), key=lambda i: ga.fitness[i] * ga.minimise)
+
+
+def _migrate(ga, migrants, inbox, outbox):
+    # Send copies of this island's best individuals, then let those of the previous island replace the worst ones.
+    # Every island sends before it receives, so the ring cannot deadlock.
+    ranked = _ranked(ga)
+    outbox.send([(list(ga.population[i]), ga.fitness[i]) for i in ranked[:migrants]])
+
+    fitness = list(ga.fitness)
+    for (individual, value), i in zip(inbox.recv(), reversed(ranked)):
+        if value * ga.minimise < fitness[i] * ga.minimise:
+            ga.population[i] = np.asarray(individual) if isinstance(ga.population, np.ndarray) else individual
+            fitness[i] = value
+
+    ga.setFitness(fitness)
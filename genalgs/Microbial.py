@@ -44,6 +44,11 @@ class Microbial(GeneticAlgorithm):
         cycle(verbosity=0)
             Completes one generational cycle of selection, reproduction, and mutation then returns the new population
             and the list of what member of the population was infected/replaced
+        select_disjoint(k, exclude=(), verbosity=0)
+            Chooses at random k pairs of individuals from the same deme, with no individual in more than one pair
+        cycle_batch(k, exclude=(), verbosity=0)
+            Completes k tournaments between disjoint pairs in one cycle then returns the new population and the
+            indices of all the individuals that were infected/replaced
     """
 
     def __init__(self, initial_population, fitness, prob_reproduction, prob_mutation, mutation_deviation=0.01,
@@ -132,6 +137,71 @@ class Microbial(GeneticAlgorithm):
 
         return index, index2
 
+    def deme(self, index) -> list[int]:
+        """ Returns the indices of the individuals that can be selected as the second parent of the individual at the
+            given index (every other individual in its deme, or in the whole population if there is no deme).
+        """
+
+        if self.deme_size:
+            return [(index + offset) % self.population_size
+                    for offset in range(-self.deme_size, self.deme_size + 1) if offset]
+
+        return [i for i in range(self.population_size) if i != index]
+
+    def select_disjoint(self, k, exclude=(), verbosity=0) -> list[tuple[int, int]]:
+        """ Randomly selects k pairs of individuals, with no individual in more than one pair.
+
+            Each pair is selected as in select(): the first parent is chosen from the individuals that are still
+            available, and the second from the available individuals in its deme. Since the pairs are disjoint, the
+            k tournaments can be played (and the k infected individuals evaluated) at the same time.
+
+            Parameters
+            ----------
+            k : int
+                The number of pairs to select
+            exclude : iterable[int], optional
+                Indices of individuals that may not be selected (e.g. because their fitness is still being evaluated)
+            verbosity : int, optional
+                An int of values 0, 1, or 2 corresponding to the verbosity of the printout. There will only be a
+                printout if the verbosity = 2.
+
+            Returns
+            -------
+            list[tuple[int, int]]
+                The indices of the two individuals in each pair. There are fewer than k pairs if there are not enough
+                available individuals left with an available individual in their deme.
+        """
+
+        available = set(range(self.population_size)).difference(exclude)
+        firsts = sorted(available)
+        pairs = []
+
+        while len(pairs) < k and firsts:
+            index = firsts[self._randrange(len(firsts))]
+            partners = [i for i in self.deme(index) if i in available]
+
+            if not partners:
+                # Available individuals only become fewer, so this one can never be the first parent of a pair
+                firsts.remove(index)
+                continue
+
+            index2 = partners[self._randrange(len(partners))]
+
+            available.discard(index)
+            available.discard(index2)
+            firsts.remove(index)
+            if index2 in firsts:
+                firsts.remove(index2)
+
+            if verbosity == 2:
+                print(f"Population Members Selected: {self.population[index]} (index = {index}, "
+                      f"score = {self.fitness[index]}), {self.population[index2]}, (index = {index2}, "
+                      f"score = {self.fitness[index2]})")
+
+            pairs.append((index, index2))
+
+        return pairs
+
     def reproduce(self, index1, index2, verbosity=0) -> int:
         """ With some probability self.prob_reproduction, each gene of the more fit individual will replace the gene of
             the less fit individual.
@@ -257,7 +327,7 @@ class Microbial(GeneticAlgorithm):
         """
 
         # Reset replaced list at the start of each cycle
-        self.replaced = [0] * self.population_size
+        self.reset_replaced()
 
         # Step 1: Choose 2 individuals through selection
         ind1, ind2 = self.select(verbosity)
@@ -278,3 +348,53 @@ class Microbial(GeneticAlgorithm):
 
         # Return the new population and the list of which individuals (in this case only 1) were replaced
         return self.population, self.loser_index
+
+    def cycle_batch(self, k, exclude=(), verbosity: int = 0):
+        """ Completes one generational cycle of k tournaments between disjoint pairs (see select_disjoint()), each
+            with reproduction and mutation, then returns the new population and the indices of the individuals that
+            were infected/replaced, so that their fitness can be evaluated concurrently.
+
+            With k = 1, this is the same as cycle() (except that a list of indices is returned).
+
+            Parameters
+            ----------
+            k : int
+                The number of tournaments
+            exclude : iterable[int], optional
+                Indices of individuals that may not take part in a tournament
+            verbosity : int, optional
+                An int of values 0, 1, or 2 corresponding to the verbosity of the printout (as in cycle())
+
+            Returns
+            -------
+            tuple[list[list[int]], list[int]]
+                The new population and the index of the individual that was infected/replaced in each tournament
+        """
+
+        self.reset_replaced()
+
+        losers = []
+
+        for ind1, ind2 in self.select_disjoint(k, exclude, verbosity):
+            loser_index = self.reproduce(ind1, ind2, verbosity)
+
+            if self.encoding_type:
+                self.real_mutate(loser_index, verbosity)
+            else:
+                self.bit_mutate(loser_index, verbosity)
+
+            if verbosity == 1:
+                print(f"Evolved Individual at index {loser_index}: {self.population[loser_index]}\n")
+
+            losers.append(loser_index)
+
+        return self.population, losers
+
+    def reset_replaced(self):
+        """ Clears the list of which individuals were replaced, at the start of each cycle. """
+
+        self.replaced = [0] * self.population_size
+
+    def _randrange(self, stop) -> int:
+        # A random index in [0, stop), from the random number generator this algorithm uses
+        return rd.randrange(0, stop)
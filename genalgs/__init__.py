@@ -24,3 +24,7 @@ Distribution Statement: Distribution C / CUI
 
 from genalgs.GeneticAlgorithm import GeneticAlgorithm
 from genalgs.Microbial import Microbial
+from genalgs.ArrayMicrobial import ArrayMicrobial
+from genalgs.AskTellOptimizer import AskTellOptimizer
+from genalgs.CMAES import CMAES
+from genalgs.IslandModel import IslandModel
@@ -0,0 +1,293 @@
+"""
+© 2024 Emily Maxwell <maxwelea@rose-hulman.edu>
+SPDX License: BSD-3-Clause
+
+multi_fidelity.py
+
+Multi-fidelity fitness evaluation. In the Microbial genetic algorithm a new individual only has to lose its tournament,
+so there is no need to know its exact fitness if it is clearly worse than the population's best. Every simulation
+first runs a short screening (screen_steps of the full duration). Only a candidate whose screening distance, scaled to
+the full duration, could plausibly reach promote_fraction of the current best fitness is promoted and simulated to its
+full length. The simulation carries on from where the screening stopped, so a promoted candidate costs no more than
+before.
+
+A screened-out candidate is given its screening distance scaled to the full duration (screen_fitness * duration /
+screen_steps), an estimate on the same scale as full-length fitness values. It is below promote_fraction of the best
+(above best / promote_fraction when minimising), so it loses its next tournaments against the better individuals,
+but it is only an estimate and must not be stored in a FitnessCache.
+
+The screening and full-length fitness of every promoted candidate are recorded, so the rank correlation between the
+two levels can be checked. Since only promising candidates are promoted, that correlation is measured on the upper
+part of the range only. With audit > 0, that fraction of the screened-out candidates is also simulated to full length
+(at full cost), for a sample of the whole range.
+
+The defaults are conservative. On random populations (see benchmarks/multi_fidelity.py), the distance after 1000
+steps barely predicts the full-length ranking (rank correlation 0.34 for drivers, 0.18 for bodies, whose screening
+distance is dominated by how they settle onto the ground), and screening with it drops some of the best drivers.
+After 2500 steps the correlation is 0.75 and 0.66, and with promote_fraction=0.25 all of the 5 best candidates are
+promoted while a third of the steps of drivers are saved (a few percent for bodies). Check the recorded statistics
+before screening harder.
+
+body_trial() and driver_trial() screen the candidates they simulate one at a time in their session, so they reject
+an evaluator together with batched tournaments (which are simulated on a worker pool), or one whose minimise differs
+from the trial's.
+"""
+
+import csv
+
+import numpy as np
+
+from stop_criteria import Screening
+
+
+def rank_correlation(x, y) -> float:
+    """ Returns the Spearman rank correlation of two sequences of values (nan with fewer than two values). """
+
+    if len(x) < 2:
+        return float("nan")
+
+    ranks_x = np.argsort(np.argsort(x))
+    ranks_y = np.argsort(np.argsort(y))
+
+    return float(np.corrcoef(ranks_x, ranks_y)[0, 1])
+
+
+class MultiFidelityEvaluator:
+    """ Screens each candidate with a short simulation and promotes only the promising ones to a full-length run.
+
+        Attributes
+        ----------
+        screen_steps : int
+            The number of steps of the screening simulation
+        duration : int
+            The number of steps of a full-length simulation
+        promote_fraction : float
+            The fraction of the current best fitness a candidate's scaled screening fitness must reach to be promoted
+        audit : float
+            The probability of simulating a screened-out candidate to full length anyway, to measure the rank
+            correlation between levels over the whole range
+        minimise : bool
+            Whether fitness is minimised
+        screened : int
+            The number of candidates screened
+        promoted : int
+            The number of candidates promoted to a full-length simulation
+        audited : int
+            The number of screened-out candidates simulated to full length anyway
+        stopped : int
+            The number of candidates stopped by another stop criterion before the end of their screening
+        steps : int
+            The number of simulation steps run
+        steps_saved : int
+            The number of simulation steps saved by screening candidates out
+        last_promoted : bool
+            Whether the last candidate was simulated to full length (so its fitness can be cached)
+        levels : list[tuple(float, float, bool)]
+            The screening fitness, full-length fitness, and whether it was an audit, of every candidate simulated to
+            full length
+        screened_out : list[float]
+            The screening fitness of every candidate that was screened out
+        rng : numpy.random.Generator
+            The random number generator of the audits, separate from the random streams of the genetic algorithm
+
+        Methods
+        -------
+        validate(minimise, batch_size=1)
+            Raises a ValueError if the evaluator cannot screen the candidates of a trial with these settings
+        threshold(best)
+            Returns the screening distance a candidate must reach to be promoted
+        fitness(session, body, amplitude=(1, -1, -1, 1), phase_offset=(0, 0, 0, 0), best=None, warm_start=False,
+                stop_criteria=None)
+            Screens a candidate, promotes it if it is promising, and returns its fitness
+        stats()
+            Returns the per-level statistics
+        save(path)
+            Writes the fitness of every candidate at both levels to a CSV file
+    """
+
+    def __init__(self, screen_steps: int = 2500, duration: int = 10000, promote_fraction: float = 0.25,
+                 audit: float = 0.0, minimise: bool = False, seed=None):
+        """ Parameters
+            ----------
+            screen_steps : int, optional
+                The number of steps of the screening simulation (default is 2500)
+            duration : int, optional
+                The number of steps of a full-length simulation (default is 10000, as the trials)
+            promote_fraction : float, optional
+                The fraction of the current best fitness a candidate's scaled screening fitness must reach to be
+                promoted (default is 0.25). 0 promotes every candidate.
+            audit : float, optional
+                The probability of simulating a screened-out candidate to full length anyway (default is 0.0)
+            minimise : bool, optional
+                Whether fitness is minimised (default is False)
+            seed : int, optional
+                The seed of the audits' random number generator (default is None, which seeds it from the OS)
+        """
+
+        if not 0 < screen_steps <= duration:
+            raise ValueError(f"screen_steps must be between 1 and duration ({duration}), not {screen_steps}")
+
+        self.screen_steps = screen_steps
+        self.duration = duration
+        self.promote_fraction = promote_fraction
+        self.audit = audit
+        self.minimise = minimise
+
+        self.screened = 0
+        self.promoted = 0
+        self.audited = 0
+        self.stopped = 0
+        self.steps = 0
+        self.steps_saved = 0
+        self.last_promoted = False
+        self.levels = []
+        self.screened_out = []
+        self.rng = np.random.default_rng(seed)
+
+    def __repr__(self):
+        return (f"MultiFidelityEvaluator(screen_steps={self.screen_steps}, duration={self.duration}, "
+                f"promote_fraction={self.promote_fraction}, audit={self.audit}, minimise={self.minimise})")
+
+    def __str__(self):
+        """ Custom method for string representation of the MultiFidelityEvaluator, giving its per-level counts. """
+
+        stats = self.stats()
+
+        return (f"Multi-fidelity: {stats['screened']} screened ({self.screen_steps} steps), {stats['promoted']} "
+                f"promoted ({self.duration} steps), {stats['audited']} audited, {stats['screened_out']} screened out, "
+                f"{stats['stopped']} stopped during screening, {stats['steps_saved_fraction']:.0%} of steps saved, "
+                f"rank correlation {stats['rank_correlation']:.3f}")
+
+    def validate(self, minimise: bool, batch_size: int = 1):
+        """ Raises a ValueError if the evaluator cannot screen the candidates of a trial with these settings: the
+            trial must optimise in the same direction, and simulate its candidates one at a time (batch_size 1).
+        """
+
+        if bool(minimise) != bool(self.minimise):
+            raise ValueError(f"the trial has minimise={minimise} but the multi-fidelity evaluator has "
+                             f"minimise={self.minimise}")
+
+        if batch_size > 1:
+            raise ValueError(f"multi-fidelity evaluation screens candidates one at a time, so it cannot be used with "
+                             f"batch_size={batch_size}")
+
+    def threshold(self, best):
+        """ Returns the screening distance a candidate must reach (or stay under, when minimising) to be promoted, for
+            the current best fitness (None, which promotes every candidate, if there is no best yet).
+        """
+
+        if best is None or not np.isfinite(best) or self.promote_fraction <= 0:
+            return None
+
+        scale = self.screen_steps / self.duration
+
+        if self.minimise:
+            return best / self.promote_fraction * scale
+
+        return best * self.promote_fraction * scale
+
+    def fitness(self, session, body, amplitude=(1, -1, -1, 1), phase_offset=(0, 0, 0, 0), best=None,
+                warm_start=False, stop_criteria=None):
+        """ Screens a candidate and, if it is promising, carries its simulation on to full length.
+
+            Parameters
+            ----------
+            session : simulate_body_nogui.SimulationSession
+                The session to simulate in
+            body : str or list[float]
+                The urdf of the robot body, or its 15 body parameters
+            amplitude : tuple[float], optional
+                The amplitude of the driver of each leg (default is (1, -1, -1, 1))
+            phase_offset : tuple[float], optional
+                The phase offset of the driver of each leg (default is (0, 0, 0, 0))
+            best : float, optional
+                The fitness of the most fit individual in the population (default is None, which promotes every
+                candidate)
+            warm_start : bool, optional
+                Whether to start from the body's saved settled state (default is False)
+            stop_criteria : list, optional
+                Other criteria for stopping hopeless or unstable simulations early (see stop_criteria.py)
+
+            Returns
+            -------
+            float
+                The full-length fitness of a promoted candidate, or the scaled screening fitness of a screened-out one
+        """
+
+        threshold = self.threshold(best)
+        audit = threshold is not None and self.audit > 0 and self.rng.random() < self.audit
+
+        screening = Screening(self.screen_steps, None if audit else threshold, self.minimise)
+        fitness = session.fitness(body, self.duration, amplitude, phase_offset, warm_start,
+                                  stop_criteria=[screening] + list(stop_criteria or []), minimise=self.minimise)
+
+        stop = session.last_stop
+        self.screened += 1
+        self.steps += self.duration if stop is None else stop.step + 1
+
+        # Stopped by another criterion before the end of the screening: its fitness is final at either level
+        if screening.fitness is None:
+            self.stopped += 1
+            self.last_promoted = True
+            return fitness
+
+        if stop is not None and stop.reason.startswith("screened out"):
+            self.last_promoted = False
+            self.steps_saved += self.duration - self.screen_steps
+            self.screened_out.append(screening.fitness)
+            return screening.fitness * self.duration / self.screen_steps
+
+        self.last_promoted = True
+        self.levels.append((screening.fitness, fitness, audit))
+
+        if audit and not self._passes(screening.fitness, threshold):
+            self.audited += 1
+        else:
+            self.promoted += 1
+
+        return fitness
+
+    def stats(self) -> dict:
+        """ Returns the per-level statistics: the number of candidates at each level, the steps run and saved, the
+            mean screening and full-length fitness, and the rank correlation between the levels (over every candidate
+            simulated to full length, and over the audited ones only).
+        """
+
+        screen = [level[0] for level in self.levels]
+        full = [level[1] for level in self.levels]
+        audited = [level for level in self.levels if level[2]]
+
+        return {"screened": self.screened,
+                "promoted": self.promoted,
+                "audited": self.audited,
+                "stopped": self.stopped,
+                "screened_out": len(self.screened_out),
+                "steps": self.steps,
+                "steps_saved": self.steps_saved,
+                "steps_saved_fraction": self.steps_saved / max(self.steps + self.steps_saved, 1),
+                "mean_screen_fitness": float(np.mean(screen + self.screened_out)) if self.screened else float("nan"),
+                "mean_full_fitness": float(np.mean(full)) if full else float("nan"),
+                "rank_correlation": rank_correlation(screen, full),
+                "audit_rank_correlation": rank_correlation([level[0] for level in audited],
+                                                           [level[1] for level in audited])}
+
+    def save(self, path: str):
+        """ Writes the screening fitness, full-length fitness (empty if screened out), and level of every screened
+            candidate to a CSV file.
+        """
+
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(("Screen_fitness", "Full_fitness", "Level"))
+
+            for screen, full, audit in self.levels:
+                writer.writerow((repr(float(screen)), repr(float(full)), "audit" if audit else "promoted"))
+            for screen in self.screened_out:
+                writer.writerow((repr(float(screen)), "", "screened_out"))
+
+# ------------------ Private methods ------------------
+
+    def _passes(self, screen_fitness, threshold):
+        if threshold is None:
+            return True
+        return screen_fitness <= threshold if self.minimise else screen_fitness >= threshold
@@ -0,0 +1,180 @@
+from pyrosim.nndf import NNDF
+
+from pyrosim.linksdf  import LINK_SDF
+
+from pyrosim.linkurdf import LINK_URDF
+
+from pyrosim.model import MODEL
+
+from pyrosim.sdf   import SDF
+
+from pyrosim.urdf  import URDF
+
+from pyrosim.joint import JOINT
+
+from pyrosim.constants import SDF_FILETYPE, URDF_FILETYPE, NNDF_FILETYPE
+
+class BUILDER:
+
+    """ Writes one robot (URDF or SDF) or neural network (NNDF) file.
+
+        Unlike the module functions of pyrosim.pyrosim, which keep the open file and the links written so far in
+        module globals, every builder carries its own state. Any number of files can be built at the same time, in
+        one thread or in several.
+
+        The target is either a filename, which is opened for writing and closed by End(), or any text sink with a
+        write() method (e.g. an io.StringIO or an already open file), which is left open.
+
+        Usage:
+
+            with BUILDER(io.StringIO()).Start_URDF() as builder:
+                builder.Send_Cube(name="Body", pos=[0, 0, 0.5], size=[1, 1, 1])
+    """
+
+    def __init__(self,target):
+
+        self.target = target
+
+        self.f = None
+
+        self.filetype = None
+
+        self.links = []
+
+        self.linkNamesToIndices = {}
+
+        self.availableLinkIndex = -1
+
+        self.model = None
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self,exc_type,exc_value,traceback):
+
+        self.End()
+
+    def End(self):
+
+        if self.f is None:
+
+            return
+
+        if self.filetype == SDF_FILETYPE:
+
+            self.sdf.Save_End_Tag(self.f)
+
+        elif self.filetype == NNDF_FILETYPE:
+
+            self.nndf.Save_End_Tag(self.f)
+        else:
+            self.urdf.Save_End_Tag(self.f)
+
+        if self.f is not self.target:
+
+            self.f.close()
+
+        self.f = None
+
+    def End_Model(self):
+
+        self.model.Save_End_Tag(self.f)
+
+    def Send_Cube(self,name="default",pos=[0,0,0],size=[1,1,1]):
+
+        if self.filetype == SDF_FILETYPE:
+
+            self.Start_Model(name,pos)
+
+            link = LINK_SDF(name,pos,size)
+
+            self.links.append(link)
+        else:
+            link = LINK_URDF(name,pos,size)
+
+            self.links.append(link)
+
+        link.Save(self.f)
+
+        if self.filetype == SDF_FILETYPE:
+
+            self.End_Model()
+
+        self.linkNamesToIndices[name] = self.availableLinkIndex
+
+        self.availableLinkIndex = self.availableLinkIndex + 1
+
+    def Send_Joint(self,name,parent,child,type,position):
+
+        joint = JOINT(name,parent,child,type,position)
+
+        joint.Save(self.f)
+
+    def Send_Motor_Neuron(self,name,jointName):
+
+        self.f.write('    <neuron name = "' + str(name) + '" type = "motor"  jointName = "' + jointName + '" />\n')
+
+    def Send_Sensor_Neuron(self,name,linkName):
+
+        self.f.write('    <neuron name = "' + str(name) + '" type = "sensor" linkName = "' + linkName + '" />\n')
+
+    def Send_Synapse(self,sourceNeuronName,targetNeuronName,weight):
+
+        self.f.write('    <synapse sourceNeuronName = "' + str(sourceNeuronName) + '" targetNeuronName = "' + str(targetNeuronName) + '" weight = "' + str(weight) + '" />\n')
+
+    def Start_NeuralNetwork(self):
+
+        self._Open(NNDF_FILETYPE)
+
+        self.nndf = NNDF()
+
+        self.nndf.Save_Start_Tag(self.f)
+
+        return self
+
+    def Start_SDF(self):
+
+        self._Open(SDF_FILETYPE)
+
+        self.sdf = SDF()
+
+        self.sdf.Save_Start_Tag(self.f)
+
+        return self
+
+    def Start_URDF(self):
+
+        self._Open(URDF_FILETYPE)
+
+        self.urdf = URDF()
+
+        self.urdf.Save_Start_Tag(self.f)
+
+        return self
+
+    def Start_Model(self,modelName,pos):
+
+        self.model = MODEL(modelName,pos)
+
+        self.model.Save_Start_Tag(self.f)
+
+# ------------------- Private methods -----------------
+
+    def _Open(self,filetype):
+
+        self.End()
+
+        self.filetype = filetype
+
+        self.links = []
+
+        self.linkNamesToIndices = {}
+
+        self.availableLinkIndex = -1
+
+        if isinstance(self.target,str):
+
+            self.f = open(self.target,"w")
+        else:
+            self.f = self.target
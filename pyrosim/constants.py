@@ -2,3 +2,9 @@ SENSOR_NEURON = 0
 MOTOR_NEURON  = 1
 HIDDEN_NEURON = 2
 
+
+SDF_FILETYPE  = 0
+
+URDF_FILETYPE = 1
+
+NNDF_FILETYPE   = 2
@@ -1,46 +1,21 @@
 import pybullet as p
 
-from pyrosim.nndf import NNDF
+from pyrosim.builder import BUILDER
 
-from pyrosim.linksdf  import LINK_SDF
+from pyrosim.constants import SDF_FILETYPE, URDF_FILETYPE, NNDF_FILETYPE
 
-from pyrosim.linkurdf import LINK_URDF
+# The Start_/Send_/End functions below write through one module-wide BUILDER, so only one file can be built at a
+# time. To build several at once (e.g. in a thread pool), use a BUILDER of their own for each file instead.
 
-from pyrosim.model import MODEL
-
-from pyrosim.sdf   import SDF
-
-from pyrosim.urdf  import URDF
-
-from pyrosim.joint import JOINT
-
-SDF_FILETYPE  = 0
-
-URDF_FILETYPE = 1
-
-NNDF_FILETYPE   = 2
-
-# global availableLinkIndex
-
-# global linkNamesToIndices
+builder = None
 
 def End():
 
-    if filetype == SDF_FILETYPE:
-
-        sdf.Save_End_Tag(f)
-
-    elif filetype == NNDF_FILETYPE:
-
-        nndf.Save_End_Tag(f)
-    else:
-        urdf.Save_End_Tag(f)
-
-    f.close()
+    builder.End()
 
 def End_Model():
 
-    model.Save_End_Tag(f)
+    builder.End_Model()
 
 def Get_Touch_Sensor_Value_For_Link(linkName):
 
@@ -60,15 +35,15 @@ def Get_Touch_Sensor_Value_For_Link(linkName):
 
     return touchValue
 
-def Prepare_Link_Dictionary(bodyID):
+def Prepare_Link_Dictionary(bodyID,physicsClientId=0):
 
     global linkNamesToIndices
 
     linkNamesToIndices = {}
 
-    for jointIndex in range( 0 , p.getNumJoints(bodyID) ):
+    for jointIndex in range( 0 , p.getNumJoints(bodyID,physicsClientId=physicsClientId) ):
 
-        jointInfo = p.getJointInfo( bodyID , jointIndex )
+        jointInfo = p.getJointInfo( bodyID , jointIndex , physicsClientId=physicsClientId )
 
         jointName = jointInfo[1]
 
@@ -86,74 +61,70 @@ def Prepare_Link_Dictionary(bodyID):
 
            linkNamesToIndices[rootLinkName] = -1 
 
-def Prepare_Joint_Dictionary(bodyID):
+def Prepare_Joint_Dictionary(bodyID,physicsClientId=0):
 
     global jointNamesToIndices
 
     jointNamesToIndices = {}
 
-    for jointIndex in range( 0 , p.getNumJoints(bodyID) ):
+    for jointIndex in range( 0 , p.getNumJoints(bodyID,physicsClientId=physicsClientId) ):
 
-        jointInfo = p.getJointInfo( bodyID , jointIndex )
+        jointInfo = p.getJointInfo( bodyID , jointIndex , physicsClientId=physicsClientId )
 
         jointName = jointInfo[1]
 
         jointNamesToIndices[jointName] = jointIndex
 
-def Prepare_To_Simulate(bodyID):
+def Prepare_Joint_Indices(bodyID,jointNames=None,physicsClientId=0):
 
-    Prepare_Link_Dictionary(bodyID)
+    jointIndices = []
 
-    Prepare_Joint_Dictionary(bodyID)
+    namesToIndices = {}
 
-def Send_Cube(name="default",pos=[0,0,0],size=[1,1,1]):
+    for jointIndex in range( 0 , p.getNumJoints(bodyID,physicsClientId=physicsClientId) ):
 
-    global availableLinkIndex
+        jointInfo = p.getJointInfo( bodyID , jointIndex , physicsClientId=physicsClientId )
 
-    global links
+        if jointInfo[2] != p.JOINT_FIXED:
 
-    if filetype == SDF_FILETYPE:
+            jointIndices.append(jointIndex)
 
-        Start_Model(name,pos)
+            namesToIndices[jointInfo[1]] = jointIndex
 
-        link = LINK_SDF(name,pos,size)
+    if jointNames is None:
 
-        links.append(link)
-    else:
-        link = LINK_URDF(name,pos,size)
+        return jointIndices
 
-        links.append(link)
+    return [ namesToIndices[jointName] for jointName in jointNames ]
 
-    link.Save(f)
+def Prepare_To_Simulate(bodyID,physicsClientId=0):
 
-    if filetype == SDF_FILETYPE:
+    Prepare_Link_Dictionary(bodyID,physicsClientId)
 
-        End_Model()
+    Prepare_Joint_Dictionary(bodyID,physicsClientId)
 
-    linkNamesToIndices[name] = availableLinkIndex
+def Send_Cube(name="default",pos=[0,0,0],size=[1,1,1]):
 
-    availableLinkIndex = availableLinkIndex + 1
+    builder.Send_Cube(name,pos,size)
 
 def Send_Joint(name,parent,child,type,position):
 
-    joint = JOINT(name,parent,child,type,position)
-
-    joint.Save(f)
+    builder.Send_Joint(name,parent,child,type,position)
 
 def Send_Motor_Neuron(name,jointName):
 
-    f.write('    <neuron name = "' + str(name) + '" type = "motor"  jointName = "' + jointName + '" />\n')
+    builder.Send_Motor_Neuron(name,jointName)
 
 def Send_Sensor_Neuron(name,linkName):
 
-    f.write('    <neuron name = "' + str(name) + '" type = "sensor" linkName = "' + linkName + '" />\n')
+    builder.Send_Sensor_Neuron(name,linkName)
 
 def Send_Synapse( sourceNeuronName , targetNeuronName , weight ):
 
-    f.write('    <synapse sourceNeuronName = "' + str(sourceNeuronName) + '" targetNeuronName = "' + str(targetNeuronName) + '" weight = "' + str(weight) + '" />\n')
+    builder.Send_Synapse(sourceNeuronName,targetNeuronName,weight)
 
  
-def Set_Motor_For_Joint(bodyIndex,jointName,controlMode,targetPosition,maxForce):
+def Set_Motor_For_Joint(bodyIndex,jointName,controlMode,targetPosition,maxForce,physicsClientId=0):
 
     p.setJointMotorControl2(
 
@@ -165,84 +136,52 @@ def Set_Motor_For_Joint(bodyIndex,jointName,controlMode,targetPosition,maxForce)
 
         targetPosition = targetPosition,
 
-        force          = maxForce)
+        force          = maxForce,
 
-def Start_NeuralNetwork(filename):
-
-    global filetype
+        physicsClientId = physicsClientId)
 
-    filetype = NNDF_FILETYPE
+def Set_Motors_For_Joints(bodyIndex,jointIndices,controlMode,targetPositions,maxForces,physicsClientId=0):
 
-    global f
+    p.setJointMotorControlArray(
 
-    f = open(filename,"w")
+        bodyIndex       = bodyIndex,
 
-    global nndf
+        jointIndices    = jointIndices,
 
-    nndf = NNDF()
+        controlMode     = controlMode,
 
-    nndf.Save_Start_Tag(f)
+        targetPositions = targetPositions,
 
-def Start_SDF(filename):
+        forces          = maxForces,
 
-    global availableLinkIndex
+        physicsClientId = physicsClientId)
 
-    availableLinkIndex = -1
-
-    global linkNamesToIndices
-
-    linkNamesToIndices = {}
-
-    global filetype
+def Start_NeuralNetwork(filename):
 
-    filetype = SDF_FILETYPE
+    global builder
 
-    global f
- 
-    f = open(filename,"w")
+    builder = BUILDER(filename).Start_NeuralNetwork()
 
-    global sdf
+def Start_SDF(filename):
 
-    sdf = SDF()
+    global builder
 
-    sdf.Save_Start_Tag(f)
+    global linkNamesToIndices
 
-    global links
+    builder = BUILDER(filename).Start_SDF()
 
-    links = []
+    linkNamesToIndices = builder.linkNamesToIndices
 
 def Start_URDF(filename):
 
-    global availableLinkIndex
-
-    availableLinkIndex = -1
+    global builder
 
     global linkNamesToIndices
 
-    linkNamesToIndices = {}
-
-    global filetype
+    builder = BUILDER(filename).Start_URDF()
 
-    filetype = URDF_FILETYPE
-
-    global f
-
-    f = open(filename,"w")
-
-    global urdf 
-
-    urdf = URDF()
-
-    urdf.Save_Start_Tag(f)
-
-    global links
-
-    links = []
+    linkNamesToIndices = builder.linkNamesToIndices
 
 def Start_Model(modelName,pos):
 
-    global model 
-
-    model = MODEL(modelName,pos)
-
-    model.Save_Start_Tag(f)
+    builder.Start_Model(modelName,pos)
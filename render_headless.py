@@ -0,0 +1,256 @@
+"""
+© 2024 Emily Maxwell <maxwelea@rose-hulman.edu>
+SPDX License: BSD-3-Clause
+
+render_headless.py
+
+Headless rendering of evolved gaits, for servers without a display. A body is simulated in a DIRECT client (or its
+recorded trajectory is loaded, see trajectory.py), and every stride-th step is captured with p.getCameraImage using
+the TinyRenderer, which needs no display or OpenGL context. Encoding the frames runs in a background thread, so the
+next frames are rendered while the previous ones are written.
+
+Frames are written as a video (or GIF) if imageio is installed, and otherwise as a numbered sequence of PNG images in a
+directory. render_trials() renders the most fit individual of every trial in parallel, one trial per process.
+"""
+
+import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib.image
+import numpy as np
+import pybullet as p
+import pybullet_data
+
+import results_store as rs
+import simulate_body_nogui as sb
+import trajectory as tj
+
+try:
+    import imageio.v2 as imageio
+except ImportError:
+    imageio = None
+
+# Default frame size and camera placement (following the body)
+WIDTH = 320
+HEIGHT = 240
+CAMERA_DISTANCE = 12
+CAMERA_YAW = 45
+CAMERA_PITCH = -30
+
+
+class FrameWriter:
+    """ Writes frames in a background thread, as a video through imageio (if it is installed and the output has a
+        video or GIF extension) or as a numbered PNG sequence in a directory.
+
+        Attributes
+        ----------
+        output : str
+            The video file, or the directory of the PNG sequence
+        fps : int
+            The frame rate of a video
+        frames : int
+            The number of frames written so far
+
+        Methods
+        -------
+        write(frame)
+            Queues an (height, width, 3) uint8 frame to be written
+        close()
+            Waits until every queued frame is written and closes the output
+    """
+
+    def __init__(self, output: str, fps: int = 30, max_queued: int = 64):
+        self.output = output
+        self.fps = fps
+        self.frames = 0
+
+        self.video = imageio is not None and os.path.splitext(output)[1].lower() in (".mp4", ".gif", ".avi", ".mov")
+
+        if not self.video:
+            os.makedirs(output, exist_ok=True)
+
+        # A bounded queue, so rendering cannot run arbitrarily far ahead of the encoder
+        self.queue = queue.Queue(max_queued)
+        self.error = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, frame):
+        if self.error is not None:
+            raise self.error
+        self.queue.put(frame)
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+        if self.error is not None:
+            raise self.error
+
+    def _run(self):
+        writer = None
+
+        try:
+            # Opening the writer can fail too (e.g. no ffmpeg plugin, or a bad path), which must not kill the thread
+            # silently while the renderer waits on the queue
+            if self.video:
+                writer = imageio.get_writer(self.output, fps=self.fps)
+
+            while True:
+                frame = self.queue.get()
+                if frame is None:
+                    break
+
+                if writer is not None:
+                    writer.append_data(frame)
+                else:
+                    matplotlib.image.imsave(os.path.join(self.output, f"frame_{self.frames:05d}.png"), frame)
+
+                self.frames += 1
+        except Exception as error:
+            self.error = error
+
+            # Keep draining the queue so the renderer is never blocked on a full queue
+            while self.queue.get() is not None:
+                pass
+        finally:
+            if writer is not None:
+                writer.close()
+
+
+def render_trajectory(trajectory, output: str, stride: int = 8, width: int = WIDTH, height: int = HEIGHT,
+                      fps: int = 30) -> int:
+    """ Renders every stride-th step of a recorded trajectory headless.
+
+        Parameters
+        ----------
+        trajectory : str or trajectory.Trajectory
+            The .npz file of the trajectory, or the trajectory itself
+        output : str
+            The video file (e.g. .mp4 or .gif, needs imageio) or the directory of the PNG sequence
+        stride : int, optional
+            The number of simulation steps between frames (default is 8, i.e. 30 frames per simulated second)
+        width, height : int, optional
+            The size of each frame in pixels (default is 320 x 240)
+        fps : int, optional
+            The frame rate of a video (default is 30)
+
+        Returns
+        -------
+        int
+            The number of frames rendered
+    """
+
+    if isinstance(trajectory, str):
+        trajectory = tj.load_trajectory(trajectory)
+
+    client = p.connect(p.DIRECT)
+
+    try:
+        p.setAdditionalSearchPath(pybullet_data.getDataPath(), physicsClientId=client)
+        p.loadURDF("plane.urdf", physicsClientId=client)
+        robot_id = tj.load_body(trajectory, client)
+
+        projection = p.computeProjectionMatrixFOV(60, width / height, 0.1, 100, physicsClientId=client)
+
+        with FrameWriter(output, fps) as writer:
+            for frame in range(0, len(trajectory.positions), stride):
+                tj.apply_frame(robot_id, trajectory, frame, client)
+
+                view = p.computeViewMatrixFromYawPitchRoll(trajectory.positions[frame].tolist(), CAMERA_DISTANCE,
+                                                           CAMERA_YAW, CAMERA_PITCH, 0, 2, physicsClientId=client)
+                image = p.getCameraImage(width, height, view, projection, renderer=p.ER_TINY_RENDERER,
+                                         physicsClientId=client)[2]
+
+                writer.write(np.reshape(image, (height, width, 4))[:, :, :3].astype(np.uint8))
+
+        return writer.frames
+    finally:
+        p.disconnect(physicsClientId=client)
+
+
+def render_body(body, output: str, duration=10000, amplitude=(1, -1, -1, 1), phase_offset=(0, 0, 0, 0),
+                stride: int = 8, width: int = WIDTH, height: int = HEIGHT, fps: int = 30) -> int:
+    """ Simulates a body headless, recording its trajectory in memory, and renders it (see render_trajectory()).
+
+        Parameters
+        ----------
+        body : str or list[float]
+            The urdf of the body, or the 15 body parameters to build it from
+
+        For the other parameters, refer to simulate_body_nogui.simulate_body() and render_trajectory().
+    """
+
+    with sb.SimulationSession() as session:
+        session.simulate(body, duration, amplitude, phase_offset, reducers=[], record=True)
+        trajectory = session.last_trajectory
+
+    return render_trajectory(trajectory, output, stride, width, height, fps)
+
+
+def _render_trial(job):
+    kind, final, body_number, output, stride = job
+
+    if kind == "body":
+        body = [final[column] for column in rs.COLUMNS["body"][2:]]
+        return render_body(body, output, stride=stride)
+
+    urdf = os.path.join(rs.REPO, "evolve_drivers", "gen_sim_viz", f"body_{body_number}.urdf")
+    amplitude = [final['amp_1'], final['amp_2'], final['amp_3'], final['amp_4']]
+    phase_offset = [final['phase_1'], final['phase_2'], final['phase_3'], final['phase_4']]
+    return render_body(urdf, output, amplitude=amplitude, phase_offset=phase_offset, stride=stride)
+
+
+def render_trials(kind: str, output_dir: str, body_number: int = None, trials=None, stride: int = 8,
+                  extension: str = None, workers: int = None) -> dict:
+    """ Renders the most fit individual (the final generation) of every trial in parallel, one trial per process.
+
+        Parameters
+        ----------
+        kind : str
+            "body" or "driver"
+        output_dir : str
+            The directory the renders are written to (one video or PNG directory per trial)
+        body_number : int, optional
+            For driver trials, the number of the body they were evolved for
+        trials : list[int], optional
+            The trial numbers to render (default is None, which renders every trial in the results store)
+        stride : int, optional
+            The number of simulation steps between frames (default is 8)
+        extension : str, optional
+            The video extension, e.g. ".mp4" (default is None, which writes .mp4 if imageio is installed and PNG
+            sequences otherwise)
+        workers : int, optional
+            The number of worker processes (default is the number of CPU cores)
+
+        Returns
+        -------
+        dict[int, int]
+            The number of frames rendered for each trial
+    """
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    # The final rows are read once here, so the workers never open (and refresh) the store at the same time
+    with rs.load_store() as store:
+        if trials is None:
+            trials = store.trials(kind, body_number)
+        finals = [store.generation(kind, trial, body_number=body_number) for trial in trials]
+
+    if extension is None:
+        extension = ".mp4" if imageio is not None else ""
+
+    prefix = f"{kind}_trial" if body_number is None else f"body_{body_number}_{kind}_trial"
+    jobs = [(kind, final, body_number, os.path.join(output_dir, f"{prefix}_{trial}{extension}"), stride)
+            for trial, final in zip(trials, finals)]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return dict(zip(trials, pool.map(_render_trial, jobs)))
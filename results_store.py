@@ -0,0 +1,310 @@
+"""
+© 2024 Emily Maxwell <maxwelea@rose-hulman.edu>
+SPDX License: BSD-3-Clause
+
+results_store.py
+
+A consolidated store of the results of every trial, so that the visualize scripts can fetch one generation or one
+column of a trial without reading and parsing its whole CSV file (again for every leg, plot, and call).
+
+The store is a single SQLite file. The CSV files written by the trials (evolve_bodies/trial_bodies/body_trial_*.csv and
+evolve_drivers/gen_sim_viz/body_*_drivers/driver_trial_*.csv) stay the source of truth: refresh() imports any file that
+is new or has changed since it was last imported, and removes the trials whose file has been deleted, and every other
+call only reads the store, through its index on (trial, generation).
+
+Trials stream their CSV files while they run, so a file may end with a partly written line, which is left out until
+it is complete.
+"""
+
+import csv
+import glob
+import os
+import re
+import sqlite3
+
+import numpy as np
+
+REPO = os.path.dirname(os.path.abspath(__file__))
+
+# Default location of the store
+DEFAULT_PATH = os.path.join(REPO, "results.db")
+
+# Columns of each kind of trial, as written by body_trial and driver_trial
+COLUMNS = {
+    "body": ('Generation', 'Fitness', 'body_w', 'body_l', 'body_h', 'leg_w1', 'leg_w2', 'leg_w3', 'leg_w4', 'leg_l1',
+             'leg_l2', 'leg_l3', 'legl_4', 'legh_1', 'legh_2', 'legh_3', 'legh_4'),
+    "driver": ('Generation', 'Fitness', 'amp_1', 'amp_2', 'amp_3', 'amp_4', 'phase_1', 'phase_2', 'phase_3',
+               'phase_4'),
+}
+
+# Where the CSV files of each kind of trial are found, and how their trial (and body) numbers are read from the path
+SOURCES = {
+    "body": (os.path.join(REPO, "evolve_bodies", "trial_bodies", "body_trial_*.csv"),
+             re.compile(r"body_trial_(?P<trial>\d+)\.csv$")),
+    "driver": (os.path.join(REPO, "evolve_drivers", "gen_sim_viz", "body_*_drivers", "driver_trial_*.csv"),
+               re.compile(r"body_(?P<body>\d+)_drivers[\\/]driver_trial_(?P<trial>\d+)\.csv$")),
+}
+
+
+class ResultsStore:
+    """ An indexed SQLite store of the results of every body and driver trial.
+
+        Each kind of trial ("body" or "driver") has its own table, with one row per generation of each trial and the
+        same columns as the trial\'s CSV file. Trials are identified by their trial number and, for driver trials, the
+        number of the body they were evolved for.
+
+        Attributes
+        ----------
+        path : str
+            The SQLite file of the store
+        db : sqlite3.Connection
+            The connection to the store
+
+        Methods
+        -------
+        refresh()
+            Imports every trial CSV file that is new or has changed since it was last imported, and removes the trials
+            whose file has been deleted
+        import_csv(kind, path, trial, body_number=None)
+            Imports (or re-imports) one trial CSV file
+        trials(kind, body_number=None)
+            Returns the numbers of the stored trials
+        generation(kind, trial, generation=None, body_number=None)
+            Returns one generation of a trial (the final one by default)
+        column(kind, trial, column, body_number=None)
+            Returns one column of a trial for every generation
+        finals(kind, columns=None, body_number=None)
+            Returns the final generation of every stored trial
+        close()
+            Closes the store
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH):
+        """ Parameters
+            ----------
+            path : str, optional
+                The SQLite file of the store, created if it does not exist (default is results.db at the top of the
+                repository)
+        """
+
+        self.path = path
+        self.db = sqlite3.connect(path)
+
+        self.db.execute("CREATE TABLE IF NOT EXISTS sources (path TEXT PRIMARY KEY, kind TEXT NOT NULL, "
+                        "body INTEGER NOT NULL, trial INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, "
+                        "size INTEGER NOT NULL)")
+
+        for kind, columns in COLUMNS.items():
+            values = ", ".join(f"{column} REAL" for column in columns[1:])
+            self.db.execute(f"CREATE TABLE IF NOT EXISTS {kind}_results (body INTEGER NOT NULL, trial INTEGER NOT NULL, "
+                            f"generation INTEGER NOT NULL, {values}, PRIMARY KEY (body, trial, generation))")
+
+        self.db.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def refresh(self) -> int:
+        """ Imports every trial CSV file that is new or has changed (by modification time or size) since it was last
+            imported, and removes the trials whose file has been deleted.
+
+            Returns
+            -------
+            int
+                The number of files imported
+        """
+
+        imported = 0
+
+        for kind, (pattern, name) in SOURCES.items():
+            for path in sorted(glob.glob(pattern)):
+                match = name.search(path)
+                if match is None:
+                    continue
+
+                stat = os.stat(path)
+                row = self.db.execute("SELECT mtime_ns, size FROM sources WHERE path = ?", (path,)).fetchone()
+
+                if row == (stat.st_mtime_ns, stat.st_size):
+                    continue
+
+                body_number = int(match.group("body")) if "body" in match.groupdict() else None
+                self.import_csv(kind, path, int(match.group("trial")), body_number)
+                imported += 1
+
+        # Trials whose file was deleted are removed from the store too
+        sources = self.db.execute("SELECT path, kind, body, trial FROM sources").fetchall()
+
+        with self.db:
+            for path, kind, body, trial in sources:
+                if not os.path.exists(path):
+                    self.db.execute(f"DELETE FROM {kind}_results WHERE body = ? AND trial = ?", (body, trial))
+                    self.db.execute("DELETE FROM sources WHERE path = ?", (path,))
+
+        return imported
+
+    def import_csv(self, kind: str, path: str, trial: int, body_number: int = None):
+        """ Imports (or re-imports, replacing the stored rows) one trial CSV file. A partly written last line (of a
+            trial that is still running) is left out.
+
+            Parameters
+            ----------
+            kind : str
+                "body" or "driver"
+            path : str
+                The CSV file written by the trial
+            trial : int
+                The trial number
+            body_number : int, optional
+                For a driver trial, the number of the body it was evolved for
+        """
+
+        columns = _columns(kind)
+        body = _body(body_number)
+        stat = os.stat(path)
+
+        with open(path, newline="") as f:
+            lines = f.read().splitlines(keepends=True)
+
+        # A line is only complete once its newline has been written
+        if lines and not lines[-1].endswith("\n"):
+            lines.pop()
+
+        records = [values for values in csv.reader(lines) if values]
+        rows = []
+
+        if records:
+            if tuple(records[0]) != columns:
+                raise ValueError(f"{path} does not have the columns of a {kind} trial")
+
+            for i, values in enumerate(records[1:], 1):
+                try:
+                    if len(values) != len(columns):
+                        raise ValueError(f"expected {len(columns)} values, found {len(values)}")
+                    rows.append((body, trial, int(float(values[0])), *map(float, values[1:])))
+                except ValueError as error:
+                    # Only the last line can be malformed, if the trial was stopped while writing it
+                    if i < len(records) - 1:
+                        raise ValueError(f"line {i + 1} of {path} is malformed: {error}") from error
+
+        placeholders = ", ".join("?" * (len(columns) + 2))
+
+        with self.db:
+            self.db.execute(f"DELETE FROM {kind}_results WHERE body = ? AND trial = ?", (body, trial))
+            self.db.executemany(f"INSERT INTO {kind}_results VALUES ({placeholders})", rows)
+            self.db.execute("INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?, ?, ?)",
+                            (path, kind, body, trial, stat.st_mtime_ns, stat.st_size))
+
+    def trials(self, kind: str, body_number: int = None) -> list[int]:
+        """ Returns the numbers of the stored trials of a kind (for driver trials, of one body). """
+
+        _columns(kind)
+        rows = self.db.execute(f"SELECT DISTINCT trial FROM {kind}_results WHERE body = ? ORDER BY trial",
+                               (_body(body_number),))
+        return [row[0] for row in rows]
+
+    def generation(self, kind: str, trial: int, generation: int = None, body_number: int = None) -> dict:
+        """ Returns one generation of a trial.
+
+            Parameters
+            ----------
+            kind : str
+                "body" or "driver"
+            trial : int
+                The trial number
+            generation : int, optional
+                The generation (default is None, which returns the final generation)
+            body_number : int, optional
+                For a driver trial, the number of the body it was evolved for
+
+            Returns
+            -------
+            dict[str, float]
+                The value of each column of the trial (as in its CSV file) at that generation
+        """
+
+        columns = _columns(kind)
+        selected = ", ".join(("generation",) + columns[1:])
+        body = _body(body_number)
+
+        if generation is None:
+            row = self.db.execute(f"SELECT {selected} FROM {kind}_results WHERE body = ? AND trial = ? "
+                                  f"ORDER BY generation DESC LIMIT 1", (body, trial)).fetchone()
+        else:
+            row = self.db.execute(f"SELECT {selected} FROM {kind}_results WHERE body = ? AND trial = ? "
+                                  f"AND generation = ?", (body, trial, generation)).fetchone()
+
+        if row is None:
+            raise KeyError(f"no generation {generation} of {kind} trial {trial} in {self.path}")
+
+        return dict(zip(columns, row))
+
+    def column(self, kind: str, trial: int, column: str, body_number: int = None) -> np.ndarray:
+        """ Returns one column of a trial (e.g. 'Fitness') for every generation, in order of generation. """
+
+        if column not in _columns(kind)[1:]:
+            raise ValueError(f"{kind} trials have no column {column}")
+
+        rows = self.db.execute(f"SELECT {column} FROM {kind}_results WHERE body = ? AND trial = ? "
+                               f"ORDER BY generation", (_body(body_number), trial))
+        return np.array([row[0] for row in rows])
+
+    def finals(self, kind: str, columns=None, body_number: int = None) -> dict:
+        """ Returns the final generation of every stored trial of a kind (for driver trials, of one body).
+
+            Parameters
+            ----------
+            kind : str
+                "body" or "driver"
+            columns : list[str], optional
+                The columns to return (default is None, which returns every column)
+            body_number : int, optional
+                For driver trials, the number of the body they were evolved for
+
+            Returns
+            -------
+            dict[int, dict[str, float]]
+                The values of the columns at the final generation, for each trial number
+        """
+
+        all_columns = _columns(kind)
+        columns = tuple(columns) if columns is not None else all_columns[1:]
+
+        for column in columns:
+            if column not in all_columns[1:]:
+                raise ValueError(f"{kind} trials have no column {column}")
+
+        selected = ", ".join(f"r.{column}" for column in columns)
+        rows = self.db.execute(f"SELECT r.trial, {selected} FROM {kind}_results r "
+                               f"JOIN (SELECT trial, MAX(generation) AS final FROM {kind}_results WHERE body = ? "
+                               f"GROUP BY trial) f ON r.trial = f.trial AND r.generation = f.final "
+                               f"WHERE r.body = ? ORDER BY r.trial", (_body(body_number), _body(body_number)))
+
+        return {row[0]: dict(zip(columns, row[1:])) for row in rows}
+
+    def close(self):
+        """ Closes the store. """
+
+        self.db.close()
+
+
+def load_store(path: str = DEFAULT_PATH) -> ResultsStore:
+    """ Opens the results store and imports any trial CSV file that is new or has changed. """
+
+    store = ResultsStore(path)
+    store.refresh()
+    return store
+
+
+def _columns(kind):
+    if kind not in COLUMNS:
+        raise ValueError(f"unknown kind of trial {kind!r} (expected 'body' or 'driver')")
+    return COLUMNS[kind]
+
+
+def _body(body_number):
+    # Body trials are stored with body number 0, since SQLite primary keys treat every NULL as distinct
+    return body_number if body_number is not None else 0
@@ -9,6 +9,7 @@ Last Modified: 11/18/2024
 import pybullet as p
 import pybullet_data
 import pyrosim.pyrosim as ps
+import trajectory as tj
 import numpy as np
 import time
 import math
@@ -162,3 +163,69 @@ def simulate_body_gui(body:str, duration=10000, amplitude=(1, -1, -1, 1), phase_
     p.disconnect()
 
     return body_dist[-1]
+
+
+def replay_body_gui(trajectory_file: str, speed=1.0, stride=1, start=0, loop=False):
+    """ Replays a recorded trajectory (see trajectory.py) in the GUI by setting the recorded pose of the body at every
+        frame, without simulating any physics.
+
+        The "frame" slider in the GUI jumps to any frame (scrubbing), and the "speed" slider changes the playback speed
+        while it plays. Closing the window ends the replay.
+
+        Parameters
+        ----------
+        trajectory_file : str
+            The .npz file recorded by simulate_body_nogui.simulate_body(..., record=trajectory_file)
+        speed : float, optional
+            The starting playback speed, as a multiple of real time (default is 1.0)
+        stride : int, optional
+            The number of recorded steps advanced per displayed frame, i.e. every stride-th frame is shown (default is
+            1, which shows every frame)
+        start : int, optional
+            The frame to start from (default is 0)
+        loop : bool, optional
+            Whether to start again from the first frame after the last one, instead of ending the replay (default is
+            False)
+    """
+
+    trajectory = tj.load_trajectory(trajectory_file)
+    frames = len(trajectory.positions)
+
+    # GUI version, with the debug panel shown for the sliders
+    p.connect(p.GUI)
+    p.setAdditionalSearchPath(pybullet_data.getDataPath())
+
+    # Load plane and robot body
+    p.loadURDF("plane.urdf")
+    robot_id = tj.load_body(trajectory)
+
+    frame_slider = p.addUserDebugParameter("frame", 0, frames - 1, start)
+    speed_slider = p.addUserDebugParameter("speed", 0.1, 10, speed)
+    slider_frame = start
+
+    frame = start
+
+    print(f"Replaying {trajectory_file} ({frames} frames)...")
+
+    while p.isConnected():
+        # Jump to the frame on the slider whenever it is moved
+        requested = int(p.readUserDebugParameter(frame_slider))
+        if requested != slider_frame:
+            slider_frame = requested
+            frame = requested
+
+        tj.apply_frame(robot_id, trajectory, frame)
+        move_camera()
+
+        time.sleep(trajectory.timestep * stride / p.readUserDebugParameter(speed_slider))
+
+        frame += stride
+        if frame >= frames:
+            if not loop:
+                break
+            frame = 0
+
+    print("Replay Complete")
+
+    if p.isConnected():
+        p.disconnect()
@@ -9,102 +9,443 @@ Last Modified: 11/18/2024
 import pybullet as p
 import pybullet_data
 import pyrosim.pyrosim as ps
+import evolve_bodies.gen_sim_viz.generate_body as gb
+from fitness_reducers import FinalDistance
+from stop_criteria import EarlyStop, discarded_fitness
+from trajectory import TrajectoryRecorder
 import numpy as np
-import time
-import math
-from matplotlib import pyplot as plt
+import os
+from concurrent.futures import ProcessPoolExecutor
 
+# Physics settings shared by every headless simulation
+GRAVITY = -9.8
+MAX_FORCE = 500
 
-def get_distances(positions):
-    distances = [None] * len(positions)
+# Default fidelity of a simulation: pybullet's 240 Hz timestep and solver iterations, with the motors updated every step
+TIMESTEP = 1 / 240
+SOLVER_ITERATIONS = 50
+CONTROL_PERIOD = 1
 
-    for i in range(len(positions)):
-        position = positions[i]
+# pybullet only frees the shapes of bodies built from body parameters when the world is reset, so a session resets
+# its world after building this many of them
+BUILT_BODIES_PER_WORLD = 500
 
-        distance = math.sqrt((positions[0][0] - position[0]) ** 2 +
-                             (positions[0][1] - position[1]) ** 2 +
-                             (positions[0][2] - position[2]) ** 2)
 
-        distances[i] = distance
+def physics_settings(timestep=TIMESTEP, solver_iterations=SOLVER_ITERATIONS, control_period=CONTROL_PERIOD):
+    """ Returns the physics settings that, along with the body and its drivers, determine a simulation's fitness.
 
-    return distances
+        The fidelity settings are only included when they differ from their defaults, so fitness cache keys of
+        simulations at the default fidelity are unchanged.
+    """
 
+    settings = {"gravity": GRAVITY, "max_force": MAX_FORCE}
 
-def simulate_body(body:str, duration=10000, amplitude=(1, -1, -1, 1), phase_offset=(0, 0, 0, 0)):
-    # Configuration
+    if timestep != TIMESTEP:
+        settings["timestep"] = timestep
+    if solver_iterations != SOLVER_ITERATIONS:
+        settings["solver_iterations"] = solver_iterations
+    if control_period != CONTROL_PERIOD:
+        settings["control_period"] = control_period
+
+    return settings
+
+
+def get_distances(positions):
+    """ Returns the distance between the first position and every position (including the first). """
+
+    positions = np.asarray(positions, dtype=float)
 
-    # No GUI version (much faster)
-    p.connect(p.DIRECT)
-    p.setAdditionalSearchPath(pybullet_data.getDataPath())
-    p.setGravity(0, 0, -9.8)
+    return np.sqrt(((positions[0] - positions) ** 2).sum(axis=1))
 
-    # Load plane and robot body
-    p.loadURDF("plane.urdf")
-    robot_id = p.loadURDF(body)
 
-    # Prepare body for simulation
-    ps.Prepare_To_Simulate(robot_id)
-    body_pos = [None] * duration
+def driver_targets(duration, amplitude, phase_offset, timestep=TIMESTEP):
+    """ Precomputes the target position of each leg motor at every step of the simulation.
+
+        The driver functions run at the same speed in simulated time whatever the timestep, so a simulation at a
+        longer timestep covers the same gait in proportionally fewer steps.
+
+        Parameters
+        ----------
+        duration : int
+            The number of simulation steps
+        amplitude : list[float]
+            The amplitude of the driver function of each leg motor
+        phase_offset : list[float]
+            The phase offset of the driver function of each leg motor
+        timestep : float, optional
+            The length of one simulation step in seconds (default is pybullet's 1/240)
+
+        Returns
+        -------
+        numpy.ndarray
+            A (duration, 4) array where row i holds the target position of legs 1-4 at step i
+    """
 
     # Prepare driver functions for motors
-    x = np.linspace(0, 0.003 * duration * np.pi, duration)
-    y_1 = amplitude[0] * np.sin(x + phase_offset[0])
-    y_2 = amplitude[1] * np.cos(x + phase_offset[1])
-    y_3 = amplitude[2] * np.cos(x + phase_offset[2])
-    y_4 = amplitude[3] * np.sin(x + phase_offset[3])
+    x = np.linspace(0, 0.003 * duration * np.pi * (timestep / TIMESTEP), duration)
+    targets = np.empty((duration, 4))
+    targets[:, 0] = amplitude[0] * np.sin(x + phase_offset[0])
+    targets[:, 1] = amplitude[1] * np.cos(x + phase_offset[1])
+    targets[:, 2] = amplitude[2] * np.cos(x + phase_offset[2])
+    targets[:, 3] = amplitude[3] * np.sin(x + phase_offset[3])
+
+    return targets
+
+
+def _run_body(robot_id, joint_indices, targets, client=0, max_force=MAX_FORCE, stop_criteria=None, reducers=None,
+              recorder=None, control_period=CONTROL_PERIOD):
+    duration = len(targets)
+
+    # Either record the whole trajectory, or only feed each position to the reducers
+    if reducers is None:
+        body_pos = np.empty((duration, 3))
+    else:
+        body_pos = None
+        for reducer in reducers:
+            reducer.reset()
 
-    # Progress Measuring Setup
-    ten_percent = duration//10
-    percent_complete = 0
+    if stop_criteria:
+        for criterion in stop_criteria:
+            criterion.reset()
+
+    # Column j of the targets drives joint_indices[j]; plain lists are much faster for pybullet to parse
+    rows = targets.tolist()
+    forces = [max_force] * len(joint_indices)
 
     # Begin simulation loop
     #print(f"Starting Simulation of {body}...")
     for i in range(duration):
 
-        # Set position of Leg 1
-        ps.Set_Motor_For_Joint(bodyIndex=robot_id,
-                               jointName=b'Body_Leg1',
-                               controlMode=p.POSITION_CONTROL,
-                               targetPosition=y_1[i],
-                               maxForce=500)
-
-        # Set position of Leg 2
-        ps.Set_Motor_For_Joint(bodyIndex=robot_id,
-                               jointName=b'Body_Leg2',
-                               controlMode=p.POSITION_CONTROL,
-                               targetPosition=y_2[i],
-                               maxForce=500)
-
-        # Set position of Leg 3
-        ps.Set_Motor_For_Joint(bodyIndex=robot_id,
-                               jointName=b'Body_Leg3',
-                               controlMode=p.POSITION_CONTROL,
-                               targetPosition=y_3[i],
-                               maxForce=500)
-
-        # Set position of Leg 4
-        ps.Set_Motor_For_Joint(bodyIndex=robot_id,
-                               jointName=b'Body_Leg4',
-                               controlMode=p.POSITION_CONTROL,
-                               targetPosition=y_4[i],
-                               maxForce=500)
+        # Set position of every leg in one call, every control_period steps (the motors hold their last target between)
+        if i % control_period == 0:
+            ps.Set_Motors_For_Joints(bodyIndex=robot_id,
+                                     jointIndices=joint_indices,
+                                     controlMode=p.POSITION_CONTROL,
+                                     targetPositions=rows[i],
+                                     maxForces=forces,
+                                     physicsClientId=client)
 
         # Next step in simulation
-        p.stepSimulation()
+        p.stepSimulation(physicsClientId=client)
 
         # Record current position of body's center
-        body_pos[i] = p.getBasePositionAndOrientation(robot_id)[0]
+        position, orientation = p.getBasePositionAndOrientation(robot_id, physicsClientId=client)
+
+        if body_pos is None:
+            for reducer in reducers:
+                reducer.update(position)
+        else:
+            body_pos[i] = position
+
+        if recorder is not None:
+            recorder.update(position, orientation)
+
+        # Stop early once the rest of the simulation would be wasted
+        if stop_criteria:
+            for criterion in stop_criteria:
+                reason = criterion.check(robot_id, i, position, orientation, client)
+
+                if reason is not None:
+                    if body_pos is not None:
+                        body_pos = body_pos[:i + 1]
+                    return body_pos, (criterion, reason, i)
+
+    return body_pos, None
+
+
+class SimulationSession:
+    """ A reusable headless simulator that connects to pybullet once and keeps the ground plane loaded.
+
+        Connecting a DIRECT client, setting up the world, and loading the plane is only done when the session is
+        created. Between evaluations only the robot is removed, and the world is restored to the state saved right
+        after the plane was loaded.
+
+        A robot can be given either as a urdf or as the list of 15 body parameters it is generated from. In the
+        second case it is built directly in the world with generate_body.create_body(), without writing or parsing
+        a urdf.
+
+        The fidelity of the simulations (timestep, solver iterations, and how often the motors are updated) is fixed
+        when the session is created. Lower fidelity is faster but changes fitness values (see
+        benchmarks/fidelity.py), so they are cached under the session's physics_settings().
+
+        Attributes
+        ----------
+        client : int
+            The id of the session's pybullet DIRECT client
+        timestep : float
+            The length of one simulation step in seconds
+        solver_iterations : int
+            The number of iterations of pybullet's constraint solver per step
+        control_period : int
+            The number of steps between motor updates
+        robot_id : int
+            The id of the currently loaded robot body (None if no robot is loaded)
+        joint_indices : list[int]
+            The indices of the movable joints of the current robot, in the order their targets are given
+        warm_key : tuple
+            Identifies the body (file, modification time, and size, or body parameters) and settle steps whose
+            settled state is saved in warm_state (None if there is no warm start)
+        warm_state : int
+            The id of the saved state of the settled warm start body (None if there is no warm start)
+        built_bodies : int
+            The number of bodies built from body parameters since the world was last reset
+        last_stop : EarlyStop
+            Why and at which step the last simulation was stopped early, and its fitness (None if it ran its full
+            duration)
+        early_stops : dict[str, int]
+            The number of simulations stopped early by each kind of stop criterion
+        last_trajectory : trajectory.Trajectory
+            The trajectory of the last simulation run with record (None if it was not recorded)
+
+        Methods
+        -------
+        load(body, warm_start=False, settle_steps=0)
+            Removes the current robot and loads a new one into the restored world, or restores the saved settled
+            state of the warm start body
+        simulate(body, duration=10000, amplitude=(1, -1, -1, 1), phase_offset=(0, 0, 0, 0), warm_start=False,
+                 settle_steps=0, targets=None, stop_criteria=None, reducers=None, record=None, minimise=False)
+            Simulates a robot and returns its distance from the starting position at every step (or reductions of
+            its trajectory), optionally recording its trajectory to a file
+        fitness(body, duration=10000, amplitude=(1, -1, -1, 1), phase_offset=(0, 0, 0, 0), warm_start=False,
+                settle_steps=0, stop_criteria=None, minimise=False)
+            Simulates a robot and returns its final distance from the starting position
+        physics_settings()
+            Returns the physics settings of the session, for fitness cache keys
+        close()
+            Disconnects the session's pybullet client
+    """
+
+    def __init__(self, timestep=TIMESTEP, solver_iterations=SOLVER_ITERATIONS, control_period=CONTROL_PERIOD):
+        """ Parameters
+            ----------
+            timestep : float, optional
+                The length of one simulation step in seconds (default is pybullet's 1/240)
+            solver_iterations : int, optional
+                The number of iterations of pybullet's constraint solver per step (default is pybullet's 50)
+            control_period : int, optional
+                The number of steps between motor updates (default is 1, every step)
+        """
+
+        self.timestep = timestep
+        self.solver_iterations = solver_iterations
+        self.control_period = control_period
+
+        self.client = p.connect(p.DIRECT)
+        self._build_world()
+
+        self.robot_id = None
+        self.joint_indices = None
+        self.warm_key = None
+        self.warm_state = None
+
+        self.last_stop = None
+        self.early_stops = {}
+        self.last_trajectory = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def load(self, body, warm_start=False, settle_steps=0):
+        """ Removes the current robot and loads a new one into the world as it was right after the plane was loaded.
+
+            With warm_start, the body is settled for settle_steps steps after loading and that state is saved. As long
+            as the same unchanged urdf (or the same body parameters) is requested again, the saved state is restored
+            instead of loading the body, preparing it, and settling it again.
+
+            Parameters
+            ----------
+            body : str or list[float]
+                The urdf of the robot body, or the 15 body parameters to build it from
+            warm_start : bool, optional
+                Whether to restore (or create) the saved settled state of the body (default is False)
+            settle_steps : int, optional
+                The number of steps the body is simulated without driving the motors before its state is saved. Only
+                used with warm_start (default is 0, which saves the body as loaded and does not change its fitness)
+
+            Returns
+            -------
+            int
+                The id of the loaded robot body
+        """
+
+        urdf = isinstance(body, str)
+
+        if warm_start:
+            if urdf:
+                stat = os.stat(body)
+                warm_key = (os.path.abspath(body), stat.st_mtime_ns, stat.st_size, settle_steps)
+            else:
+                warm_key = (tuple(float(dim) for dim in body), settle_steps)
+
+            if warm_key == self.warm_key:
+                p.restoreState(self.warm_state, physicsClientId=self.client)
+                return self.robot_id
+
+        if self.robot_id is not None:
+            p.removeBody(self.robot_id, physicsClientId=self.client)
+            self.robot_id = None
+
+        # A saved state is only valid for the robot it was saved with
+        if self.warm_state is not None:
+            p.removeState(self.warm_state, physicsClientId=self.client)
+            self.warm_key = None
+            self.warm_state = None
+
+        if self.built_bodies >= BUILT_BODIES_PER_WORLD:
+            p.resetSimulation(physicsClientId=self.client)
+            self._build_world()
+        else:
+            p.restoreState(self.world_state, physicsClientId=self.client)
+
+        if urdf:
+            self.robot_id = p.loadURDF(body, physicsClientId=self.client)
+
+            # Prepare body for simulation
+            ps.Prepare_To_Simulate(self.robot_id, self.client)
+        else:
+            self.robot_id = gb.create_body(body, self.client)
+            self.built_bodies += 1
+
+        self.joint_indices = ps.Prepare_Joint_Indices(self.robot_id, physicsClientId=self.client)
+
+        if warm_start:
+            for i in range(settle_steps):
+                p.stepSimulation(physicsClientId=self.client)
+
+            self.warm_key = warm_key
+            self.warm_state = p.saveState(physicsClientId=self.client)
+
+        return self.robot_id
+
+    def simulate(self, body, duration=10000, amplitude=(1, -1, -1, 1), phase_offset=(0, 0, 0, 0),
+                 warm_start=False, settle_steps=0, targets=None, stop_criteria=None, reducers=None, record=None,
+                 minimise=False):
+        """ Simulates a robot body and returns its distance from the starting position at every step.
+
+            The motors follow driver_targets(duration, amplitude, phase_offset), unless a (steps, n_joints) array of
+            targets is passed in, in which case column j drives the body's j-th movable joint and duration is ignored.
+
+            If reducers (see fitness_reducers.py) are passed in, no trajectory is kept. Each position is fed to the
+            reducers instead, and a list of their results (in the same order) is returned.
+
+            If any of the stop_criteria (see stop_criteria.py) is met, the simulation ends early and only the
+            distances (or reductions) up to that step are returned. Why it stopped is recorded in self.last_stop,
+            whose fitness is the final distance (or the result of the first reducer, None with no reducers). A
+            criterion that does not keep the fitness (e.g. Unstable) gives the worst fitness instead, which depends on
+            whether fitness is minimised.
 
-        # Uncomment for print out
-        # if i % ten_percent == 0:
-        #     percent_complete += 10
-        #     print(f"{percent_complete}% Complete")
+            If a record path is passed in, the base pose and joint angles of the body at every step are also saved to
+            that .npz file (see trajectory.py), so the simulation can be replayed without simulating it again. With
+            record=True, they are only kept in memory. Either way, they are available as self.last_trajectory.
+        """
 
-    p.disconnect()
+        robot_id = self.load(body, warm_start, settle_steps)
+
+        # Reducers that depend on the length of a step use the session's timestep
+        for reducer in reducers or ():
+            if hasattr(reducer, "simulation_timestep"):
+                reducer.simulation_timestep = self.timestep
+
+        if targets is None:
+            targets = driver_targets(duration, amplitude, phase_offset, self.timestep)
+
+        recorder = None
+        if record:
+            recorder = TrajectoryRecorder(robot_id, self.joint_indices, len(targets), self.client)
+
+        body_pos, stop = _run_body(robot_id, self.joint_indices, targets, self.client, stop_criteria=stop_criteria,
+                                   reducers=reducers, recorder=recorder, control_period=self.control_period)
+
+        self.last_trajectory = None
+
+        if recorder is not None:
+            self.last_trajectory = recorder.trajectory(body, self.timestep)
+            if isinstance(record, str):
+                recorder.save(record, body, self.timestep)
+
+        if reducers is None:
+            result = get_distances(body_pos)
+        else:
+            result = [reducer.result() for reducer in reducers]
+
+        self.last_stop = None
+
+        if stop is not None:
+            criterion, reason, step = stop
+            if not criterion.keep_fitness:
+                fitness = discarded_fitness(minimise)
+            elif reducers is None:
+                fitness = result[-1]
+            else:
+                fitness = result[0] if reducers else None
+
+            self.last_stop = EarlyStop(reason, step, fitness)
+
+            if criterion.counted:
+                name = type(criterion).__name__
+                self.early_stops[name] = self.early_stops.get(name, 0) + 1
+
+        return result
+
+    def fitness(self, body, duration=10000, amplitude=(1, -1, -1, 1), phase_offset=(0, 0, 0, 0),
+                warm_start=False, settle_steps=0, stop_criteria=None, minimise=False):
+        """ Simulates a robot body, without keeping its trajectory, and returns its final distance from the starting
+            position (or the fitness given by the stop criterion that ended the simulation early).
+        """
+
+        final_distance = self.simulate(body, duration, amplitude, phase_offset, warm_start, settle_steps,
+                                       stop_criteria=stop_criteria, reducers=[FinalDistance()],
+                                       minimise=minimise)[0]
+
+        if self.last_stop is not None:
+            return self.last_stop.fitness
+
+        return final_distance
+
+    def physics_settings(self):
+        """ Returns the physics settings of the session (see physics_settings()), for fitness cache keys. """
+
+        return physics_settings(self.timestep, self.solver_iterations, self.control_period)
+
+    def close(self):
+        """ Disconnects the session's pybullet client. """
+
+        if self.client is not None:
+            p.disconnect(self.client)
+            self.client = None
+            self.robot_id = None
+            self.joint_indices = None
+            self.warm_key = None
+            self.warm_state = None
+
+# ------------------ Private methods ------------------
+
+    def _build_world(self):
+        # Body urdfs are rewritten under the same name during a trial, so they must not be cached
+        p.setPhysicsEngineParameter(enableFileCaching=0, physicsClientId=self.client)
+        p.setAdditionalSearchPath(pybullet_data.getDataPath(), physicsClientId=self.client)
+        p.setGravity(0, 0, GRAVITY, physicsClientId=self.client)
+        p.setPhysicsEngineParameter(fixedTimeStep=self.timestep, numSolverIterations=self.solver_iterations,
+                                    physicsClientId=self.client)
+
+        # Load plane
+        p.loadURDF("plane.urdf", physicsClientId=self.client)
+        self.world_state = p.saveState(physicsClientId=self.client)
+        self.built_bodies = 0
+
+
+def simulate_body(body:str, duration=10000, amplitude=(1, -1, -1, 1), phase_offset=(0, 0, 0, 0), record=None):
+    # Configuration
+
+    # No GUI version (much faster), optionally recording the trajectory for replay
+    with SimulationSession() as session:
+        body_dist = session.simulate(body, duration, amplitude, phase_offset, record=record)
 
     #print("Simulation Complete")
 
-    body_dist = get_distances(body_pos)
     # print(f"Final Distance: {body_dist[-1]}")
     #
     # plt.plot(body_dist, 'b')
@@ -116,3 +457,116 @@ def simulate_body(body:str, duration=10000, amplitude=(1, -1, -1, 1), phase_offs
     # plt.show()
 
     return body_dist
+
+
+# Simulation session of a worker process in the evaluation pool
+_worker_session = None
+
+
+def _init_worker(timestep=TIMESTEP, solver_iterations=SOLVER_ITERATIONS, control_period=CONTROL_PERIOD):
+    # Each worker process holds its own session (and DIRECT client) for its whole lifetime
+    global _worker_session
+    _worker_session = SimulationSession(timestep, solver_iterations, control_period)
+
+
+def _evaluate_worker(job):
+    body, duration, amplitude, phase_offset, warm_start, stop_criteria, minimise = job
+
+    return _worker_session.fitness(body, duration, amplitude, phase_offset, warm_start,
+                                   stop_criteria=stop_criteria, minimise=minimise)
+
+
+def evaluate_body(body, duration=10000, amplitude=(1, -1, -1, 1), phase_offset=(0, 0, 0, 0), warm_start=False,
+                  stop_criteria=None, minimise=False):
+    """ Finds the fitness (final distance from the starting point) of a body with the persistent SimulationSession of
+        the calling process, which is created on first use.
+
+        Unlike a SimulationSession, this function can be sent to other processes (e.g. with functools.partial to fix
+        its settings), so it can serve as the fitness function of a GA running in its own process.
+    """
+
+    global _worker_session
+    if _worker_session is None:
+        _worker_session = SimulationSession()
+
+    return _worker_session.fitness(body, duration, amplitude, phase_offset, warm_start, stop_criteria=stop_criteria,
+                                   minimise=minimise)
+
+
+def make_pool(workers=None, timestep=TIMESTEP, solver_iterations=SOLVER_ITERATIONS, control_period=CONTROL_PERIOD):
+    """ Creates a pool of worker processes, each holding its own persistent SimulationSession.
+
+        Parameters
+        ----------
+        workers : int, optional
+            The number of worker processes (default is the number of CPU cores)
+        timestep, solver_iterations, control_period : optional
+            The fidelity of the workers' sessions (see SimulationSession; default is the default fidelity)
+
+        Returns
+        -------
+        concurrent.futures.ProcessPoolExecutor
+            The worker pool, which can be passed to evaluate_population() and reused across calls
+    """
+
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                               initargs=(timestep, solver_iterations, control_period))
+
+
+def evaluate_population(bodies, amplitudes=None, phase_offsets=None, duration=10000, workers=None, pool=None,
+                        warm_start=False, stop_criteria=None, minimise=False):
+    """ Finds the fitness (final distance from the starting point) of every member of a population in parallel.
+
+        Parameters
+        ----------
+        bodies : list[str] or list[list[float]] or str
+            The urdf (or body parameters) of each member of the population, or a single urdf shared by the whole
+            population (evaluated once with the default driver if no amplitudes or phase offsets are given)
+        amplitudes : list[list[float]], optional
+            The motor amplitudes of each member of the population (default is the simulate_body() default)
+        phase_offsets : list[list[float]], optional
+            The motor phase offsets of each member of the population (default is the simulate_body() default)
+        duration : int, optional
+            The number of simulation steps for each evaluation (default is 10000)
+        workers : int, optional
+            The number of worker processes to use when no pool is passed in (default is the number of CPU cores)
+        pool : concurrent.futures.ProcessPoolExecutor, optional
+            A pool from make_pool() to reuse instead of starting a new one
+        warm_start : bool, optional
+            Whether each worker restores a saved state of a body it has already loaded instead of loading it again
+            (default is False; useful when the whole population shares one unchanged urdf)
+        stop_criteria : list, optional
+            Criteria for stopping hopeless or unstable simulations early (see stop_criteria.py)
+        minimise : bool, optional
+            Whether fitness is minimised, which decides the worst fitness given to unstable simulations (default is
+            False)
+
+        Returns
+        -------
+        list[float]
+            The fitness of each member of the population, in the same order as the input
+    """
+
+    if isinstance(bodies, str):
+        # One urdf evaluated with each driver (or once with the default driver if no drivers are given)
+        if amplitudes is not None:
+            size = len(amplitudes)
+        elif phase_offsets is not None:
+            size = len(phase_offsets)
+        else:
+            size = 1
+        bodies = [bodies] * size
+
+    if amplitudes is None:
+        amplitudes = [(1, -1, -1, 1)] * len(bodies)
+    if phase_offsets is None:
+        phase_offsets = [(0, 0, 0, 0)] * len(bodies)
+
+    jobs = [(bodies[i], duration, tuple(amplitudes[i]), tuple(phase_offsets[i]), warm_start, stop_criteria, minimise)
+            for i in range(len(bodies))]
+
+    if pool is not None:
+        return list(pool.map(_evaluate_worker, jobs))
+
+    with make_pool(workers) as new_pool:
+        return list(new_pool.map(_evaluate_worker, jobs))
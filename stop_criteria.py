@@ -0,0 +1,215 @@
+"""
+© 2024 Emily Maxwell <maxwelea@rose-hulman.edu>
+SPDX License: BSD-3-Clause
+
+stop_criteria.py
+
+Early-stop criteria for headless simulations. A criterion is checked after every simulation step and ends the
+simulation as soon as the rest of it would be wasted, e.g. because the robot stopped moving, flipped over, or the
+physics blew up.
+
+Every criterion provides:
+    * reset() - called before each simulation, to clear any state from the previous one
+    * check(robot_id, step, position, orientation, client) - returns a reason (str) to stop, or None to continue
+    * keep_fitness - whether the partial fitness up to the stop is kept, or replaced with the worst fitness (for
+      unphysical runs, see discarded_fitness())
+    * counted - whether the stops are counted as early stops of the simulation (SimulationSession.early_stops)
+"""
+
+import math
+from collections import namedtuple
+
+import pybullet as p
+
+# Why and when a simulation was stopped, and the fitness it was given
+EarlyStop = namedtuple("EarlyStop", ["reason", "step", "fitness"])
+
+
+class Stationary:
+    """ Stops a simulation when the body has moved less than tolerance over the last window steps.
+
+        Attributes
+        ----------
+        window : int
+            The number of steps between checks of how far the body has moved
+        tolerance : float
+            The minimum distance the body must move in each window to keep the simulation going
+    """
+
+    keep_fitness = True
+    counted = True
+
+    def __init__(self, window: int = 1000, tolerance: float = 0.01):
+        self.window = window
+        self.tolerance = tolerance
+        self.last_position = None
+
+    def __repr__(self):
+        return f"Stationary(window={self.window}, tolerance={self.tolerance})"
+
+    def reset(self):
+        self.last_position = None
+
+    def check(self, robot_id, step, position, orientation, client=0):
+        if step % self.window:
+            return None
+
+        last_position = self.last_position
+        self.last_position = position
+
+        if last_position is not None and math.dist(position, last_position) < self.tolerance:
+            return f"stationary (moved less than {self.tolerance} in {self.window} steps)"
+
+        return None
+
+
+class Flipped:
+    """ Stops a simulation when the body has been tilted past max_tilt for patience consecutive steps.
+
+        Attributes
+        ----------
+        max_tilt : float
+            The largest allowed angle (in radians) between the body's up axis and the world's up axis
+        patience : int
+            The number of consecutive steps the body may stay tilted past max_tilt (so that a robot that only rocks
+            past it for a moment is not stopped)
+    """
+
+    keep_fitness = True
+    counted = True
+
+    def __init__(self, max_tilt: float = math.pi / 2, patience: int = 240):
+        self.max_tilt = max_tilt
+        self.patience = patience
+        self.min_up = math.cos(max_tilt)
+        self.tilted_steps = 0
+
+    def __repr__(self):
+        return f"Flipped(max_tilt={self.max_tilt}, patience={self.patience})"
+
+    def reset(self):
+        self.tilted_steps = 0
+
+    def check(self, robot_id, step, position, orientation, client=0):
+        x, y, z, w = orientation
+
+        # z component of the body's up axis in world coordinates (cosine of the tilt)
+        up = 1 - 2 * (x * x + y * y)
+
+        if up < self.min_up:
+            self.tilted_steps += 1
+            if self.tilted_steps > self.patience:
+                return f"flipped (tilted past {self.max_tilt:.3f} rad for {self.patience} steps)"
+        else:
+            self.tilted_steps = 0
+
+        return None
+
+
+class Unstable:
+    """ Stops a simulation whose physics blew up, i.e. the body's position is not finite or its linear or angular
+        velocity is larger than max_velocity. The distance such a body covered is unphysical, so its fitness is
+        replaced with the worst fitness (see discarded_fitness()).
+
+        Attributes
+        ----------
+        max_velocity : float
+            The largest allowed linear (m/s) or angular (rad/s) speed of the body
+        interval : int
+            The number of steps between checks (querying the velocity every step is a noticeable cost)
+    """
+
+    keep_fitness = False
+    counted = True
+
+    def __init__(self, max_velocity: float = 100.0, interval: int = 10):
+        self.max_velocity = max_velocity
+        self.interval = interval
+
+    def __repr__(self):
+        return f"Unstable(max_velocity={self.max_velocity}, interval={self.interval})"
+
+    def reset(self):
+        pass
+
+    def check(self, robot_id, step, position, orientation, client=0):
+        if step % self.interval:
+            return None
+
+        if not all(math.isfinite(coordinate) for coordinate in position):
+            return "unstable (position is not finite)"
+
+        linear, angular = p.getBaseVelocity(robot_id, physicsClientId=client)
+
+        if math.hypot(*linear) > self.max_velocity or math.hypot(*angular) > self.max_velocity:
+            return f"unstable (speed over {self.max_velocity})"
+
+        return None
+
+
+class Screening:
+    """ Stops a simulation after its first steps if the distance covered by then is not promising enough, i.e. below
+        threshold (or above it when minimising). A simulation that passes the screening simply carries on to its full
+        length, so the screening steps are never simulated twice. Screened-out simulations are counted by the
+        multi-fidelity evaluator (see multi_fidelity.py), not as early stops.
+
+        Attributes
+        ----------
+        steps : int
+            The number of steps of the screening
+        threshold : float
+            The distance the body must have covered after the screening to continue (None to never stop)
+        minimise : bool
+            Whether a smaller distance is more promising
+        fitness : float
+            The distance covered after the screening in the last simulation (None if it stopped before)
+    """
+
+    keep_fitness = True
+    counted = False
+
+    def __init__(self, steps: int = 1000, threshold: float = None, minimise: bool = False):
+        self.steps = steps
+        self.threshold = threshold
+        self.minimise = minimise
+        self.start = None
+        self.fitness = None
+
+    def __repr__(self):
+        return f"Screening(steps={self.steps}, threshold={self.threshold}, minimise={self.minimise})"
+
+    def reset(self):
+        self.start = None
+        self.fitness = None
+
+    def check(self, robot_id, step, position, orientation, client=0):
+        # Distances are measured from the position after the first step, as with FinalDistance
+        if self.start is None:
+            self.start = position
+
+        if step != self.steps - 1:
+            return None
+
+        self.fitness = math.dist(position, self.start)
+
+        if self.threshold is None:
+            return None
+
+        if (self.fitness > self.threshold) if self.minimise else (self.fitness < self.threshold):
+            return f"screened out (distance {self.fitness:.3f} after {self.steps} steps)"
+
+        return None
+
+
+def discarded_fitness(minimise: bool = False) -> float:
+    """ Returns the fitness given to a simulation stopped by a criterion that does not keep its fitness: the worst
+        fitness for the direction of the optimisation (0 when maximising, infinity when minimising).
+    """
+
+    return math.inf if minimise else 0.0
+
+
+def default_criteria():
+    """ Returns one of each criterion with its default settings. """
+
+    return [Stationary(), Flipped(), Unstable()]
@@ -0,0 +1,139 @@
+"""
+© 2024 Emily Maxwell <maxwelea@rose-hulman.edu>
+SPDX License: BSD-3-Clause
+
+trajectory.py
+
+Recorded trajectories of simulated bodies. A headless simulation can record the pose of the body and the angle of each
+of its joints at every step into a compressed .npz file; the GUI viewer (simulate_body_gui.replay_body_gui) and the
+headless renderer can then replay it at any speed, from any frame, by setting the recorded pose directly instead of
+simulating the physics again.
+
+A trajectory file holds:
+    * positions - (steps, 3) float32 array of the base position at every step
+    * orientations - (steps, 4) float32 array of the base orientation (quaternion) at every step
+    * joint_angles - (steps, n_joints) float32 array of the angle of each movable joint at every step
+    * joint_indices - the pybullet indices of the movable joints, in the order of the joint_angles columns
+    * body - the urdf the body was loaded from, or the 15 body parameters it was built from
+    * timestep - the length of one simulation step in seconds
+"""
+
+import os
+from collections import namedtuple
+
+import numpy as np
+import pybullet as p
+
+import evolve_bodies.gen_sim_viz.generate_body as gb
+
+Trajectory = namedtuple("Trajectory", ["positions", "orientations", "joint_angles", "joint_indices", "body",
+                                       "timestep"])
+
+
+class TrajectoryRecorder:
+    """ Records the base pose and joint angles of a body at every step of a simulation.
+
+        Attributes
+        ----------
+        robot_id : int
+            The id of the recorded body
+        joint_indices : list[int]
+            The indices of the body\'s movable joints
+        client : int
+            The id of the pybullet client simulating the body
+        steps : int
+            The number of steps recorded so far
+
+        Methods
+        -------
+        update(position, orientation)
+            Records one step (called after every simulation step)
+        save(path, body)
+            Writes the recorded steps to a .npz file
+        trajectory(body)
+            Returns the recorded steps as a Trajectory, without writing a file
+    """
+
+    def __init__(self, robot_id, joint_indices, duration, client=0):
+        self.robot_id = robot_id
+        self.joint_indices = list(joint_indices)
+        self.client = client
+        self.steps = 0
+
+        self.positions = np.empty((duration, 3), dtype=np.float32)
+        self.orientations = np.empty((duration, 4), dtype=np.float32)
+        self.joint_angles = np.empty((duration, len(self.joint_indices)), dtype=np.float32)
+
+    def update(self, position, orientation):
+        i = self.steps
+
+        self.positions[i] = position
+        self.orientations[i] = orientation
+
+        states = p.getJointStates(self.robot_id, self.joint_indices, physicsClientId=self.client)
+        self.joint_angles[i] = [state[0] for state in states]
+
+        self.steps += 1
+
+    def trajectory(self, body, timestep: float) -> Trajectory:
+        """ Returns the recorded steps as a Trajectory (as load_trajectory() would), without writing a file. """
+
+        return Trajectory(self.positions[:self.steps], self.orientations[:self.steps],
+                          self.joint_angles[:self.steps], list(self.joint_indices), body, timestep)
+
+    def save(self, path: str, body, timestep: float):
+        """ Writes the recorded steps (only those recorded, if the simulation stopped early) to a compressed .npz file.
+
+            Parameters
+            ----------
+            path : str
+                The file to write
+            body : str or list[float]
+                The urdf the body was loaded from (stored as an absolute path), or the body parameters it was built
+                from
+            timestep : float
+                The length of one simulation step in seconds (the timestep of the simulation that was recorded)
+        """
+
+        if isinstance(body, str):
+            body = os.path.abspath(body)
+
+        np.savez_compressed(path, positions=self.positions[:self.steps], orientations=self.orientations[:self.steps],
+                            joint_angles=self.joint_angles[:self.steps], joint_indices=np.array(self.joint_indices),
+                            body=np.asarray(body), timestep=np.float64(timestep))
+
+
+def load_trajectory(path: str) -> Trajectory:
+    """ Loads a trajectory file written by TrajectoryRecorder.save(). """
+
+    with np.load(path) as data:
+        body = data["body"]
+        body = str(body) if body.dtype.kind in "US" else body.tolist()
+
+        return Trajectory(data["positions"], data["orientations"], data["joint_angles"],
+                          data["joint_indices"].tolist(), body, float(data["timestep"]))
+
+
+def load_body(trajectory: Trajectory, client=0) -> int:
+    """ Loads (or builds) the body of a trajectory into a world, without preparing it for simulation.
+
+        Returns
+        -------
+        int
+            The id of the body
+    """
+
+    if isinstance(trajectory.body, str):
+        return p.loadURDF(trajectory.body, physicsClientId=client)
+
+    return gb.create_body(trajectory.body, client)
+
+
+def apply_frame(robot_id, trajectory: Trajectory, frame: int, client=0):
+    """ Puts a body in the pose recorded at one step (frame) of a trajectory, without simulating any physics. """
+
+    p.resetBasePositionAndOrientation(robot_id, trajectory.positions[frame].tolist(),
+                                      trajectory.orientations[frame].tolist(), physicsClientId=client)
+
+    for joint, angle in zip(trajectory.joint_indices, trajectory.joint_angles[frame].tolist()):
+        p.resetJointState(robot_id, joint, angle, physicsClientId=client)